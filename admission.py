@@ -0,0 +1,192 @@
+import math
+import time
+import threading
+from collections import OrderedDict, deque
+
+# --- ADMISSÃO DE GRAVAÇÕES ---
+# Na abertura das reservas todas as famílias clicam ao mesmo tempo. Reservas e cancelamentos
+# passam por aqui antes do Storage:
+#   - fila limitada (`max_queue`): cheia, o clique é recusado na hora com uma mensagem clara;
+#   - uma fila por sessão, atendidas em rodízio: quem clica mais não passa na frente;
+#   - limite por sessão (token bucket: `rate` pedidos/s, rajada de `burst`);
+#   - `workers` threads gravam lotes de até `max_batch` operações num único commit_now, e cada
+#     lote só junta operações da mesma partição (Storage.partition): um arquivo por commit;
+#   - com pouca folga no rate limit (headroom < `low_headroom`) só um lote grava por vez, os
+#     lotes crescem e os commits são espaçados até o reset; abaixo de `min_headroom` novos
+#     pedidos são recusados até o reset.
+# O tempo médio de cada lote (média móvel) dá a estimativa de espera mostrada na tela.
+FULL = "Muitas reservas ao mesmo tempo. Tente de novo em alguns segundos."
+TOO_FAST = "Aguarde um instante antes de clicar de novo."
+NO_HEADROOM = "Limite de acessos ao GitHub quase no fim. Tente de novo em {min} min."
+EXPIRED = "A fila demorou demais. Tente de novo."
+UNCONFIRMED = "Sem confirmação da gravação, confira antes de repetir."
+
+class Ticket:
+    def __init__(self, store, session, ops, key):
+        self.store = store; self.session = session; self.ops = ops; self.key = key
+        self.at = time.time()
+        self.taken = False
+        self.done = threading.Event()
+
+class AdmissionControl:
+    def __init__(self, metrics=None, workers=4, max_queue=500, max_batch=20, rate=0.5, burst=3,
+                 low_headroom=0.2, min_headroom=0.02, timeout=60):
+        self.metrics = metrics
+        self.workers = workers
+        self.max_queue = max_queue
+        self.max_batch = max_batch
+        self.rate = rate; self.burst = burst
+        self.low_headroom = low_headroom; self.min_headroom = min_headroom
+        self.timeout = timeout
+        self.cond = threading.Condition()
+        self.queues = OrderedDict()   # sessão -> deque de tickets; a ordem é a do rodízio
+        self.size = 0
+        self.busy = set()             # partições com lote gravando agora
+        self.buckets = {}             # sessão -> (fichas, último acesso)
+        self.avg = 1.0                # segundos por lote
+        self.threads = []
+        self.stats = {"admitted": 0, "full": 0, "too_fast": 0, "no_headroom": 0, "expired": 0, "batches": 0, "max_batch": 0, "max_wait": 0.0}
+
+    # --- folga do rate limit ---
+    def _headroom(self):
+        return self.metrics.headroom() if self.metrics is not None else None
+
+    def _low(self):
+        h = self._headroom()
+        return h is not None and h < self.low_headroom
+
+    def _until_reset(self):
+        reset = getattr(self.metrics, "rate_reset", None)
+        return max(1.0, reset - time.time()) if reset else 60.0
+
+    def _pace(self):
+        # Com pouca folga, espalha as chamadas que restam até o reset
+        if not self._low(): return 0.0
+        remaining = self.metrics.rate[0] or 0
+        return min(10.0, self._until_reset() / max(remaining, 1))
+
+    # --- entrada ---
+    def _allow(self, session, now):
+        tokens, last = self.buckets.get(session, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - last) * self.rate)
+        if tokens < 1: self.buckets[session] = (tokens, now); return False
+        self.buckets[session] = (tokens - 1, now)
+        if len(self.buckets) > 10 * self.max_queue:
+            # Sessões paradas há tempo suficiente para encher o balde não precisam de registro
+            idle = now - self.burst / self.rate
+            self.buckets = {s: b for s, b in self.buckets.items() if b[1] > idle}
+        return True
+
+    def _reject(self, ops, msg, reason):
+        self.stats[reason] += 1
+        for op in ops: op.ok = False; op.error = msg
+
+    def submit(self, store, session, ops):
+        # Ticket na fila ou None (recusado: ops já trazem o erro)
+        now = time.time()
+        h = self._headroom()
+        with self.cond:
+            if h is not None and h < self.min_headroom:
+                self._reject(ops, NO_HEADROOM.format(min=math.ceil(self._until_reset() / 60)), "no_headroom"); return None
+            if self.size >= self.max_queue: self._reject(ops, FULL, "full"); return None
+            if not self._allow(session, now): self._reject(ops, TOO_FAST, "too_fast"); return None
+            ticket = Ticket(store, session, ops, (id(store), store.partition(ops)))
+            self.queues.setdefault(session, deque()).append(ticket)
+            self.size += 1; self.stats["admitted"] += 1
+            if not self.threads:
+                self.threads = [threading.Thread(target=self._run, daemon=True) for _ in range(self.workers)]
+                for t in self.threads: t.start()
+            self.cond.notify_all()
+        return ticket
+
+    def run(self, store, session, ops, on_wait=None):
+        # Como store.commit(ops), passando pela fila. on_wait(posição, eta_s) é chamado enquanto
+        # espera, na thread de quem chamou (para atualizar a tela)
+        single = not isinstance(ops, list)
+        ops = [ops] if single else ops
+        ticket = self.submit(store, session, ops)
+        if ticket is not None: self.wait(ticket, on_wait)
+        return ops[0] if single else ops
+
+    def wait(self, ticket, on_wait=None):
+        deadline = ticket.at + self.timeout
+        while not ticket.done.wait(0.5):
+            if time.time() > deadline:
+                with self.cond:
+                    if not ticket.taken:
+                        # Ainda na fila: sai dela sem gravar
+                        q = self.queues.get(ticket.session)
+                        if q is not None and ticket in q:
+                            q.remove(ticket); self.size -= 1
+                            if not q: del self.queues[ticket.session]
+                        self._reject(ticket.ops, EXPIRED, "expired"); return
+                for op in ticket.ops:
+                    if not op.ok: op.error = UNCONFIRMED
+                return
+            if on_wait is not None:
+                pos, eta = self.position(ticket)
+                if pos: on_wait(pos, eta)
+
+    def position(self, ticket):
+        # (posição no rodízio, segundos estimados); (0, 0) quando o lote já está gravando
+        with self.cond:
+            q = self.queues.get(ticket.session)
+            if ticket.taken or q is None or ticket not in q: return 0, 0.0
+            depth = q.index(ticket)
+            ahead, before = depth, True
+            for s, other in self.queues.items():
+                if s == ticket.session: before = False; continue
+                ahead += min(len(other), depth + 1 if before else depth)
+            pos = ahead + 1
+            # Partições diferentes gravam em paralelo (até `workers`; uma só com pouca folga)
+            lanes = 1 if self._low() else min(self.workers, len({t.key for d in self.queues.values() for t in d}))
+            return pos, math.ceil(pos / self.max_batch) * (self.avg + self._pace()) / max(1, lanes)
+
+    # --- workers ---
+    def _take(self):
+        # Próximo lote: a partição livre da primeira sessão no rodízio, pegando um ticket por
+        # sessão por volta, até o tamanho do lote
+        low = self._low()
+        if len(self.busy) >= (1 if low else self.workers): return None
+        cap = self.max_batch * (4 if low else 1)
+        for session in list(self.queues):
+            key = self.queues[session][0].key
+            if key in self.busy: continue
+            batch, more = [], True
+            while more and len(batch) < cap:
+                more = False
+                for s in list(self.queues):
+                    q = self.queues[s]
+                    if q[0].key != key: continue
+                    t = q.popleft(); t.taken = True; batch.append(t); more = True
+                    if q: self.queues.move_to_end(s)
+                    else: del self.queues[s]
+                    if len(batch) >= cap: break
+            self.size -= len(batch); self.busy.add(key)
+            return key, batch
+        return None
+
+    def _run(self):
+        while True:
+            pause = self._pace()
+            if pause: time.sleep(pause)
+            with self.cond:
+                taken = self._take()
+                while taken is None: self.cond.wait(1.0); taken = self._take()
+            key, batch = taken
+            ops = [op for t in batch for op in t.ops]
+            t0 = time.time()
+            try: batch[0].store.commit_now(ops)
+            except Exception as e:
+                for op in ops: op.ok = False; op.error = f"Erro na gravação: {e}"
+            dt = time.time() - t0
+            with self.cond:
+                self.busy.discard(key)
+                self.avg = 0.8 * self.avg + 0.2 * dt
+                self.stats["batches"] += 1; self.stats["max_batch"] = max(self.stats["max_batch"], len(ops))
+                self.stats["max_wait"] = max([self.stats["max_wait"]] + [t0 - t.at for t in batch])
+                for t in batch: t.done.set()
+                self.cond.notify_all()
+
+    def queued(self):
+        with self.cond: return self.size
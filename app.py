@@ -1,10 +1,26 @@
 import streamlit as st
-import json
 import time
+import uuid
+import threading
 from datetime import datetime
-from github import Github, GithubException
+from github import Github
 import pandas as pd
 import io
+from storage import SQLiteStorage, WriteCoalescer
+from github_storage import GitHubConnection, ShardedGitHubConnection
+from metrics import ApiMetrics
+from admission import AdmissionControl
+from poller import ChangePoller
+from local_repo import LocalRepo
+from profiling import RenderProfiler
+from importers import read_students_csv, read_items
+from reports import REPORTS, ReportCache, xlsx_available
+from search import SearchCache
+from domain import (
+    TURMAS_LISTA, SERIES_LISTA, CATEGORIAS, LIMITES_RESERVA, get_segmento,
+    OperationError, ReserveItem, CancelReservation, CancelReservations, ReassignReservations, AddStudent, UpdateStudent, DeleteStudent,
+    ImportStudents, AddItems, DeleteItems, SetPassword, item_edits
+)
 
 # --- CONFIGURAÇÃO DA PÁGINA ---
 st.set_page_config(
@@ -28,93 +44,147 @@ st.markdown("""
     </style>
 """, unsafe_allow_html=True)
 
-# --- CONSTANTES E MAPEAMENTOS ---
-MAP_CURSO_CSV = {
-    1: "Grupo 1", 2: "Grupo 2", 3: "Grupo 3", 4: "Grupo 4", 5: "Grupo 5",
-    91: "1º Ano", 92: "2º Ano", 93: "3º Ano", 94: "4º Ano"
-}
-MAP_TURNO_CSV = {
-    "M": "Matutino", 
-    "V": "Vespertino"
-}
-
-TURMAS_LISTA = ["Matutino", "Vespertino", "A", "B", "D", "Integral"]
-SERIES_LISTA = ["Grupo 1", "Grupo 2", "Grupo 3", "Grupo 4", "Grupo 5", "1º Ano", "2º Ano", "3º Ano", "4º Ano"]
-CATEGORIAS = ["Livro", "Jogo", "Brinquedo"]
-LIMITES_RESERVA = {
-    "Infantil": {"Livro": 3, "Jogo": 1, "Brinquedo": 1},
-    "Fundamental": {"Livro": 4, "Jogo": 1, "Brinquedo": 1}
-}
-
-def get_segmento(serie):
-    if "Grupo" in str(serie): return "Infantil"
-    return "Fundamental"
-
-# --- CLASSE GITHUB ---
-class GitHubConnection:
-    def __init__(self):
-        try:
-            self.token = st.secrets["GH_TOKEN"]
-            self.repo_name = st.secrets["GH_REPO"]
-            self.file_path = st.secrets["GH_PATH"]
-            self.branch = st.secrets["GH_BRANCH"]
-            self.g = Github(self.token)
-            self.repo = self.g.get_repo(self.repo_name)
-        except Exception as e:
-            st.error(f"Erro Secrets: {e}"); st.stop()
-
-    def get_data(self):
-        file_sha = None
-        try:
-            contents = self.repo.get_contents(self.file_path, ref=self.branch)
-            file_sha = contents.sha
-            if contents.decoded_content:
-                json_data = json.loads(contents.decoded_content.decode("utf-8"))
-            else:
-                json_data = {}
-
-            if "books" not in json_data: json_data["books"] = []
-            if "reservations" not in json_data: json_data["reservations"] = []
-            if "students_db" not in json_data: json_data["students_db"] = []
-            if "admin_config" not in json_data: json_data["admin_config"] = {"password": "villa123"}
-
-            for item in json_data["books"]:
-                if "category" not in item: item["category"] = "Livro"
-            for i, res in enumerate(json_data["reservations"]):
-                if "reservation_id" not in res: res["reservation_id"] = f"legacy_{i}"
-                if "class_name" not in res: res["class_name"] = "Indefinida"
-                if "category" not in res: res["category"] = "Livro"
-            
-            return json_data, file_sha
-        except Exception:
-            return {"admin_config": {"password": "villa123"}, "books": [], "reservations": [], "students_db": []}, file_sha
-
-    def update_data(self, new_data, sha, msg="Update"):
-        try:
-            content = json.dumps(new_data, indent=2, ensure_ascii=False)
-            if sha: self.repo.update_file(self.file_path, msg, content, sha, branch=self.branch)
-            else: self.repo.create_file(self.file_path, msg, content, branch=self.branch)
-            return True
-        except Exception as e:
-            st.error(f"Erro GitHub: {e}"); return False
-
-def process_cancellation(db, data, sha, item_id, user_parent, res_id=None):
-    found = False
-    for i in data['books']:
-        if i['id'] == item_id:
-            if i['reserved_by'] == user_parent or user_parent == "ADMIN_OVERRIDE":
-                i['available'] = True; i['reserved_by'] = None; i['reserved_student'] = None
-                found = True
-            break
-    if res_id: data['reservations'] = [r for r in data['reservations'] if r.get('reservation_id') != res_id]
-    else: data['reservations'] = [r for r in data['reservations'] if r.get('book_id') != item_id]
-    if found: return db.update_data(data, sha, f"Cancel: {item_id}")
-    return False
+@st.cache_resource
+def get_github_connection():
+    try:
+        # Cliente único por processo: o pool HTTP mantém as conexões keep-alive entre reruns
+        # e o repo só é resolvido na primeira chamada real à API.
+        # Os intervalos mínimos do PyGithub (0.25 s entre chamadas, 1 s entre gravações por padrão)
+        # valeriam para o processo inteiro, somando todas as sessões: ficam desligados, ou ajustados
+        # por GH_SECONDS_BETWEEN_REQUESTS / GH_SECONDS_BETWEEN_WRITES (0 = sem espera)
+        # GH_LOCAL_DIR (opcional): uma pasta local no lugar do repositório (testes, sem token)
+        if st.secrets.get("GH_LOCAL_DIR"): g, repo = None, LocalRepo(st.secrets["GH_LOCAL_DIR"])
+        else:
+            g = Github(st.secrets["GH_TOKEN"], pool_size=int(st.secrets.get("GH_POOL_SIZE", 10)),
+                       seconds_between_requests=float(st.secrets.get("GH_SECONDS_BETWEEN_REQUESTS", 0)) or None,
+                       seconds_between_writes=float(st.secrets.get("GH_SECONDS_BETWEEN_WRITES", 0)) or None)
+            repo = g.get_repo(st.secrets["GH_REPO"], lazy=True)
+        # Com o vigia (POLL_INTERVAL), as sessões não revalidam: o TTL só cobre a thread parada
+        ttl = float(st.secrets.get("CACHE_TTL", 10))
+        if float(st.secrets.get("POLL_INTERVAL", 0)) > 0: ttl = max(ttl, 6 * float(st.secrets["POLL_INTERVAL"]))
+        opts = dict(client=g, ttl=ttl, max_retries=int(st.secrets.get("WRITE_RETRIES", 5)),
+                    # METRICS_PATH (opcional): também grava cada chamada à API num JSONL local
+                    metrics=ApiMetrics(int(st.secrets.get("METRICS_BUFFER", 5000)), st.secrets.get("METRICS_PATH") or None))
+        # GH_SHARDS_DIR (opcional): um arquivo por série/turma nessa pasta, dividido a partir do GH_PATH
+        if st.secrets.get("GH_SHARDS_DIR"):
+            return ShardedGitHubConnection(repo, st.secrets["GH_PATH"], st.secrets.get("GH_BRANCH", "main"), st.secrets["GH_SHARDS_DIR"], **opts)
+        return GitHubConnection(
+            repo, st.secrets["GH_PATH"], st.secrets.get("GH_BRANCH", "main"), **opts,
+            # GH_JOURNAL_PATH (opcional): ver GitHubConnection
+            journal_path=st.secrets.get("GH_JOURNAL_PATH", ""), compact_every=int(st.secrets.get("JOURNAL_COMPACT_EVERY", 100)))
+    except Exception as e:
+        st.error(f"Erro Secrets: {e}"); st.stop()
+
+# --- ESCOLHA DO BACKEND ---
+# STORAGE_BACKEND = "github" (padrão: data.json via API) ou "sqlite" (SQLITE_PATH local,
+# com o data.json do GitHub como carga inicial e destino de backup a cada BACKUP_INTERVAL s)
+@st.cache_resource
+def get_sqlite_storage(path):
+    return SQLiteStorage(path)
+
+@st.cache_resource
+def get_coalescer(window):
+    return WriteCoalescer(window)
+
+@st.cache_resource
+def get_backup_state():
+    # rev: versão da base (config 'rev') no último backup bem-sucedido
+    return {"lock": threading.Lock(), "last": time.time(), "rev": None}
+
+def backup_to_github(store, gh):
+    # Devolve a versão exportada; lida antes da exportação, então uma gravação no meio só
+    # faz o próximo backup acontecer
+    rev = store.view().version()
+    gh.replace_document(store.export(), "Backup SQLite")
+    return rev
+
+def maybe_backup(store):
+    # Exporta em segundo plano para não travar o render; no máximo um backup por vez, e nenhum
+    # enquanto a base não mudar desde o último (sem commits vazios nem cota gasta à toa)
+    state = get_backup_state()
+    interval = float(st.secrets.get("BACKUP_INTERVAL", 300))
+    if time.time() - state["last"] < interval or not state["lock"].acquire(blocking=False): return
+    if store.view().version() == state["rev"]:
+        state["last"] = time.time(); state["lock"].release(); return
+    gh = get_github_connection()
+    def run():
+        try: state["rev"] = backup_to_github(store, gh)
+        except Exception: pass
+        finally:
+            state["last"] = time.time(); state["lock"].release()
+    threading.Thread(target=run, daemon=True).start()
+
+@st.cache_resource
+def get_report_cache():
+    return ReportCache()
+
+# Índices de busca (sem acento, tolerante a erros) compartilhados entre as sessões
+@st.cache_resource
+def get_search_cache():
+    return SearchCache()
+
+# --- FILA DE ADMISSÃO ---
+# Reservas e cancelamentos das famílias entram numa fila limitada e justa entre sessões (ver
+# AdmissionControl); ADMISSION = false grava direto, como antes.
+@st.cache_resource
+def get_admission():
+    metrics = get_github_connection().metrics if st.secrets.get("STORAGE_BACKEND", "github") != "sqlite" else None
+    return AdmissionControl(
+        metrics, workers=int(st.secrets.get("ADMISSION_WORKERS", 4)), max_queue=int(st.secrets.get("ADMISSION_QUEUE", 500)),
+        max_batch=int(st.secrets.get("ADMISSION_BATCH", 20)), rate=float(st.secrets.get("ADMISSION_RATE", 0.5)),
+        burst=int(st.secrets.get("ADMISSION_BURST", 3)))
+
+def family_commit(db, op):
+    if not st.secrets.get("ADMISSION", True): return db.commit(op)
+    ph = st.empty()
+    op = get_admission().run(db, st.session_state.sid, op, lambda pos, eta: ph.info(f"⏳ Na fila: posição {pos}, cerca de {eta:.0f}s."))
+    ph.empty()
+    return op
+
+# --- VIGIA DE MUDANÇAS ---
+# POLL_INTERVAL (s, opcional): uma thread por processo revalida o GitHub e publica as versões
+# novas; a página da família se atualiza sozinha quando muda a versão da turma dela.
+@st.cache_resource
+def get_poller(interval):
+    return ChangePoller(get_github_connection(), interval)
+
+def active_poller():
+    interval = float(st.secrets.get("POLL_INTERVAL", 0))
+    if interval <= 0 or st.secrets.get("STORAGE_BACKEND", "github") == "sqlite": return None
+    return get_poller(interval).start()
+
+def watch_changes(groups):
+    poller = active_poller()
+    if poller is None or not hasattr(st, "fragment"): return
+    seen = poller.version_of(groups)
+    @st.fragment(run_every=poller.interval)
+    def watch():
+        if poller.version_of(groups) != seen: st.rerun()
+    watch()
+
+def get_storage():
+    if st.secrets.get("STORAGE_BACKEND", "github") != "sqlite":
+        store = get_github_connection()
+        # WRITE_WINDOW (s): agrupa as gravações recebidas nessa janela num único commit. Com a
+        # fila de admissão ligada (padrão), reservas e cancelamentos das famílias já são gravados
+        # em lotes por ela e não passam por aqui: a janela só vale para as operações do admin
+        # (ou para tudo, com ADMISSION = false)
+        window = float(st.secrets.get("WRITE_WINDOW", 0))
+        if window > 0: store.coalescer = get_coalescer(window)
+        active_poller()
+        return store
+    store = get_sqlite_storage(st.secrets.get("SQLITE_PATH", "villa.db"))
+    if store.is_empty():
+        # Carga inicial: a base é igual ao GitHub, não há o que copiar de volta
+        store.load(get_github_connection().export()); get_backup_state()["rev"] = store.view().version()
+    maybe_backup(store)
+    return store
 
 # --- SESSION ---
 if 'user' not in st.session_state: st.session_state.user = None
 if 'page' not in st.session_state: st.session_state.page = "login"
 if 'login_search_triggered' not in st.session_state: st.session_state.login_search_triggered = False
+if 'sid' not in st.session_state: st.session_state.sid = uuid.uuid4().hex
 
 def login_email(student_obj, parent_name):
     final_parent = parent_name if parent_name else student_obj.get('parent_csv', 'Responsável')
@@ -126,8 +196,8 @@ def login_email(student_obj, parent_name):
     }
     st.session_state.page = "menu"; st.rerun()
 
-def login_admin(pwd, data):
-    if pwd == data.get("admin_config", {}).get("password", "villa123"):
+def login_admin(pwd, idx):
+    if pwd == idx.admin_config().get("password", "villa123"):
         st.session_state.user = {'type': 'admin'}
         st.session_state.page = "admin"; st.rerun()
     else: st.error("Senha incorreta.")
@@ -141,16 +211,24 @@ def logout():
 def go_menu(): st.session_state.page = "menu"; st.rerun()
 
 # --- MAIN ---
-def main():
-    db = GitHubConnection()
-    data, sha = db.get_data()
-
+def render(prof):
     st.markdown("""
     <div style='background: linear-gradient(135deg, #006680 0%, #F26522 100%); padding: 25px; border-radius: 12px; color: white; text-align: center; margin-bottom: 25px; box-shadow: 0 4px 6px rgba(0,0,0,0.1);'>
         <h1 style='margin:0; font-size: 2.2em; color: white;'>Reserva de Material Pedagógico</h1>
         <p style='margin-top:5px; font-size: 1.1em; opacity: 0.9;'>Escola Villa Criar</p>
     </div>
     """, unsafe_allow_html=True)
+    prof.mark("cabeçalho")
+
+    db = get_storage()
+    # Somente leitura: toda alteração passa por db.commit(operação).
+    # O login desenha o formulário antes de qualquer chamada à rede e só consulta ao buscar.
+    # Famílias só consultam a própria turma (no layout fragmentado, só esse arquivo é baixado).
+    user = st.session_state.user
+    groups = [(user['grade'], user['class_name'])] if user and user['type'] == 'family' else None
+    if groups: watch_changes(groups)
+    idx = db.view(groups) if st.session_state.page != "login" else None
+    prof.mark("dados")
 
     # LOGIN
     if st.session_state.page == "login":
@@ -164,14 +242,7 @@ def main():
                 st.session_state.login_search_triggered = True
             
             if email_in:
-                s_db = data.get('students_db', [])
-                found = []
-                target_email = email_in.lower().strip()
-                for s in s_db:
-                    e1 = str(s.get('email', '')).lower().strip()
-                    e2 = str(s.get('email2', '')).lower().strip()
-                    if target_email and (target_email == e1 or target_email == e2):
-                        found.append(s)
+                found = db.view(()).students_for_email(email_in)
                 
                 if not found:
                     if st.session_state.login_search_triggered:
@@ -192,7 +263,9 @@ def main():
             st.markdown("### 🛡️ Admin")
             with st.form("adm"):
                 pwd = st.text_input("Senha", type="password")
-                if st.form_submit_button("Entrar"): login_admin(pwd, data)
+                if st.form_submit_button("Entrar"): login_admin(pwd, db.view(()))
+
+        prof.mark("login/widgets")
 
     # MENU
     elif st.session_state.page == "menu" and st.session_state.user['type'] == 'family':
@@ -212,7 +285,8 @@ def main():
                 st.session_state.page = "view_toys"; st.rerun()
 
         st.divider(); st.markdown("#### 📋 Suas Reservas")
-        my_res = [r for r in data.get('reservations', []) if str(r.get('student_name')) == str(user['student'])]
+        my_res = idx.reservations_for(user['student'])
+        prof.mark("menu/filtro")
         if not my_res: st.caption("Sem reservas.")
         else:
             for r in my_res:
@@ -222,10 +296,13 @@ def main():
                 c2.write(r.get('book_title'))
                 c3.write(r.get('timestamp'))
                 if c4.button("❌", key=f"c_m_{r.get('reservation_id')}"):
-                    if process_cancellation(db, data, sha, r.get('book_id'), user['parent'], r.get('reservation_id')):
-                        st.success("Removido!"); time.sleep(1); st.rerun()
+                    op = family_commit(db, CancelReservation(r.get('book_id'), user['parent'], r.get('reservation_id'), r.get('book_title'), groups[0]))
+                    if op.ok: st.success("Removido!"); time.sleep(1); st.rerun()
+                    else: st.error(op.error)
                 st.markdown("<hr style='margin:5px 0'>", unsafe_allow_html=True)
 
+        prof.mark("menu/widgets")
+
     # VIEW ITEMS
     elif st.session_state.page in ["view_books", "view_toys"]:
         user = st.session_state.user
@@ -237,27 +314,28 @@ def main():
         c_t.markdown(f"<h2 style='text-align:center'>{'Livros' if is_book else 'Jogos e Brinquedos'}</h2>", unsafe_allow_html=True)
         if c_o.button("Sair"): logout()
 
-        my_res = [r for r in data.get('reservations',[]) if str(r.get('student_name')) == str(user['student'])]
-        counts = {c:0 for c in ["Livro","Jogo","Brinquedo"]}
-        for r in my_res: counts[r.get('category','Livro')] += 1
+        # Contadores materializados: nada aqui percorre reservas ou itens
+        counts = {c: idx.student_count(user['student'], c) for c in CATEGORIAS}
         limits = LIMITES_RESERVA[user['segment']]
 
         cols = st.columns(len(cats))
         for i, c in enumerate(cats):
             cols[i].metric(f"Seus {c}s", f"{counts[c]} / {limits[c]}")
+            free = idx.free_count(user['grade'], user['class_name'], c)
+            cols[i].caption(f"{free} de {free + idx.reserved_count(user['grade'], user['class_name'], c)} ainda disponíveis na turma")
             if counts[c] >= limits[c]: cols[i].success("Completo!")
 
         st.divider()
-        items = data.get('books', [])
         visible = [
-            i for i in items 
-            if i['grade'] == user['grade'] and i.get('class_name') == user['class_name']
-            and i.get('category','Livro') in cats
-            and (i['available'] or str(i.get('reserved_student')) == str(user['student']))
+            i for i in idx.items_for(user['grade'], user['class_name'], cats)
+            if i['available'] or str(i.get('reserved_student')) == str(user['student'])
         ]
         visible.sort(key=lambda x: x['available'], reverse=True)
+        title_q = st.text_input("🔍 Filtrar por título", key="fam_title_q") if len(visible) > 10 else ""
+        if title_q: visible = get_search_cache().titles(visible, title_q)
+        prof.mark(f"{st.session_state.page}/filtro")
 
-        if not visible: st.info(f"Sem itens disponíveis para {user['grade']} - {user['class_name']}.")
+        if not visible: st.info(f"Nenhum item com \"{title_q}\"." if title_q else f"Sem itens disponíveis para {user['grade']} - {user['class_name']}.")
         else:
             for item in visible:
                 cat = item.get('category','Livro')
@@ -273,38 +351,28 @@ def main():
                         st.write("")
                         if is_mine:
                             if st.button("DESFAZER", key=f"u_{item['id']}", type="secondary"):
-                                if process_cancellation(db, data, sha, item['id'], user['parent']):
-                                    st.success("Feito!"); time.sleep(1); st.rerun()
+                                op = family_commit(db, CancelReservation(item['id'], user['parent'], title=item['title'], group=groups[0]))
+                                if op.ok: st.success("Feito!"); time.sleep(1); st.rerun()
+                                else: st.error(op.error)
                         elif item['available']:
                             if counts[cat] < limits[cat]:
                                 if st.button("RESERVAR", key=f"r_{item['id']}", type="primary"):
-                                    idx = next((i for i, b in enumerate(data['books']) if b['id']==item['id']), -1)
-                                    if idx!=-1 and data['books'][idx]['available']:
-                                        data['books'][idx]['available'] = False
-                                        data['books'][idx]['reserved_by'] = user['parent']
-                                        data['books'][idx]['reserved_student'] = user['student']
-                                        data['reservations'].append({
-                                            "reservation_id": int(time.time()), "book_id": item['id'],
-                                            "category": cat, "parent_name": user['parent'],
-                                            "student_name": user['student'], "grade": user['grade'],
-                                            "class_name": user['class_name'], "book_title": item['title'],
-                                            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M")
-                                        })
-                                        if db.update_data(data, sha, f"Res: {item['title']}"):
-                                            st.balloons(); time.sleep(1); st.rerun()
-                                    else: st.error("Perdeu!"); time.sleep(1); st.rerun()
+                                    op = family_commit(db, ReserveItem(item['id'], user, item['title']))
+                                    if op.ok: st.balloons(); time.sleep(1); st.rerun()
+                                    else: st.error(op.error); time.sleep(1); st.rerun()
                             else: st.button("Limite", key=f"l_{item['id']}", disabled=True)
 
+        prof.mark(f"{st.session_state.page}/widgets")
+
     # ADMIN
     elif st.session_state.page == "admin":
         st.success("Admin")
         if st.button("Sair"): logout()
-        data, sha = db.get_data()
 
-        t0, t1, t2, t3, t4, t5 = st.tabs(["👥 Alunos", "➕ Itens", "📋 Reservas", "📄 Listas", "📊 Estoque", "⚙️ Config"])
+        t0, t1, t2, t3, t4, t5, t6 = st.tabs(["👥 Alunos", "➕ Itens", "📋 Reservas", "📄 Listas", "📊 Estoque", "⚙️ Config", "⏱️ Performance"])
 
         with t0:
-            total_alunos = len(data.get('students_db', []))
+            total_alunos = len(idx.students())
             st.markdown(f"### 👥 Base de Alunos")
             st.metric(label="Total de Alunos Matriculados", value=total_alunos)
             
@@ -326,58 +394,32 @@ def main():
                             final_parents = m_parent1
                             if m_parent2: final_parents += f" / {m_parent2}"
                             new_s = {"email": m_email1, "email2": m_email2, "name": m_name, "grade": m_grade, "class_name": m_class, "parent_csv": final_parents}
-                            data['students_db'].append(new_s)
-                            if db.update_data(data, sha, f"Add {m_name}"): st.success("OK!"); st.rerun()
+                            op = db.commit(AddStudent(new_s))
+                            if op.ok: st.success("OK!"); st.rerun()
+                            else: st.error(op.error)
 
                 with c_csv:
                     st.markdown("#### Importar CSV")
                     uploaded_file = st.file_uploader("Arquivo .csv", type="csv")
                     if uploaded_file and st.button("Processar"):
                         try:
-                            try: df = pd.read_csv(uploaded_file, sep=',')
-                            except: uploaded_file.seek(0); df = pd.read_csv(uploaded_file, sep=',', encoding='latin-1')
-                            
-                            df.columns = df.columns.str.replace('#', '').str.strip()
-                            required_cols = ['Email', 'NomeAluno', 'Curso', 'CodTurno', 'NomeResponsavel']
-                            if not all(col in df.columns for col in required_cols):
-                                st.error(f"Colunas incorretas.")
-                            else:
-                                current_db = data.get('students_db', [])
-                                added = 0
-                                existing_keys = {f"{s['email']}|{s['name']}".lower() for s in current_db}
-                                for _, row in df.iterrows():
-                                    mg = MAP_CURSO_CSV.get(row['Curso'], str(row['Curso']))
-                                    mc = MAP_TURNO_CSV.get(row['CodTurno'], str(row['CodTurno']))
-                                    # Tratamento de erro para valores nulos/NaN
-                                    email_raw = str(row['Email']).strip()
-                                    if email_raw.lower() == 'nan': email_raw = ""
-                                    
-                                    aluno = str(row['NomeAluno']).strip()
-                                    resp = str(row['NomeResponsavel']).strip()
-                                    
-                                    key = f"{email_raw}|{aluno}".lower()
-                                    if key not in existing_keys:
-                                        current_db.append({
-                                            "email": email_raw, 
-                                            "email2": "", # Garante campo vazio para evitar KeyErrors
-                                            "name": aluno, 
-                                            "grade": mg, 
-                                            "class_name": mc, 
-                                            "parent_csv": resp
-                                        })
-                                        added += 1
-                                data['students_db'] = current_db
-                                if db.update_data(data, sha, f"CSV {added}"): st.success(f"{added} novos!"); time.sleep(2); st.rerun()
+                            # Deduplicação feita na aplicação, contra a base mais recente
+                            rows, skipped = read_students_csv(uploaded_file)
+                            op = db.commit(ImportStudents(rows, skipped))
+                            if op.ok:
+                                r = op.result
+                                st.success(f"{r['inserted']} novos, {r['updated']} atualizados, {r['skipped']} ignorados."); time.sleep(2); st.rerun()
+                            else: st.error(op.error)
+                        except OperationError as e: st.error(str(e))
                         except Exception as e: st.error(f"Erro: {e}")
 
             st.divider()
             st.markdown("### ✏️ Gerenciar/Editar Alunos")
             search_query = st.text_input("🔍 Buscar aluno por nome ou e-mail", placeholder="Digite para buscar...")
             if search_query:
-                s_db = data.get('students_db', [])
-                filtered_students = [(i, s) for i, s in enumerate(s_db) if search_query.lower() in s['name'].lower() or search_query.lower() in str(s.get('email','')).lower() or search_query.lower() in str(s.get('email2','')).lower()]
-                st.caption(f"{len(filtered_students)} encontrados.")
-                for index, student in filtered_students:
+                found = get_search_cache().students(idx, search_query)
+                st.caption(f"{len(found)} encontrados." + (" Mostrando os 50 mais próximos." if len(found) > 50 else ""))
+                for index, student in enumerate(found[:50]):
                     with st.expander(f"👤 {student['name']} ({student['grade']})"):
                         with st.form(key=f"edit_student_{index}"):
                             new_name = st.text_input("Nome do Aluno", value=student['name'])
@@ -392,11 +434,15 @@ def main():
                             new_parent = st.text_input("Responsáveis", value=student.get('parent_csv', ''))
                             col_save, col_del = st.columns([1,1])
                             if col_save.form_submit_button("💾 Salvar"):
-                                data['students_db'][index] = {"email": new_email, "email2": new_email2, "name": new_name, "grade": new_grade, "class_name": new_class, "parent_csv": new_parent}
-                                if db.update_data(data, sha, f"Edit Student {new_name}"): st.success("Salvo!"); time.sleep(1); st.rerun()
+                                op = db.commit(UpdateStudent(student, {"email": new_email, "email2": new_email2, "name": new_name, "grade": new_grade, "class_name": new_class, "parent_csv": new_parent}))
+                                if op.ok: st.success("Salvo!"); time.sleep(1); st.rerun()
+                                else: st.error(op.error)
                         if st.button("🗑️ Excluir Aluno", key=f"del_stud_{index}"):
-                            data['students_db'].pop(index)
-                            if db.update_data(data, sha, f"Deleted Student"): st.success("Removido."); time.sleep(1); st.rerun()
+                            op = db.commit(DeleteStudent(student))
+                            if op.ok: st.success("Removido."); time.sleep(1); st.rerun()
+                            else: st.error(op.error)
+
+        prof.mark("admin/👥 Alunos")
 
         with t1:
             st.markdown("### Cadastro Itens")
@@ -406,19 +452,24 @@ def main():
                     cat=st.selectbox("Cat", CATEGORIAS); tit=st.text_input("Nome")
                     sg=st.selectbox("Série", SERIES_LISTA); stt=st.selectbox("Turma", TURMAS_LISTA)
                     if st.form_submit_button("Salvar"):
-                        data['books'].append({"id": int(time.time()), "category": cat, "title": tit, "grade": sg, "class_name": stt, "available": True, "reserved_by": None})
-                        db.update_data(data, sha, "Add"); st.success("OK"); st.rerun()
+                        op = db.commit(AddItems([{"category": cat, "title": tit, "grade": sg, "class_name": stt, "available": True, "reserved_by": None}]))
+                        if op.ok: st.success("OK"); st.rerun()
+                        else: st.error(op.error)
             else:
                 c1,c2,c3 = st.columns(3)
                 bc=c1.selectbox("Cat", CATEGORIAS); bg=c2.selectbox("Série", SERIES_LISTA); bt=c3.selectbox("Turma", TURMAS_LISTA)
                 txt = st.text_area("Lista")
                 if st.button("Proc"):
-                    lines = txt.strip().split('\n'); count = 0
-                    for l in lines:
-                        if l.strip():
-                            data['books'].append({"id": int(time.time())+count, "category": bc, "title": l.strip(), "grade": bg, "class_name": bt, "available": True, "reserved_by": None})
-                            count+=1
-                    if count>0: db.update_data(data, sha, "Batch"); st.success("OK"); st.rerun()
+                    try:
+                        new_items = list(read_items(io.StringIO(txt), bc, bg, bt))
+                        if new_items:
+                            op = db.commit(AddItems(new_items, "Batch"))
+                            if op.ok: st.success("OK"); st.rerun()
+                            else: st.error(op.error)
+                    except OperationError as e: st.error(str(e))
+                    except Exception as e: st.error(f"Erro: {e}")
+
+        prof.mark("admin/➕ Itens")
 
         with t2:
             st.markdown("### Reservas")
@@ -426,15 +477,62 @@ def main():
             fc = c1.selectbox("Categoria", ["Todas"] + CATEGORIAS, key="res_cat")
             fg = c2.selectbox("Série", ["Todas"] + SERIES_LISTA, key="res_grade")
             ft = c3.selectbox("Turma", ["Todas"] + TURMAS_LISTA, key="res_class")
-            filtered_res = [r for r in data.get('reservations',[]) if (fc=="Todas" or r.get('category')==fc) and (fg=="Todas" or r.get('grade')==fg) and (ft=="Todas" or r.get('class_name')==ft)]
+            filtered_res = idx.reservations_where(None if fc=="Todas" else fc, None if fg=="Todas" else fg, None if ft=="Todas" else ft)
             st.write(f"Total: {len(filtered_res)}")
-            for r in filtered_res:
-                with st.expander(f"{r.get('book_title')} -> {r.get('student_name')}"):
-                    st.write(f"**Item:** {r.get('book_title')}")
-                    st.write(f"**Aluno:** {r.get('student_name')} ({r.get('grade')} - {r.get('class_name')})")
-                    if st.button("Cancelar Reserva", key=f"adm_canc_{r.get('reservation_id')}"):
-                        process_cancellation(db, data, sha, r.get('book_id'), "ADMIN_OVERRIDE", r.get('reservation_id'))
-                        st.success("Cancelado!"); time.sleep(1); st.rerun()
+            prof.mark("admin/📋 Reservas/filtro")
+            # Seleção múltipla (paginada) + ações em lote: uma única gravação por ação
+            c_ps, c_pg, c_all = st.columns([1, 1, 2])
+            page_size = c_ps.selectbox("Reservas por página", [50, 100, 200, 500], key="res_page_size")
+            n_pages = max(1, -(-len(filtered_res) // page_size))
+            page_n = c_pg.number_input(f"Página (de {n_pages})", 1, n_pages, 1, key=f"res_page_{fc}_{fg}_{ft}_{page_size}")
+            select_all = c_all.checkbox(f"Selecionar todas as {len(filtered_res)} filtradas", key="res_all")
+            page_res = filtered_res[(page_n - 1) * page_size:page_n * page_size]
+            if 'res_rev' not in st.session_state: st.session_state.res_rev = 0
+            grid = pd.DataFrame([{
+                "sel": select_all, "book_title": r.get('book_title'), "student_name": r.get('student_name'),
+                "grade": r.get('grade'), "class_name": r.get('class_name'), "category": r.get('category'), "timestamp": r.get('timestamp'),
+                "reservation_id": r.get('reservation_id')
+            } for r in page_res], columns=["sel", "book_title", "student_name", "grade", "class_name", "category", "timestamp", "reservation_id"])
+            edited = st.data_editor(
+                # reservation_id fica fora da tela e identifica a linha marcada
+                grid, hide_index=True, use_container_width=True, disabled=list(grid.columns[1:]), column_order=list(grid.columns[:-1]),
+                key=f"res_grid_{fc}_{fg}_{ft}_{page_size}_{page_n}_{select_all}_{st.session_state.res_rev}",
+                column_config={"sel": st.column_config.CheckboxColumn("✔"), "book_title": "Item", "student_name": "Aluno",
+                               "grade": "Série", "class_name": "Turma", "category": "Categoria", "timestamp": "Data"})
+            selected = [r.get('reservation_id') for r in filtered_res] if select_all else \
+                [rid for rid, sel in zip(edited["reservation_id"], edited["sel"]) if sel]
+            st.caption(f"Selecionadas: {len(selected)}")
+
+            def bulk_done(op, msg):
+                if op.ok: st.session_state.res_rev += 1; st.success(msg); time.sleep(1); st.rerun()
+                else: st.error(op.error)
+
+            c_canc, c_move = st.columns(2)
+            with c_canc:
+                st.markdown("#### ❌ Cancelar")
+                if st.button(f"Cancelar {len(selected)} reservas", disabled=not selected):
+                    op = db.commit(CancelReservations(selected))
+                    bulk_done(op, f"{op.result} reservas canceladas.")
+            with c_move:
+                st.markdown("#### 🔀 Mover")
+                dest = st.radio("Destino", ["Outro aluno", "Outra série/turma"], horizontal=True, key="res_dest")
+                if dest == "Outro aluno":
+                    q = st.text_input("Buscar aluno", key="res_move_q")
+                    matches = get_search_cache().students(idx, q, limit=50) if q else []
+                    target = st.selectbox("Aluno", matches, format_func=lambda s: f"{s['name']} ({s['grade']} - {s['class_name']})", key="res_move_student")
+                    move = ReassignReservations(selected, student=target) if target else None
+                else:
+                    c_g, c_t = st.columns(2)
+                    mg = c_g.selectbox("Série", SERIES_LISTA, key="res_move_grade"); mt = c_t.selectbox("Turma", TURMAS_LISTA, key="res_move_class")
+                    move = ReassignReservations(selected, grade=mg, class_name=mt)
+                if st.button(f"Mover {len(selected)} reservas", disabled=not selected or move is None):
+                    op = db.commit(move)
+                    if op.ok:
+                        moved, kept = op.result
+                        bulk_done(op, f"{moved} reservas movidas." + (f" {kept} mantidas (limite do aluno)." if kept else ""))
+                    else: st.error(op.error)
+
+        prof.mark("admin/📋 Reservas/widgets")
 
         with t3:
             st.markdown("### Gerar Relatórios")
@@ -442,21 +540,46 @@ def main():
             sc = c1.selectbox("Cat Lista", ["Todas"] + CATEGORIAS, key="list_cat")
             sg = c2.selectbox("Série Lista", ["Todas"] + SERIES_LISTA, key="list_grade")
             stt = c3.selectbox("Turma Lista", ["Todas"] + TURMAS_LISTA, key="list_class")
-            if st.button("Gerar Lista na Tela"):
-                lst = [r for r in data.get('reservations',[]) if (sg=="Todas" or r.get('grade')==sg) and (stt=="Todas" or r.get('class_name')==stt) and (sc=="Todas" or r.get('category')==sc)]
-                if lst: st.dataframe(pd.DataFrame(lst)[['category','student_name','parent_name','book_title','timestamp']], use_container_width=True)
-                else: st.warning("Vazio")
+            fl = (None if sc=="Todas" else sc, None if sg=="Todas" else sg, None if stt=="Todas" else stt)
+            rep = st.radio("Relatório", list(REPORTS), horizontal=True, key="list_report")
+            if st.button("Gerar na Tela"): st.session_state.list_on = True
+            if st.session_state.get("list_on"):
+                # Frames colunares cacheados por versão dos dados; downloads reaproveitam os bytes
+                frames = get_report_cache().get(idx)
+                df = getattr(frames, REPORTS[rep])(*fl)
+                if df.empty: st.warning("Vazio")
+                else:
+                    st.dataframe(df, use_container_width=True)
+                    stamp = datetime.now().strftime('%Y%m%d_%H%M')
+                    d1, d2, _ = st.columns([1, 1, 4])
+                    d1.download_button("⬇️ CSV", frames.export(REPORTS[rep], "csv", *fl), file_name=f"{REPORTS[rep]}_{stamp}.csv", mime="text/csv")
+                    if xlsx_available():
+                        d2.download_button("⬇️ XLSX", frames.export(REPORTS[rep], "xlsx", *fl), file_name=f"{REPORTS[rep]}_{stamp}.xlsx",
+                                           mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+
+        prof.mark("admin/📄 Listas")
 
         with t4:
             st.markdown("### Estoque")
-            c1, c2, c3 = st.columns(3)
+            c1, c2, c3, c4 = st.columns([1, 1, 1, 2])
             ec = c1.selectbox("Categoria Est", ["Todas"] + CATEGORIAS, key="stk_cat")
             eg = c2.selectbox("Série Est", ["Todas"] + SERIES_LISTA, key="stk_grade")
             et = c3.selectbox("Turma Est", ["Todas"] + TURMAS_LISTA, key="stk_class")
+            eq = c4.text_input("Título Est", placeholder="Buscar título...", key="stk_q")
             
-            items = [i for i in data.get('books',[]) if (ec=="Todas" or i.get('category')==ec) and (eg=="Todas" or i.get('grade')==eg) and (et=="Todas" or i.get('class_name')==et)]
-            items.sort(key=lambda x: (x['grade'], x.get('class_name',''), x['title']))
+            if eq:
+                # Na busca, a ordem é a de relevância
+                items = get_search_cache().books(idx, eq, where=lambda x: (ec=="Todas" or x.get('category','Livro')==ec) and (eg=="Todas" or x['grade']==eg) and (et=="Todas" or x.get('class_name')==et))
+            else:
+                items = idx.items_where(None if ec=="Todas" else ec, None if eg=="Todas" else eg, None if et=="Todas" else et)
+                items.sort(key=lambda x: (x['grade'], x.get('class_name',''), x['title']))
             st.caption(f"Filtrados: {len(items)}")
+            with st.expander("📈 Disponibilidade por turma"):
+                # Lido dos contadores materializados, sem percorrer os itens
+                av = idx.availability(None if ec=="Todas" else ec, None if eg=="Todas" else eg, None if et=="Todas" else et)
+                if av: st.dataframe(pd.DataFrame(av).rename(columns={"grade": "Série", "class_name": "Turma", "category": "Categoria", "free": "Livres", "reserved": "Reservados"}), hide_index=True, use_container_width=True)
+                else: st.caption("Nenhum item.")
+            prof.mark("admin/📊 Estoque/filtro")
             
             # --- ZONA DE PERIGO: EXCLUSÃO EM LOTE ---
             if items:
@@ -466,61 +589,135 @@ def main():
                     st.warning("Atenção: Esta ação apagará TODOS os itens listados acima que não estejam reservados. Ação irreversível.")
                     if st.button(f"CONFIRMAR EXCLUSÃO DE {len(items)} ITENS"):
                         # Logica de exclusão segura (mantém os reservados)
-                        ids_to_keep = []
-                        deleted_count = 0
-                        skipped_count = 0
-                        
-                        # Lista de IDs que QUEREMOS excluir (os filtrados)
-                        target_ids = {i['id'] for i in items}
-                        
-                        # Reconstrói a lista principal
-                        new_book_list = []
-                        for b in data['books']:
-                            if b['id'] in target_ids:
-                                if b['available']:
-                                    # Pode excluir
-                                    deleted_count += 1
-                                else:
-                                    # Está reservado, NÃO exclui, mantém na lista
-                                    new_book_list.append(b)
-                                    skipped_count += 1
-                            else:
-                                # Não faz parte do filtro, mantém
-                                new_book_list.append(b)
-                        
-                        data['books'] = new_book_list
-                        
-                        if db.update_data(data, sha, f"Batch delete: {deleted_count} items"):
+                        op = db.commit(DeleteItems([i['id'] for i in items]))
+                        if op.ok:
+                            deleted_count, skipped_count = op.result
                             msg = f"Sucesso! {deleted_count} itens excluídos."
                             if skipped_count > 0:
                                 msg += f" ({skipped_count} itens foram mantidos pois estão reservados)."
                             st.success(msg)
                             time.sleep(3)
                             st.rerun()
+                        else: st.error(op.error)
 
-            # LISTA NORMAL DE ITENS
+            # GRADE EDITÁVEL (paginada): só as linhas alteradas viram operações, gravadas num único commit
             st.divider()
-            for i in items:
-                icon = "🟢" if i['available'] else "🔴"
-                with st.expander(f"{icon} {i['title']} ({i['grade']} {i.get('class_name')})"):
-                    with st.form(key=f"edit_stk_{i['id']}"):
-                        n_tit = st.text_input("Título", value=i['title'])
-                        if st.form_submit_button("Salvar"):
-                            i['title'] = n_tit
-                            db.update_data(data, sha, f"Edit {i['id']}")
-                            st.success("Salvo!"); time.sleep(1); st.rerun()
-                    if st.button("Excluir", key=f"del_i_{i['id']}"):
-                        if i['available']:
-                            data['books'] = [b for b in data['books'] if b['id']!=i['id']]
-                            db.update_data(data, sha, f"Del {i['id']}"); st.rerun()
-                        else: st.error("Reservado!")
-            
+            c_ps, c_pg, _ = st.columns([1, 1, 2])
+            page_size = c_ps.selectbox("Itens por página", [50, 100, 200, 500], key="stk_page_size")
+            n_pages = max(1, -(-len(items) // page_size))
+            page_n = c_pg.number_input(f"Página (de {n_pages})", 1, n_pages, 1, key=f"stk_page_{ec}_{eg}_{et}_{eq}_{page_size}")
+            page_items = items[(page_n - 1) * page_size:page_n * page_size]
+            if 'stk_rev' not in st.session_state: st.session_state.stk_rev = 0
+            grid = pd.DataFrame([{
+                "id": i['id'], "title": i['title'], "category": i.get('category', 'Livro'), "grade": i['grade'],
+                "class_name": i.get('class_name'), "available": i['available'],
+                "reserved_student": i.get('reserved_student') or "", "delete": False
+            } for i in page_items], columns=["id", "title", "category", "grade", "class_name", "available", "reserved_student", "delete"])
+            edited = st.data_editor(
+                grid, hide_index=True, use_container_width=True, disabled=["id", "reserved_student"],
+                key=f"stk_grid_{ec}_{eg}_{et}_{eq}_{page_size}_{page_n}_{st.session_state.stk_rev}",
+                column_config={
+                    "id": st.column_config.NumberColumn("ID", format="%d"),
+                    "title": st.column_config.TextColumn("Título", required=True),
+                    "category": st.column_config.SelectboxColumn("Categoria", options=CATEGORIAS, required=True),
+                    "grade": st.column_config.SelectboxColumn("Série", options=SERIES_LISTA, required=True),
+                    "class_name": st.column_config.SelectboxColumn("Turma", options=TURMAS_LISTA, required=True),
+                    "available": st.column_config.CheckboxColumn("Disponível", help="Marcar libera o item (cancela a reserva); desmarcar não tem efeito"),
+                    "reserved_student": st.column_config.TextColumn("Reservado para"),
+                    "delete": st.column_config.CheckboxColumn("🗑️ Excluir"),
+                })
+            if st.button("💾 Salvar alterações da página"):
+                ops = item_edits(page_items, edited.to_dict("records"))
+                if not ops: st.info("Nenhuma alteração.")
+                else:
+                    ops = db.commit(ops)
+                    st.session_state.stk_rev += 1
+                    msgs = []
+                    for op in ops:
+                        if not op.ok: st.error(op.error)
+                        elif op.kind == "delete_items":
+                            msgs.append(f"{op.result[0]} excluídos" + (f" ({op.result[1]} mantidos pois estão reservados)" if op.result[1] else ""))
+                    n_edit = sum(1 for op in ops if op.ok and op.kind != "delete_items")
+                    if n_edit: msgs.insert(0, f"{n_edit} itens alterados")
+                    if msgs: st.success(", ".join(msgs) + ".")
+                    if all(op.ok for op in ops): time.sleep(1); st.rerun()
+
+        prof.mark("admin/📊 Estoque/widgets")
+
         with t5:
             with st.form("pw"):
                 p = st.text_input("Nova Senha")
                 if st.form_submit_button("Mudar"):
-                    data['admin_config']['password'] = p
-                    db.update_data(data, sha, "Pwd"); st.success("OK"); logout()
+                    op = db.commit(SetPassword(p))
+                    if op.ok: st.success("OK"); logout()
+                    else: st.error(op.error)
+            if isinstance(db, SQLiteStorage) and st.button("☁️ Backup no GitHub agora"):
+                try: get_backup_state()["rev"] = backup_to_github(db, get_github_connection()); st.success("Backup enviado!")
+                except Exception as e: st.error(f"Erro GitHub: {e}")
+            if isinstance(db, GitHubConnection) and db.journal_path:
+                st.caption(f"Journal: {len(db.jcache.data or [])} evento(s) pendentes de compactação.")
+                if st.button("🗜️ Compactar journal agora"):
+                    try: st.success(f"{db.compact()} evento(s) incorporados ao {db.file_path}.")
+                    except Exception as e: st.error(f"Erro GitHub: {e}")
+            if st.button("🔢 Conferir contadores"):
+                diffs = idx.verify()
+                if not diffs: st.success("Contadores conferem com a recontagem completa.")
+                else:
+                    st.error(f"Divergências: {sum(len(d) for d in diffs.values())}")
+                    st.json({k: {str(key): v for key, v in d.items()} for k, d in diffs.items()})
+            if isinstance(db, SQLiteStorage) and st.button("♻️ Recontar contadores"):
+                db.recount(); st.success("Contadores recalculados.")
+
+        prof.mark("admin/⚙️ Config")
+
+        with t6:
+            gh = db if isinstance(db, GitHubConnection) else get_github_connection()
+            m = gh.metrics
+            caches = gh.caches()
+            hits = sum(c.hits for c in caches); misses = sum(c.misses for c in caches)
+            headroom = m.headroom()
+            c1, c2, c3, c4 = st.columns(4)
+            c1.metric("Chamadas/min (5 min)", f"{m.calls_per_minute():.1f}")
+            c2.metric("Cache hit", f"{hits / (hits + misses):.0%}" if hits + misses else "-")
+            c3.metric("Rate limit restante", f"{m.rate[0]} / {m.rate[1]}" if headroom is not None else "-")
+            c4.metric("Folga do rate limit", f"{headroom:.0%}" if headroom is not None else "-")
+            st.markdown("#### API do GitHub")
+            summary = m.summary()
+            if summary: st.dataframe(pd.DataFrame.from_dict(summary, orient="index").round(1), use_container_width=True)
+            else: st.caption("Nenhuma chamada registrada desde o início do processo.")
+            st.markdown("#### Gravações (tentativas por operação)")
+            stats = db.stats.by_kind
+            if stats: st.dataframe(pd.DataFrame.from_dict(stats, orient="index"), use_container_width=True)
+            else: st.caption("Nenhuma gravação desde o início do processo.")
+            if db.coalescer is not None: st.caption(f"Fila de gravação: {db.coalescer.batches} commits, maior lote {db.coalescer.max_batch} operações.")
+            poller = active_poller()
+            if poller is not None:
+                st.caption(f"Vigia de mudanças: a cada {poller.interval:g}s · {poller.checks} verificações, {poller.changes} mudanças publicadas, "
+                           f"{poller.errors} erros" + (f" (último: {poller.last_error})" if poller.last_error else "") + ".")
+            if st.secrets.get("ADMISSION", True):
+                adm = get_admission(); a = adm.stats
+                st.caption(f"Fila de admissão: {adm.queued()} aguardando · {a['admitted']} admitidos em {a['batches']} lotes (maior {a['max_batch']}, "
+                           f"espera máx. {a['max_wait']:.1f}s) · recusados: {a['full']} fila cheia, {a['too_fast']} cliques rápidos, "
+                           f"{a['no_headroom']} sem rate limit, {a['expired']} expirados.")
+            st.caption(f"Busca: {get_search_cache().builds} índices montados desde o início do processo.")
+            st.download_button("⬇️ Exportar chamadas (JSONL)", m.to_jsonl(), file_name=f"github_calls_{datetime.now().strftime('%Y%m%d_%H%M')}.jsonl", mime="application/jsonl")
+        prof.mark("admin/⏱️ Performance")
+
+def profiling_enabled():
+    # Opt-in: ?profile=1 na URL ou PROFILE = true nos secrets
+    return st.query_params.get("profile") == "1" or bool(st.secrets.get("PROFILE", False))
+
+def main():
+    prof = RenderProfiler(profiling_enabled())
+    page = st.session_state.page
+    try:
+        render(prof)
+    finally:
+        # Também em st.rerun(), que interrompe o render com uma exceção
+        prof.write_trace(st.secrets.get("PROFILE_TRACE", "render_trace.jsonl"), page)
+    if prof.enabled:
+        with st.expander(f"🐞 Perfil do render ({prof.total_ms():.0f} ms)"):
+            st.dataframe(pd.DataFrame(prof.rows()), use_container_width=True)
 
 if __name__ == "__main__":
     main()
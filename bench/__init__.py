@@ -0,0 +1,3 @@
+# Benchmarks sem navegador: dados sintéticos em várias escalas, um dublê em memória da API
+# de contents do GitHub (latência e conflitos de SHA simulados) e um runner que mede as
+# operações principais em cada backend. Uso: python -m bench --help
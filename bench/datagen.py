@@ -0,0 +1,91 @@
+import csv
+import io
+import random
+from domain import MAP_CURSO_CSV, MAP_TURNO_CSV, SERIES_LISTA, LIMITES_RESERVA, get_segmento
+from migrations import SCHEMA_VERSION
+
+# --- DADOS SINTÉTICOS ---
+# Mesmo formato do data.json. "atual" reproduz o tamanho da base de hoje; as outras
+# escalas servem para achar o ponto em que cada operação deixa de caber num rerun.
+SCALES = {
+    "atual": {"items": 2_000, "students": 260, "reservations": 600},
+    "10x": {"items": 20_000, "students": 2_600, "reservations": 6_000},
+    "max": {"items": 100_000, "students": 20_000, "reservations": 50_000},
+}
+TURMAS = ["Matutino", "Vespertino"]
+GROUPS = [(g, t) for g in SERIES_LISTA for t in TURMAS]
+# Proporção dos itens por categoria (a base real é quase toda de livros)
+MIX = [("Livro", 0.8), ("Jogo", 0.1), ("Brinquedo", 0.1)]
+
+NOMES = ["ANA", "JOÃO", "MARIA", "JOSÉ", "LUÍSA", "CAIO", "BEATRIZ", "HEITOR", "CECÍLIA", "THÉO",
+         "HELENA", "ANTÔNIO", "LÍVIA", "MIGUEL", "ALICE", "GAEL", "VALENTINA", "BENÍCIO", "LAÍS", "ÍCARO"]
+SOBRENOMES = ["SILVA", "SANTOS", "OLIVEIRA", "SOUZA", "LIMA", "PEREIRA", "CONCEIÇÃO", "ARAÚJO", "GONÇALVES",
+              "CASSIANO", "MAGALHÃES", "BRANDÃO", "FALCÃO", "URPIA", "DAMASCENO", "ASSUNÇÃO"]
+TITULOS = ["A ARCA DE NOÉ", "O MENINO MALUQUINHO", "BICHOS DO BRASIL", "A FORMIGUINHA E A NEVE",
+           "CONTOS DE ENCANTAMENTO", "QUEBRA CABEÇA", "JOGO DA MEMÓRIA", "DOMINÓ DE FRAÇÕES", "BLOCOS DE MONTAR",
+           "HISTÓRIAS DA ÁFRICA", "O PEQUENO PRÍNCIPE", "MEU CADERNO DE POEMAS"]
+AUTORES = ["VINICIUS DE MORAES", "ZIRALDO", "RUTH ROCHA", "ANA MARIA MACHADO", "SYLVIA ORTHOF", "ROSSANA RAMOS"]
+EDITORAS = ["SALAMANDRA", "MODERNA", "ÁTICA", "PAULINAS", "GLOBO", "BRINQUE BOOK"]
+
+def _name(rnd, n=3):
+    return " ".join([rnd.choice(NOMES)] + rnd.sample(SOBRENOMES, n - 1))
+
+def generate(scale="atual", seed=0):
+    cfg = SCALES[scale] if isinstance(scale, str) else scale
+    rnd = random.Random(seed)
+    students = []
+    for i in range(cfg["students"]):
+        g, t = GROUPS[i % len(GROUPS)]
+        # ~10% são irmãos: mesmo e-mail do aluno anterior
+        email = students[-1]["email"] if students and rnd.random() < 0.1 else f"resp{i}@exemplo.com.br"
+        students.append({"email": email, "email2": f"resp{i}b@exemplo.com.br" if rnd.random() < 0.3 else "",
+                         "name": f"{_name(rnd)} {i}", "grade": g, "class_name": t, "parent_csv": _name(rnd, 2)})
+    books = []
+    for i in range(cfg["items"]):
+        g, t = GROUPS[i % len(GROUPS)]
+        cat = rnd.choices([c for c, _ in MIX], [w for _, w in MIX])[0]
+        title = f"{rnd.choice(TITULOS)} {i}  {rnd.choice(AUTORES)}  {rnd.choice(EDITORAS)}"
+        books.append({"id": 1_600_000_000 + i, "category": cat, "title": title, "grade": g, "class_name": t,
+                      "available": True, "reserved_by": None, "reserved_student": None})
+    # Reservas coerentes: item do grupo do aluno, dentro do limite por categoria
+    free = {}
+    for b in books: free.setdefault((b["grade"], b["class_name"], b["category"]), []).append(b)
+    for lst in free.values(): rnd.shuffle(lst)
+    reservations = []
+    taken = {}
+    order = list(students); rnd.shuffle(order)
+    while len(reservations) < cfg["reservations"] and order:
+        s = order.pop()
+        for cat, limit in LIMITES_RESERVA[get_segmento(s["grade"])].items():
+            for _ in range(rnd.randint(0, limit)):
+                pool = free.get((s["grade"], s["class_name"], cat))
+                if not pool or len(reservations) >= cfg["reservations"]: break
+                b = pool.pop()
+                b.update(available=False, reserved_by=s["parent_csv"], reserved_student=s["name"])
+                taken[(s["name"], cat)] = taken.get((s["name"], cat), 0) + 1
+                reservations.append({
+                    "reservation_id": 1_650_000_000 + len(reservations), "book_id": b["id"], "category": cat,
+                    "parent_name": s["parent_csv"], "student_name": s["name"], "grade": s["grade"],
+                    "class_name": s["class_name"], "book_title": b["title"], "timestamp": "2025-12-01 10:00"
+                })
+    return {"schema_version": SCHEMA_VERSION, "admin_config": {"password": "villa123"}, "books": books, "reservations": reservations, "students_db": students}
+
+def students_csv(doc, n, seed=0, dup_rate=0.2, encoding="utf-8"):
+    # CSV no formato da secretaria: parte das linhas repete alunos já cadastrados e
+    # algumas vêm sem e-mail, como nas exportações reais
+    rnd = random.Random(seed)
+    cursos = {v: k for k, v in MAP_CURSO_CSV.items()}
+    turnos = {v: k for k, v in MAP_TURNO_CSV.items()}
+    out = io.StringIO()
+    w = csv.writer(out)
+    w.writerow(["#Email", "NomeAluno", "Curso", "CodTurno", "NomeResponsavel"])
+    existing = doc["students_db"]
+    for i in range(n):
+        if existing and rnd.random() < dup_rate:
+            s = rnd.choice(existing)
+            w.writerow([s["email"], s["name"], cursos[s["grade"]], turnos[s["class_name"]], s["parent_csv"]])
+            continue
+        g, t = rnd.choice(GROUPS)
+        email = "" if rnd.random() < 0.02 else f"novo{seed}_{i}@exemplo.com.br"
+        w.writerow([email, f"{_name(rnd)} N{seed}_{i}", cursos[g], turnos[t], _name(rnd, 2)])
+    return out.getvalue().encode(encoding)
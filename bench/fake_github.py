@@ -0,0 +1,117 @@
+import random
+import threading
+import time
+from types import SimpleNamespace
+from github import GithubException, UnknownObjectException
+from github_storage import blob_sha
+from local_repo import GitData
+
+# --- DUBLÊ DA API DE CONTENTS ---
+# Implementa só o que o GitHubConnection usa (get_contents, ContentFile.update condicional,
+# update_file, create_file e, para o layout fragmentado, listagem de pasta e o commit com
+# vários arquivos da API Git Data), com as mesmas exceções do PyGithub.
+# Latência = `latency` (+ ruído gaussiano `jitter`) + bytes / `bandwidth` por chamada.
+# `conflict_rate`: fração das gravações em que "outra instância" commita antes (409).
+# `between_requests` / `between_writes`: os intervalos mínimos do Requester do PyGithub
+# (seconds_between_requests / seconds_between_writes), compartilhados por todas as threads como
+# no cliente único do app; None = desligado, como o app configura por padrão.
+class FakeContentFile:
+    def __init__(self, repo, path):
+        self.repo = repo; self.path = path
+        self.sha, self.decoded_content = repo.files[path]
+        self.size = len(self.decoded_content)
+
+    def update(self):
+        # If-None-Match: só transfere o corpo se o SHA mudou
+        sha, raw = self.repo._read(self.path, conditional_sha=self.sha)
+        if sha == self.sha: return False
+        self.sha, self.decoded_content, self.size = sha, raw, len(raw)
+        return True
+
+class FakeRepo(GitData):
+    def __init__(self, latency=0.05, jitter=0.01, bandwidth=5e6, conflict_rate=0.0, seed=0,
+                 between_requests=None, between_writes=None):
+        self.latency = latency; self.jitter = jitter; self.bandwidth = bandwidth
+        self.between_requests = between_requests; self.between_writes = between_writes
+        self.throttle = threading.Lock()
+        self.last = {"get": float("-inf"), "write": float("-inf")}
+        self.conflict_rate = conflict_rate
+        self.rnd = random.Random(seed)
+        self.lock = threading.Lock()
+        self.files = {}
+        self.head = 0
+        self.commits = {}
+        self.calls = {"get": 0, "get_304": 0, "put": 0, "conflicts": 0, "injected": 0}
+
+    def put(self, path, content):
+        # SHA de blob do git, como o da API
+        raw = content.encode("utf-8") if isinstance(content, str) else content
+        sha = blob_sha(raw)
+        self.files[path] = (sha, raw)
+        self.head += 1
+        return sha
+
+    def _defer(self, write):
+        # Mesma regra do Requester: espera o intervalo desde a última chamada (de qualquer tipo)
+        # e, nas gravações, também desde a última gravação
+        if not (self.between_requests or self.between_writes): return
+        with self.throttle:
+            now = time.monotonic()
+            at = max(self.last.values()) + self.between_requests if self.between_requests else now
+            if write and self.between_writes: at = max(at, self.last["write"] + self.between_writes)
+            at = max(at, now)
+            self.last["write" if write else "get"] = at
+        if at > now: time.sleep(at - now)
+
+    def _call(self, size=0, write=False):
+        self._defer(write)
+        if self.latency or self.jitter:
+            time.sleep(max(0.0, self.rnd.gauss(self.latency, self.jitter)) + size / self.bandwidth)
+
+    def _read(self, path, conditional_sha=None):
+        with self.lock:
+            if path not in self.files: raise UnknownObjectException(404, {"message": "Not Found"}, None)
+            sha, raw = self.files[path]
+            self.calls["get_304" if sha == conditional_sha else "get"] += 1
+        self._call(0 if sha == conditional_sha else len(raw))
+        return sha, raw
+
+    def get_contents(self, path, ref=None):
+        with self.lock:
+            listing = [SimpleNamespace(path=p, sha=sha) for p, (sha, _) in self.files.items()
+                       if p.startswith(path + "/") and "/" not in p[len(path) + 1:]]
+        if path not in self.files and listing:
+            self.calls["get"] += 1; self._call(100 * len(listing))
+            return listing
+        self._read(path)
+        return FakeContentFile(self, path)
+
+    def update_file(self, path, message, content, sha, branch=None):
+        self._call(len(content.encode("utf-8")), write=True)
+        with self.lock:
+            self.calls["put"] += 1
+            if path in self.files and self.rnd.random() < self.conflict_rate:
+                # Commit concorrente com o mesmo conteúdo (novo SHA): o cliente precisa reler
+                cur = self.files[path][1]
+                self.put(path, cur + b"\n" if not cur.endswith(b"\n\n") else cur.rstrip(b"\n"))
+                self.calls["injected"] += 1
+            if path not in self.files or self.files[path][0] != sha:
+                self.calls["conflicts"] += 1
+                raise GithubException(409, {"message": "is at %s but expected %s" % (self.files.get(path, ("",))[0], sha)}, None)
+            self.put(path, content)
+            return {"content": FakeContentFile(self, path)}
+
+    def create_file(self, path, message, content, branch=None):
+        self._call(len(content.encode("utf-8")), write=True)
+        with self.lock:
+            self.calls["put"] += 1
+            if path in self.files: raise GithubException(422, {"message": "sha wasn't supplied"}, None)
+            self.put(path, content)
+            return {"content": FakeContentFile(self, path)}
+
+    # --- API Git Data (local_repo.GitData) ---
+    def _store(self, path, content):
+        self.put(path, content)
+
+    def _count(self, kind):
+        self.calls[kind] += 1
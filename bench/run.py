@@ -0,0 +1,223 @@
+import argparse
+import io
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from domain import CATEGORIAS, ReserveItem, CancelReservation, ImportStudents, get_segmento
+from github_storage import GitHubConnection, ShardedGitHubConnection
+from storage import SQLiteStorage
+from metrics import percentile
+from importers import read_students_csv
+from reports import ReportCache, ReportFrames
+from search import SearchCache, SearchIndex
+from admission import AdmissionControl
+from bench.datagen import SCALES, generate, students_csv
+from bench.fake_github import FakeRepo
+
+# --- RUNNER ---
+# Cada cenário devolve uma linha: n, ok, ops/s (n / tempo total de parede) e percentis de
+# latência por operação. --json grava os resultados; --baseline compara o p95 com uma
+# execução anterior e sai com código 1 se alguma operação piorou além de --tolerance.
+BACKENDS = ("github", "journal", "sharded", "sqlite")
+
+def timed(fn, args_list, threads=1):
+    lat = []
+    def one(args):
+        t = time.perf_counter()
+        out = fn(*args)
+        lat.append((time.perf_counter() - t) * 1000)
+        return out
+    t0 = time.perf_counter()
+    if threads > 1:
+        with ThreadPoolExecutor(threads) as ex: results = list(ex.map(one, args_list))
+    else:
+        results = [one(a) for a in args_list]
+    return results, lat, time.perf_counter() - t0
+
+def row(name, results, lat, wall, ok=None, retries=0):
+    n = len(lat)
+    return {"op": name, "n": n, "ok": n if ok is None else ok, "ops_s": n / wall if wall else 0.0,
+            "p50_ms": percentile(lat, 50), "p95_ms": percentile(lat, 95), "p99_ms": percentile(lat, 99), "retries": retries}
+
+def make_store(backend, doc, args, tmp):
+    if backend == "sqlite":
+        store = SQLiteStorage(os.path.join(tmp, f"bench_{time.time_ns()}.db"))
+        store.load(doc)
+        return store, None
+    repo = FakeRepo(args.latency, args.jitter, args.bandwidth, args.conflict_rate, args.seed,
+                    args.between_requests or None, args.between_writes or None)
+    repo.put("data.json", json.dumps(doc, indent=2, ensure_ascii=False))
+    if backend == "sharded":
+        # A divisão do data.json acontece na primeira leitura, fora das medições
+        store = ShardedGitHubConnection(repo, "data.json", "main", "dados", ttl=args.ttl, max_retries=args.retries)
+        store.view(())
+        return store, repo
+    store = GitHubConnection(repo, "data.json", "main", ttl=args.ttl, max_retries=args.retries,
+                             journal_path="journal.jsonl" if backend == "journal" else "",
+                             compact_every=args.compact_every)
+    return store, repo
+
+def user_of(s):
+    return {"parent": s["parent_csv"], "student": s["name"], "grade": s["grade"], "class_name": s["class_name"],
+            "email": s["email"], "segment": get_segmento(s["grade"])}
+
+def ops_result(name, ops, lat, wall):
+    return row(name, ops, lat, wall, ok=sum(1 for op in ops if op.ok), retries=sum(op.retries for op in ops))
+
+def run_backend(scale, backend, doc, args, tmp):
+    rnd = random.Random(args.seed)
+    out = []
+    store, repo = make_store(backend, doc, args, tmp)
+
+    # Carga fria: download + parse + índice (no SQLite, só a abertura da visão)
+    def cold():
+        if repo is not None: store.invalidate()
+        return store.view()
+    out.append(row("carga fria", *timed(cold, [()] * args.loads)))
+    view = store.view()
+    students = doc["students_db"]
+
+    sample = [(rnd.choice(students)["email"],) for _ in range(args.reads)]
+    out.append(row("login (e-mail)", *timed(lambda e: store.view(()).students_for_email(e), sample)))
+
+    def listing(s):
+        v = store.view([(s["grade"], s["class_name"])])
+        cats = ["Livro"] if rnd.random() < 0.5 else ["Jogo", "Brinquedo"]
+        mine = v.reservations_for(s["name"])
+        items = [i for i in v.items_for(s["grade"], s["class_name"], cats)
+                 if i["available"] or str(i.get("reserved_student")) == s["name"]]
+        items.sort(key=lambda x: x["available"], reverse=True)
+        return len(items) + len(mine)
+    out.append(row("itens da turma", *timed(listing, [(rnd.choice(students),) for _ in range(args.reads)])))
+
+    def stock(cat, grade):
+        items = store.view().items_where(cat, grade, None)
+        items.sort(key=lambda x: (x["grade"], x.get("class_name", ""), x["title"]))
+        return len(items)
+    filters = [(rnd.choice([None] + CATEGORIAS), rnd.choice([None] + sorted({s["grade"] for s in students})))
+               for _ in range(max(1, args.reads // 10))]
+    out.append(row("filtro de estoque", *timed(stock, filters)))
+    # Relatórios: montagem dos frames (uma vez por versão) e consultas sobre o cache
+    out.append(row("relatórios: montagem", *timed(lambda: ReportFrames(store.view()), [()] * args.loads)))
+    reports = ReportCache()
+    out.append(row("relatório (lista)", *timed(lambda c, g: reports.get(store.view()).reservation_list(c, g), filters)))
+    out.append(row("relatório (cotas)", *timed(lambda c, g: reports.get(store.view()).quota_fill(c, g), filters)))
+    out.append(row("exportação CSV", *timed(lambda c, g: reports.get(store.view()).export("reservation_list", "csv", c, g), filters)))
+    # Busca: montagem do índice de títulos e consultas (sem acento, com erros de digitação)
+    titles = tuple(b["title"] for b in store.view().items_where())
+    out.append(row("busca: montagem", *timed(lambda: SearchIndex(titles), [()] * args.loads)))
+    search = SearchCache()
+    typo = lambda w: w[0] + w[2] + w[1] + w[3:] if len(w) > 4 else w   # letras trocadas
+    queries = [(" ".join(typo(w) for w in rnd.choice(titles).lower().split()[:2]),) for _ in range(args.reads)]
+    out.append(row("busca (título)", *timed(lambda q: len(search.books(store.view(), q, limit=50)), queries)))
+    names = [(s["name"].split()[0][:-1],) for s in rnd.sample(students, min(len(students), args.reads))]
+    out.append(row("busca (aluno)", *timed(lambda q: len(search.students(store.view(), q, limit=50)), names)))
+
+    # Reservas: cada aluno tenta um item livre da própria turma (escolhido antes de medir,
+    # como o clique na tela); com --threads > 1 os cliques concorrem pelo mesmo documento
+    picks = []
+    for _ in range(args.writes):
+        s = rnd.choice(students)
+        free = [i for i in view.items_for(s["grade"], s["class_name"], CATEGORIAS) if i["available"]]
+        if free: b = rnd.choice(free); picks.append((user_of(s), b["id"], b["title"]))
+    # --admission: reservas e cancelamentos passam pela fila de admissão (sessão = aluno)
+    adm = AdmissionControl(getattr(store, "metrics", None), workers=args.threads) if args.admission else None
+    commit = (lambda s, op: adm.run(store, s, op)) if adm else (lambda s, op: store.commit(op))
+    ops, lat, wall = timed(lambda u, i, t: commit(u["student"], ReserveItem(i, u, t)), picks, args.threads)
+    out.append(ops_result("reserva", ops, lat, wall))
+
+    done = [(op.result["book_id"], op.user["parent"], op.result["reservation_id"], op.result["book_title"],
+             (op.user["grade"], op.user["class_name"])) for op in ops if op.ok]
+    ops, lat, wall = timed(lambda i, p, r, t, g: commit(p, CancelReservation(i, p, r, t, g)), done, args.threads)
+    out.append(ops_result("cancelamento", ops, lat, wall))
+
+    # Contadores materializados depois das gravações: ok = 0 se divergirem da recontagem
+    res, lat, wall = timed(lambda: store.view().verify(), [()])
+    out.append(row("conferência de contadores", res, lat, wall, ok=sum(1 for d in res if not d)))
+
+    csvs = [(students_csv(doc, args.csv_rows, seed=k),) for k in range(args.imports)]
+    ops, lat, wall = timed(lambda raw: store.commit(ImportStudents(*read_students_csv(io.BytesIO(raw)))), csvs)
+    out.append(ops_result(f"importação CSV ({args.csv_rows})", ops, lat, wall))
+
+    for r in out: r.update(scale=scale, backend=backend)
+    if repo is not None: out.append({"scale": scale, "backend": backend, "op": "api", **repo.calls})
+    return out
+
+def fmt(v):
+    if v is None: return "-"
+    if isinstance(v, float): return f"{v:,.2f}" if v < 10 else f"{v:,.1f}" if v < 1e5 else f"{v:,.0f}"
+    return str(v)
+
+def print_table(rows):
+    cols = ["scale", "backend", "op", "n", "ok", "ops_s", "p50_ms", "p95_ms", "p99_ms", "retries"]
+    table = [cols] + [[fmt(r.get(c)) for c in cols] for r in rows if r["op"] != "api"]
+    widths = [max(len(line[i]) for line in table) for i in range(len(cols))]
+    for k, line in enumerate(table):
+        print("  ".join(v.ljust(w) if i < 3 else v.rjust(w) for i, (v, w) in enumerate(zip(line, widths))))
+        if k == 0: print("  ".join("-" * w for w in widths))
+    api = [r for r in rows if r["op"] == "api"]
+    if api:
+        print("\nChamadas ao dublê do GitHub:")
+        for r in api:
+            print(f"  {r['scale']:<6} {r['backend']:<8} " + " ".join(f"{k}={r[k]}" for k in ("get", "get_304", "put", "conflicts", "injected")))
+
+def compare(rows, baseline, tolerance):
+    # Regressão = p95 acima de (1 + tolerance) x o p95 da linha de base
+    old = {(r["scale"], r["backend"], r["op"]): r for r in baseline if r["op"] != "api"}
+    worse = []
+    for r in rows:
+        b = old.get((r["scale"], r["backend"], r["op"]))
+        if b and b.get("p95_ms") and r.get("p95_ms") and r["p95_ms"] > b["p95_ms"] * (1 + tolerance):
+            worse.append((r, b))
+    for r, b in worse:
+        print(f"REGRESSÃO {r['scale']}/{r['backend']}/{r['op']}: p95 {b['p95_ms']:.1f} -> {r['p95_ms']:.1f} ms")
+    return not worse
+
+def main(argv=None):
+    p = argparse.ArgumentParser(prog="python -m bench", description="Benchmark das operações principais sem navegador.")
+    p.add_argument("--scales", default="atual", help=f"lista separada por vírgula: {', '.join(SCALES)}")
+    p.add_argument("--backends", default="github,sqlite", help=f"lista separada por vírgula: {', '.join(BACKENDS)}")
+    p.add_argument("--reads", type=int, default=500, help="consultas por cenário de leitura")
+    p.add_argument("--writes", type=int, default=50, help="reservas (e depois cancelamentos)")
+    p.add_argument("--threads", type=int, default=1, help="sessões concorrentes nas gravações")
+    p.add_argument("--imports", type=int, default=3)
+    p.add_argument("--csv-rows", type=int, default=500)
+    p.add_argument("--loads", type=int, default=3, help="repetições da carga fria")
+    p.add_argument("--latency", type=float, default=0.05, help="latência base de cada chamada (s)")
+    p.add_argument("--jitter", type=float, default=0.01)
+    p.add_argument("--bandwidth", type=float, default=5e6, help="bytes/s do download/upload")
+    p.add_argument("--conflict-rate", type=float, default=0.0, help="fração das gravações com 409 forçado")
+    p.add_argument("--between-requests", type=float, default=0.0,
+                   help="intervalo mínimo entre chamadas do cliente (GH_SECONDS_BETWEEN_REQUESTS; padrão do PyGithub: 0.25)")
+    p.add_argument("--between-writes", type=float, default=0.0,
+                   help="intervalo mínimo entre gravações do cliente (GH_SECONDS_BETWEEN_WRITES; padrão do PyGithub: 1.0)")
+    p.add_argument("--ttl", type=float, default=10)
+    p.add_argument("--retries", type=int, default=5)
+    p.add_argument("--compact-every", type=int, default=100)
+    p.add_argument("--admission", action="store_true", help="reservas/cancelamentos pela fila de admissão")
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--json", help="grava os resultados neste arquivo")
+    p.add_argument("--baseline", help="resultados anteriores (--json) para comparar")
+    p.add_argument("--tolerance", type=float, default=0.25)
+    args = p.parse_args(argv)
+
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for scale in args.scales.split(","):
+            t = time.perf_counter()
+            doc = generate(scale, args.seed)
+            print(f"[{scale}] {len(doc['books'])} itens, {len(doc['students_db'])} alunos, "
+                  f"{len(doc['reservations'])} reservas (gerados em {time.perf_counter() - t:.1f}s)", file=sys.stderr)
+            for backend in args.backends.split(","):
+                rows += run_backend(scale, backend, doc, args, tmp)
+    print_table(rows)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f: json.dump(rows, f, indent=2, ensure_ascii=False)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f: baseline = json.load(f)
+        if not compare(rows, baseline, args.tolerance): return 1
+    return 0
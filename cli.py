@@ -0,0 +1,83 @@
+import argparse
+import os
+import sys
+import time
+from domain import CATEGORIAS, SERIES_LISTA, TURMAS_LISTA, OperationError
+from reports import REPORTS, xlsx_available
+import engine
+
+# --- LINHA DE COMANDO ---
+# Tarefas em lote sobre o data.json local ou no GitHub, sem o Streamlit; um commit por tarefa.
+#   python cli.py --data data.json items lista.txt --grade "1º Ano" --class A
+#   python cli.py --repo org/repo --data data.json students alunos.csv   (token em $GH_TOKEN)
+#   python cli.py --data data.json reset --grade "Grupo 3" --yes
+#   python cli.py --data data.json report quota_fill --format xlsx -o cotas.xlsx
+# Sai com código 1 se a tarefa falhar.
+
+def add_filters(p):
+    p.add_argument("--category", choices=CATEGORIAS)
+    p.add_argument("--grade", choices=SERIES_LISTA)
+    p.add_argument("--class", dest="class_name", choices=TURMAS_LISTA)
+
+def parser():
+    p = argparse.ArgumentParser(prog="python cli.py", description="Tarefas em lote sobre os dados das reservas, sem navegador.")
+    p.add_argument("--data", default="data.json", help="arquivo de dados: local ou, com --repo, o caminho no repositório")
+    p.add_argument("--repo", help="owner/nome no GitHub; sem ele --data é um arquivo local")
+    p.add_argument("--token", default=os.environ.get("GH_TOKEN"), help="token do GitHub (padrão: $GH_TOKEN)")
+    p.add_argument("--branch", default="main")
+    p.add_argument("--shards-dir", help="pasta do layout fragmentado (um arquivo por série/turma)")
+    p.add_argument("--journal", default="", help="caminho do journal, se o app usa GH_JOURNAL_PATH")
+    sub = p.add_subparsers(dest="cmd", required=True)
+    s = sub.add_parser("items", help="insere itens: um título por linha ou CSV com cabeçalho title[,category,grade,class_name]")
+    s.add_argument("file")
+    s.add_argument("--category", default="Livro", choices=CATEGORIAS)
+    s.add_argument("--grade", choices=SERIES_LISTA, help="série dos itens sem série no arquivo")
+    s.add_argument("--class", dest="class_name", choices=TURMAS_LISTA, help="turma dos itens sem turma no arquivo")
+    s = sub.add_parser("students", help="importa o CSV da secretaria (mesma regra do app)")
+    s.add_argument("file")
+    s = sub.add_parser("reset", help="fim de período: cancela as reservas e libera os itens dos filtros (sem --yes só mostra)")
+    add_filters(s)
+    s.add_argument("--delete-items", action="store_true", help="também exclui os itens dos filtros")
+    s.add_argument("--yes", action="store_true", help="grava de fato")
+    s = sub.add_parser("report", help="exporta um relatório")
+    s.add_argument("name", choices=list(REPORTS.values()))
+    s.add_argument("--format", choices=("csv", "xlsx"), default="csv")
+    s.add_argument("-o", "--output", help="arquivo de saída (padrão: stdout)")
+    add_filters(s)
+    return p
+
+def run(args, store):
+    filters = (getattr(args, "category", None), getattr(args, "grade", None), getattr(args, "class_name", None))
+    if args.cmd == "report":
+        if args.format == "xlsx" and not xlsx_available(): raise OperationError("Exportação XLSX requer o pacote openpyxl.")
+        data = engine.export_report(store, args.name, args.format, *filters)
+        if args.output:
+            with open(args.output, "wb") as f: f.write(data)
+        else: sys.stdout.buffer.write(data)
+        return f"{args.name}: {len(data)} bytes"
+    if args.cmd == "reset" and not args.yes:
+        ops = engine.reset_plan(store, *filters, delete_items=args.delete_items)
+        return "Nada a fazer." if not ops else "Sem --yes, nada gravado. Seriam: " + "; ".join(op.message() for op in ops)
+    if args.cmd == "items":
+        with open(args.file, "rb") as f: ops = engine.load_items(store, f, args.category, args.grade, args.class_name)
+    elif args.cmd == "students":
+        with open(args.file, "rb") as f: ops = engine.import_students(store, f)
+    else: ops = engine.end_of_term(store, *filters, delete_items=args.delete_items)
+    ops = ops if isinstance(ops, list) else [ops]
+    failed = [op.error for op in ops if not op.ok]
+    if failed: raise OperationError("; ".join(failed))
+    return "; ".join(f"{op.message()} -> {op.result}" for op in ops)
+
+def main(argv=None):
+    args = parser().parse_args(argv)
+    t = time.perf_counter()
+    # Só o commit da tarefa grava: ler (relatório, reset sem --yes) nunca reescreve o arquivo
+    store = engine.open_storage(args.data, args.repo, args.token, args.branch, args.shards_dir, args.journal, read_only=True)
+    try: msg = run(args, store)
+    except (OperationError, OSError) as e:
+        print(f"Erro: {e}", file=sys.stderr); return 1
+    print(f"{msg} ({time.perf_counter() - t:.1f}s)", file=sys.stderr)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,447 @@
+import time
+import threading
+from datetime import datetime
+
+# --- CONSTANTES E MAPEAMENTOS ---
+MAP_CURSO_CSV = {
+    1: "Grupo 1", 2: "Grupo 2", 3: "Grupo 3", 4: "Grupo 4", 5: "Grupo 5",
+    91: "1º Ano", 92: "2º Ano", 93: "3º Ano", 94: "4º Ano"
+}
+MAP_TURNO_CSV = {
+    "M": "Matutino",
+    "V": "Vespertino"
+}
+
+TURMAS_LISTA = ["Matutino", "Vespertino", "A", "B", "D", "Integral"]
+SERIES_LISTA = ["Grupo 1", "Grupo 2", "Grupo 3", "Grupo 4", "Grupo 5", "1º Ano", "2º Ano", "3º Ano", "4º Ano"]
+CATEGORIAS = ["Livro", "Jogo", "Brinquedo"]
+LIMITES_RESERVA = {
+    "Infantil": {"Livro": 3, "Jogo": 1, "Brinquedo": 1},
+    "Fundamental": {"Livro": 4, "Jogo": 1, "Brinquedo": 1}
+}
+
+def get_segmento(serie):
+    if "Grupo" in str(serie): return "Infantil"
+    return "Fundamental"
+
+def next_id(used, start=0):
+    # Ids baseados em timestamp, mas nunca repetidos (dois cliques no mesmo segundo)
+    new = max(int(time.time()), start)
+    while new in used: new += 1
+    return new
+
+# --- OPERAÇÕES ---
+# Cada mutação é uma operação reaplicável: em conflito de SHA ela é executada de novo
+# sobre o documento mais recente, revalidando disponibilidade e limites.
+# `index` é o DataIndex da cópia de trabalho; as operações o mantêm atualizado.
+# `groups`: séries/turmas (grade, class_name) que a operação lê e altera; None = todas.
+# O layout fragmentado só baixa e grava os arquivos dessas turmas.
+class OperationError(Exception):
+    pass
+
+class Operation:
+    kind = "op"
+    groups = None
+
+    def __init__(self):
+        self.retries = 0
+        self.ok = False
+        self.error = None
+        self.result = None
+
+    def apply(self, data, index):
+        raise NotImplementedError
+
+    def message(self):
+        return self.kind
+
+class ReserveItem(Operation):
+    kind = "reserve"
+
+    def __init__(self, item_id, user, title=None):
+        super().__init__()
+        self.item_id = item_id; self.user = user; self.title = title
+        self.groups = {(user['grade'], user['class_name'])}
+
+    def apply(self, data, index):
+        user = self.user
+        book = index.book(self.item_id, self.title)
+        if book is None or not book['available']: raise OperationError("Perdeu!")
+        cat = book.get('category', 'Livro')
+        limit = LIMITES_RESERVA[get_segmento(user['grade'])][cat]
+        if index.student_count(user['student'], cat) >= limit: raise OperationError("Limite atingido!")
+        index.set_available(book, False, user['parent'], user['student'])
+        res = {
+            "reservation_id": next_id(index.reservation_by_id), "book_id": book['id'],
+            "category": cat, "parent_name": user['parent'],
+            "student_name": user['student'], "grade": user['grade'],
+            "class_name": user['class_name'], "book_title": book['title'],
+            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M")
+        }
+        data['reservations'].append(res); index.add_reservation(res)
+        return res
+
+    def message(self):
+        return f"Res: {self.title or self.item_id}"
+
+    def event(self):
+        return {"kind": self.kind, "reservation": self.result}
+
+class CancelReservation(Operation):
+    kind = "cancel"
+
+    # `group` (opcional): turma do item, quando quem cancela já sabe (a família)
+    def __init__(self, item_id, user_parent, res_id=None, title=None, group=None):
+        super().__init__()
+        self.item_id = item_id; self.user_parent = user_parent; self.res_id = res_id; self.title = title
+        if group: self.groups = {tuple(group)}
+
+    def apply(self, data, index):
+        book = index.book(self.item_id, self.title)
+        if book is None or not (book['reserved_by'] == self.user_parent or self.user_parent == "ADMIN_OVERRIDE"):
+            raise OperationError("Reserva não encontrada.")
+        index.set_available(book, True)
+        if self.res_id: gone = [index.reservation(self.res_id)] if index.reservation(self.res_id) else []
+        else: gone = index.reservations_by_book.get(self.item_id, [])
+        gone = {id(r): r for r in gone}
+        if gone:
+            data['reservations'] = [r for r in data['reservations'] if id(r) not in gone]
+            for r in gone.values(): index.remove_reservation(r)
+
+    def message(self):
+        return f"Cancel: {self.item_id}"
+
+    def event(self):
+        return {"kind": self.kind, "item_id": self.item_id, "title": self.title, "res_id": self.res_id, "by": self.user_parent}
+
+class CancelReservations(Operation):
+    kind = "cancel_many"
+
+    # Cancelamento em lote pelo admin (fim de período): uma passada, busca por id.
+    # result = quantidade cancelada; reservas que já não existem são ignoradas.
+    def __init__(self, res_ids):
+        super().__init__()
+        self.res_ids = list(res_ids)
+
+    def apply(self, data, index):
+        gone = {}
+        for rid in self.res_ids:
+            r = index.reservation(rid)
+            if r is None or id(r) in gone: continue
+            gone[id(r)] = r
+            book = index.book(r['book_id'], r.get('book_title'))
+            if book is not None: index.set_available(book, True)
+        if not gone: raise OperationError("Nenhuma reserva encontrada.")
+        data['reservations'] = [r for r in data['reservations'] if id(r) not in gone]
+        for r in gone.values(): index.remove_reservation(r)
+        return len(gone)
+
+    def message(self):
+        return f"Cancel lote: {len(self.res_ids)} reservas"
+
+class ReassignReservations(Operation):
+    kind = "reassign"
+
+    # Move reservas para outro aluno (`student`, registro do students_db) ou, sem aluno, para
+    # outra série/turma (o item vai junto). Para outro aluno, o limite por categoria dele vale:
+    # as que passariam do limite ficam onde estão. result = (movidas, mantidas)
+    def __init__(self, res_ids, student=None, grade=None, class_name=None):
+        super().__init__()
+        self.res_ids = list(res_ids); self.student = student; self.grade = grade; self.class_name = class_name
+
+    def apply(self, data, index):
+        s = self.student
+        if s is not None:
+            target = {"student_name": s['name'], "parent_name": s.get('parent_csv') or s['name'], "grade": s['grade'], "class_name": s['class_name']}
+            limits = LIMITES_RESERVA[get_segmento(s['grade'])]
+        else:
+            target = {k: v for k, v in (("grade", self.grade), ("class_name", self.class_name)) if v}
+            if not target: raise OperationError("Destino não informado.")
+        moved = kept = 0
+        for rid in dict.fromkeys(self.res_ids):
+            r = index.reservation(rid)
+            if r is None: continue
+            if s is not None:
+                if r.get('student_name') == s['name']: continue
+                cat = r.get('category', 'Livro')
+                if index.student_count(s['name'], cat) >= limits[cat]: kept += 1; continue
+            book = index.book(r['book_id'], r.get('book_title'))
+            index.remove_reservation(r); r.update(target); index.add_reservation(r)
+            if book is not None:
+                changes = {k: target[k] for k in ("grade", "class_name") if k in target}
+                if s is not None: changes.update(reserved_by=target['parent_name'], reserved_student=target['student_name'])
+                index.update_book(book, changes)
+            moved += 1
+        if not moved: raise OperationError("Nenhuma reserva movida." + (" (limite do aluno atingido)" if kept else ""))
+        return moved, kept
+
+    def message(self):
+        return f"Mover lote: {len(self.res_ids)} reservas"
+
+class AddStudent(Operation):
+    kind = "add_student"
+
+    def __init__(self, student):
+        super().__init__()
+        self.student = student
+
+    def apply(self, data, index):
+        s = dict(self.student)
+        data['students_db'].append(s); index.add_student(s)
+
+    def message(self):
+        return f"Add {self.student.get('name')}"
+
+class UpdateStudent(Operation):
+    kind = "update_student"
+
+    # `original` identifica o registro: o índice na lista pode mudar entre leituras
+    def __init__(self, original, new):
+        super().__init__()
+        self.original = original; self.new = new
+
+    def apply(self, data, index):
+        for i, s in enumerate(data['students_db']):
+            if s == self.original:
+                index.remove_student(s)
+                data['students_db'][i] = dict(self.new); index.add_student(data['students_db'][i])
+                return
+        raise OperationError("Aluno alterado ou removido por outra pessoa.")
+
+    def message(self):
+        return f"Edit Student {self.new.get('name')}"
+
+class DeleteStudent(Operation):
+    kind = "delete_student"
+
+    def __init__(self, original):
+        super().__init__()
+        self.original = original
+
+    def apply(self, data, index):
+        for i, s in enumerate(data['students_db']):
+            if s == self.original:
+                index.remove_student(data['students_db'].pop(i)); return
+        raise OperationError("Aluno já removido.")
+
+    def message(self):
+        return "Deleted Student"
+
+def student_key(s):
+    return f"{s['email']}|{s['name']}".lower()
+
+# Campos que a importação atualiza quando o aluno (e-mail|nome) já existe
+IMPORT_UPDATABLE = ("grade", "class_name", "parent_csv")
+
+class ImportStudents(Operation):
+    kind = "import_students"
+
+    # Upsert por e-mail|nome: novo -> inserido; série/turma/responsável diferentes -> atualizado;
+    # igual -> ignorado. `skipped` soma as linhas já descartadas na leitura (repetidas/sem nome).
+    def __init__(self, students, skipped=0):
+        super().__init__()
+        self.students = students; self.skipped = skipped
+
+    def apply(self, data, index):
+        existing = {}
+        for s in data['students_db']: existing.setdefault(student_key(s), s)
+        counts = {"inserted": 0, "updated": 0, "skipped": self.skipped}
+        for s in self.students:
+            key = student_key(s)
+            cur = existing.get(key)
+            if cur is None:
+                s = dict(s)
+                data['students_db'].append(s); index.add_student(s); existing[key] = s
+                counts["inserted"] += 1; continue
+            changes = {k: s[k] for k in IMPORT_UPDATABLE if s.get(k) and cur.get(k) != s[k]}
+            if changes: cur.update(changes); counts["updated"] += 1
+            else: counts["skipped"] += 1
+        return counts
+
+    def message(self):
+        return f"CSV {len(self.students)}"
+
+class AddItems(Operation):
+    kind = "add_items"
+
+    # `items` sem id: os ids são gerados na aplicação, únicos no documento atual
+    def __init__(self, items, msg="Add"):
+        super().__init__()
+        self.items = items; self.msg = msg
+
+    def apply(self, data, index):
+        new = 0
+        for it in self.items:
+            new = next_id(index.books_by_id, new + 1)
+            b = {"id": new, **it}
+            data['books'].append(b); index.add_book(b)
+        return len(self.items)
+
+    def message(self):
+        return self.msg
+
+# Colunas que definem o grupo do item: num item reservado mudariam a turma/cota da reserva
+GROUP_COLS = ("grade", "class_name", "category")
+RESERVED_GROUP_MSG = "Item reservado: cancele a reserva antes de mudar série, turma ou categoria."
+
+class UpdateItem(Operation):
+    kind = "update_item"
+
+    # Disponibilidade não muda por aqui: liberar é CancelReservation e reservar é da família.
+    # Em item reservado só o título muda (e vai junto para a reserva).
+    def __init__(self, item_id, changes, title=None):
+        super().__init__()
+        self.item_id = item_id; self.title = title
+        self.changes = {k: v for k, v in changes.items() if k != "available"}
+
+    def apply(self, data, index):
+        book = index.book(self.item_id, self.title)
+        if book is None: raise OperationError("Item removido por outra pessoa.")
+        if not book['available'] and any(k in self.changes and self.changes[k] != book.get(k) for k in GROUP_COLS):
+            raise OperationError(RESERVED_GROUP_MSG)
+        if not book['available'] and "title" in self.changes:
+            for r in index.reservations_by_book.get(book['id'], []):
+                if r.get('book_title') == book['title']: r['book_title'] = self.changes['title']
+        index.update_book(book, self.changes)
+
+    def message(self):
+        return f"Edit {self.item_id}"
+
+class DeleteItems(Operation):
+    kind = "delete_items"
+
+    # Itens reservados nunca são excluídos; result = (excluídos, mantidos).
+    # `scope` (categoria, série, turma; None = qualquer): com ids repetidos em dados antigos,
+    # só os itens do filtro são excluídos
+    def __init__(self, item_ids, msg=None, scope=None):
+        super().__init__()
+        self.item_ids = set(item_ids); self.msg = msg; self.scope = scope
+
+    def _inside(self, b):
+        if self.scope is None: return True
+        cat, grade, class_name = self.scope
+        return (cat is None or b.get('category', 'Livro') == cat) and (grade is None or b.get('grade') == grade) and (class_name is None or b.get('class_name') == class_name)
+
+    def apply(self, data, index):
+        deleted = skipped = 0
+        new_book_list = []
+        for b in data['books']:
+            if b['id'] in self.item_ids and self._inside(b):
+                if b['available']: deleted += 1; index.remove_book(b); continue
+                skipped += 1
+            new_book_list.append(b)
+        if not deleted: raise OperationError("Nenhum item excluído (itens reservados são mantidos).")
+        data['books'] = new_book_list
+        return deleted, skipped
+
+    def message(self):
+        return self.msg or f"Batch delete: {len(self.item_ids)} items"
+
+class ReleaseItems(Operation):
+    kind = "release_items"
+
+    # Libera os itens do filtro (categoria, série, turma; None = qualquer) marcados como reservados
+    # sem nenhuma reserva que aponte para eles (dados antigos). result = itens liberados
+    def __init__(self, scope=(None, None, None)):
+        super().__init__()
+        self.scope = tuple(scope)
+
+    def apply(self, data, index):
+        n = 0
+        for b in index.items_where(*self.scope):
+            if b['available']: continue
+            if any(index.book(r.get('book_id'), r.get('book_title')) is b for r in index.reservations_by_book.get(b['id'], [])): continue
+            index.set_available(b, True); n += 1
+        return n
+
+    def message(self):
+        return "Liberar itens sem reserva"
+
+class SetPassword(Operation):
+    kind = "set_password"
+
+    def __init__(self, password):
+        super().__init__()
+        self.password = password
+
+    def apply(self, data, index):
+        data['admin_config']['password'] = self.password
+
+    def message(self):
+        return "Pwd"
+
+# Colunas editáveis na grade do estoque
+ITEM_EDIT_COLS = ("title", "category", "grade", "class_name", "available")
+
+def item_edits(original, edited):
+    # Diff da grade do estoque: `original` são os itens exibidos e `edited` as linhas depois da
+    # edição ("delete": True nas marcadas), casadas pela coluna id (ids repetidos de dados antigos
+    # casam na ordem em que aparecem). Só linhas alteradas viram operações, para serem gravadas
+    # juntas num único commit.
+    by_id = {}
+    for old in original: by_id.setdefault(old['id'], []).append(old)
+    ops, delete = [], []
+    for new in edited:
+        olds = by_id.get(new.get('id'))
+        if not olds: continue
+        old = olds.pop(0)
+        if new.get("delete"): delete.append(old['id']); continue
+        changes = {k: new[k] for k in ITEM_EDIT_COLS if new.get(k) is not None and new[k] != old.get(k)}
+        if isinstance(changes.get("title"), str): changes["title"] = changes["title"].strip() or old['title']
+        if changes.get("title") == old['title']: del changes["title"]
+        # Marcar um item reservado como disponível é cancelar a reserva; desmarcar um item livre
+        # não tem efeito (deixaria o item indisponível sem reserva)
+        if changes.pop("available", None) is True and not old['available']:
+            ops.append(CancelReservation(old['id'], "ADMIN_OVERRIDE", None, old['title']))
+        if changes: ops.append(UpdateItem(old['id'], changes, old['title']))
+    if delete: ops.append(DeleteItems(delete))
+    return ops
+
+def batch_message(ops):
+    # Mensagem do commit: detalhada para poucos itens, resumo por tipo para lotes grandes
+    if len(ops) <= 5: return " | ".join(op.message() for op in ops)
+    kinds = {}
+    for op in ops: kinds[op.kind] = kinds.get(op.kind, 0) + 1
+    return f"Lote: {len(ops)} operações (" + ", ".join(f"{k}={n}" for k, n in kinds.items()) + ")"
+
+# --- JOURNAL ---
+# Reservas e cancelamentos podem ser gravados como eventos (JSONL) em vez de reescrever o
+# documento. Cada evento carrega o resultado já validado (id e horário da reserva), então
+# reaplicá-lo é determinístico. O documento guarda em `journal_seq` o último evento incorporado.
+JOURNALED = ("reserve", "cancel")
+
+def journal_seq(data, events=()):
+    return max([data.get('journal_seq', 0)] + [e['seq'] for e in events])
+
+def pending_events(data, events):
+    return [e for e in events if e['seq'] > data.get('journal_seq', 0)]
+
+def replay(data, index, events):
+    # Eventos que não se aplicam mais (item excluído pelo admin entre leituras) são ignorados
+    applied = 0
+    for ev in events:
+        if ev['kind'] == "reserve":
+            res = ev['reservation']
+            book = index.book(res['book_id'], res.get('book_title'))
+            if book is None or not book['available']: continue
+            index.set_available(book, False, res['parent_name'], res['student_name'])
+            res = dict(res)
+            data['reservations'].append(res); index.add_reservation(res)
+        elif ev['kind'] == "cancel":
+            try: CancelReservation(ev['item_id'], "ADMIN_OVERRIDE", ev.get('res_id'), ev.get('title')).apply(data, index)
+            except OperationError: continue
+        applied += 1
+    return applied
+
+# --- ESTATÍSTICAS ---
+class OperationStats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.by_kind = {}
+
+    def record(self, op):
+        with self.lock:
+            s = self.by_kind.setdefault(op.kind, {"ok": 0, "failed": 0, "retries": 0, "max_retries": 0})
+            s["ok" if op.ok else "failed"] += 1
+            s["retries"] += op.retries
+            s["max_retries"] = max(s["max_retries"], op.retries)
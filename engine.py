@@ -0,0 +1,59 @@
+import os
+from github import Github
+from domain import OperationError, AddItems, ImportStudents, CancelReservations, ReleaseItems, DeleteItems
+from github_storage import GitHubConnection, ShardedGitHubConnection
+from local_repo import LocalRepo
+from importers import read_students_csv, read_items
+from reports import ReportFrames
+
+# --- MOTOR SEM INTERFACE ---
+# As operações do domain, os importadores e os relatórios do app, fora do Streamlit (cli.py,
+# scripts de início de ano). Cada tarefa lê a entrada inteira e grava num único commit_now;
+# devolve a operação (ou a lista) com ok/error/result preenchidos, como o Storage.
+# OperationError: entrada inválida ou nada a fazer, antes de qualquer gravação.
+
+def open_storage(path, repo=None, token=None, branch="main", shards_dir=None, journal_path="", read_only=False):
+    # Sem `repo`, `path` é um arquivo local (LocalRepo na pasta dele, sem token); com `repo`
+    # (owner/nome), é o caminho do data.json no repositório. ttl=0: cada tarefa lê a versão atual.
+    # `read_only`: a leitura não grava a migração do esquema; só o commit da própria tarefa grava.
+    if repo: client = Github(token, seconds_between_requests=None, seconds_between_writes=None); source = client.get_repo(repo, lazy=True)
+    else: client = None; source = LocalRepo(os.path.dirname(os.path.abspath(path))); path = os.path.basename(path)
+    if shards_dir: return ShardedGitHubConnection(source, path, branch, shards_dir, client=client, ttl=0, migrate_in_memory=read_only)
+    return GitHubConnection(source, path, branch, client=client, ttl=0, journal_path=journal_path, migrate_in_memory=read_only)
+
+def load_items(store, f, category="Livro", grade=None, class_name=None):
+    # Arquivo no formato de importers.read_items; result = itens inseridos
+    items = list(read_items(f, category, grade, class_name))
+    if not items: raise OperationError("Nenhum item no arquivo.")
+    return store.commit_now(AddItems(items, f"Lote: {len(items)} itens"))
+
+def import_students(store, f):
+    # CSV da secretaria; result = {"inserted", "updated", "skipped"}
+    students, skipped = read_students_csv(f)
+    if not students: raise OperationError("Nenhum aluno no arquivo.")
+    return store.commit_now(ImportStudents(students, skipped))
+
+def reset_plan(store, category=None, grade=None, class_name=None, delete_items=False):
+    # Operações do fim de período para os filtros (None = todas): cancela as reservas, libera os
+    # itens do filtro marcados como reservados sem reserva (dados antigos) e, com `delete_items`,
+    # exclui os itens, todos livres depois disso
+    view = store.view()
+    ops = []
+    res = [r['reservation_id'] for r in view.reservations_where(category, grade, class_name)]
+    if res: ops.append(CancelReservations(res))
+    held = {(r.get('book_id'), r.get('book_title')) for r in view.reservations_where()}
+    if any(not b['available'] and (b['id'], b['title']) not in held for b in view.items_where(category, grade, class_name)):
+        ops.append(ReleaseItems((category, grade, class_name)))
+    if delete_items:
+        ids = [b['id'] for b in view.items_where(category, grade, class_name)]
+        if ids: ops.append(DeleteItems(ids, f"Fim de período: {len(ids)} itens", (category, grade, class_name)))
+    return ops
+
+def end_of_term(store, category=None, grade=None, class_name=None, delete_items=False):
+    ops = reset_plan(store, category, grade, class_name, delete_items)
+    if not ops: raise OperationError("Nenhuma reserva ou item com esses filtros.")
+    return store.commit_now(ops)
+
+def export_report(store, report, fmt="csv", category=None, grade=None, class_name=None):
+    # Bytes do CSV/XLSX de um relatório (nomes em reports.REPORTS)
+    return ReportFrames(store.view()).export(report, fmt, category, grade, class_name)
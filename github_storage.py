@@ -0,0 +1,609 @@
+import re
+import json
+import time
+import copy
+import random
+import hashlib
+import threading
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime
+from github import GithubException, UnknownObjectException, InputGitTreeElement
+from indexes import DataIndex
+from storage import Storage
+from metrics import ApiMetrics
+from domain import OperationError, OperationStats, JOURNALED, journal_seq, pending_events, replay, batch_message
+from migrations import SCHEMA_VERSION, new_document, needs_migration, migrate
+
+# --- CACHE DE SNAPSHOT ---
+# Um único documento parseado por conexão (uma por processo), compartilhado entre sessões e reruns.
+# Revalidado com If-None-Match (ETag) após o TTL; 304 não consome rate limit.
+class SnapshotCache:
+    def __init__(self, ttl=10):
+        self.lock = threading.Lock()
+        self.ttl = ttl
+        self.data = None
+        self.sha = None
+        self.contents = None
+        self.index = None
+        self.merged = None
+        self.merged_key = None
+        self.checked_at = 0.0
+        self.hits = 0
+        self.misses = 0
+
+    def fresh(self):
+        return self.data is not None and (time.time() - self.checked_at) < self.ttl
+
+    def store(self, data, sha, contents=None):
+        self.data = data; self.sha = sha; self.contents = contents
+        self.checked_at = time.time()
+
+    def invalidate(self):
+        self.data = None; self.sha = None; self.contents = None; self.checked_at = 0.0
+        self.index = None; self.merged = None; self.merged_key = None
+
+    def expire(self):
+        # Força revalidação condicional na próxima leitura, mantendo o ETag
+        self.checked_at = 0.0
+
+def parse_doc(raw):
+    # Só parsing: documentos de versão antiga são migrados uma vez em _load
+    return json.loads(raw.decode("utf-8")) if raw else new_document()
+
+def parse_journal(raw):
+    return [json.loads(l) for l in raw.decode("utf-8").splitlines() if l.strip()] if raw else []
+
+# --- CLASSE GITHUB ---
+class GitHubConnection(Storage):
+    # `repo` é um Repository do PyGithub (ou qualquer objeto com a mesma API de contents);
+    # `client` (o Github) só é usado para ler o rate limit dos cabeçalhos
+    def __init__(self, repo, file_path, branch, client=None, ttl=10, max_retries=5,
+                 metrics=None, journal_path="", compact_every=100, migrate_in_memory=False):
+        self.g = client
+        self.repo = repo
+        self.file_path = file_path
+        self.branch = branch
+        self.cache = SnapshotCache(ttl)
+        self.max_retries = max_retries
+        self.stats = OperationStats()
+        self.metrics = metrics or ApiMetrics()
+        # journal_path (opcional): reservas/cancelamentos viram eventos num JSONL pequeno,
+        # incorporado ao data.json a cada `compact_every` eventos
+        self.journal_path = journal_path
+        self.compact_every = compact_every
+        if journal_path: self.jcache = SnapshotCache(ttl)
+        # migrate_in_memory: leituras não gravam nada (migração/divisão só em memória; vão junto
+        # no próximo commit_now). Para tarefas avulsas, como os relatórios do cli.py.
+        self.migrate_in_memory = migrate_in_memory
+
+    # --- chamadas à API (todas instrumentadas) ---
+    @contextmanager
+    def _api(self, call, path, size=0):
+        rec = {"ts": time.time(), "call": call, "path": path, "bytes": size, "status": 200}
+        t = time.perf_counter()
+        try:
+            yield rec
+        except GithubException as e:
+            rec["status"] = e.status; raise
+        except Exception as e:
+            rec["status"] = type(e).__name__; raise
+        finally:
+            rec["ms"] = (time.perf_counter() - t) * 1000
+            req = getattr(self.g, "requester", None)
+            remaining, limit = getattr(req, "rate_limiting", (-1, -1))
+            if limit >= 0: rec["rate_remaining"], rec["rate_limit"] = remaining, limit
+            if getattr(req, "rate_limiting_resettime", 0): rec["rate_reset"] = req.rate_limiting_resettime
+            self.metrics.record(rec)
+
+    def _get(self, path):
+        with self._api("get_contents", path) as rec:
+            contents = self.repo.get_contents(path, ref=self.branch)
+            rec["bytes"] = contents.size or 0
+        return contents
+
+    def _revalidate(self, contents, path):
+        # If-None-Match: 304 -> False (nada mudou), 200 -> True e `contents` atualizado
+        with self._api("get_contents (condicional)", path) as rec:
+            changed = contents.update()
+            rec["status"] = 200 if changed else 304
+            if changed: rec["bytes"] = contents.size or 0
+        return changed
+
+    def _put(self, path, msg, content, sha):
+        # Devolve o ContentFile da resposta: fica no cache, e a próxima revalidação continua
+        # condicional em vez de baixar o arquivo de novo. (No GitHub, se o ETag do PUT não casar
+        # com o do GET, a primeira revalidação baixa uma vez; o SHA igual evita o parse.)
+        # Criar um arquivo que outra instância acabou de criar dá 422 ("sha" wasn't supplied):
+        # é o mesmo conflito do SHA desatualizado, então vira 409 e quem chamou relê e repete.
+        call = "update_file" if sha else "create_file"
+        try:
+            with self._api(call, path, len(content.encode("utf-8"))):
+                if sha: res = self.repo.update_file(path, msg, content, sha, branch=self.branch)
+                else: res = self.repo.create_file(path, msg, content, branch=self.branch)
+        except GithubException as e:
+            if not sha and e.status == 422 and "sha" in str(e.data): raise GithubException(409, e.data, e.headers)
+            raise
+        return res["content"]
+
+    def _fetch(self, c, path, parse, empty):
+        with c.lock:
+            if c.fresh():
+                c.hits += 1
+                return c.data, c.sha
+            try:
+                if c.contents is not None and not self._revalidate(c.contents, path):
+                    c.hits += 1; c.checked_at = time.time()
+                    return c.data, c.sha
+                contents = c.contents if c.contents is not None else self._get(path)
+                c.misses += 1
+                if c.data is not None and contents.sha == c.sha:
+                    c.store(c.data, c.sha, contents)
+                    return c.data, c.sha
+                c.store(parse(contents.decoded_content), contents.sha, contents)
+                return c.data, c.sha
+            except UnknownObjectException:
+                c.store(parse(b""), None)
+                return c.data, c.sha
+            except Exception:
+                if c.data is not None: return c.data, c.sha
+                return empty(), None
+
+    def _load(self):
+        # (documento materializado, sha do data.json, eventos do journal, sha do journal)
+        data, sha, events, jsha = self._load_current()
+        if needs_migration(data): return self._upgrade(data, sha, events, jsha)
+        return data, sha, events, jsha
+
+    def _upgrade(self, data, sha, events, jsha):
+        # Migração única do esquema: grava o documento migrado (com o journal incorporado).
+        # Se a gravação falhar (ex.: 409, outra instância migrou antes), segue com a cópia
+        # migrada em memória e a próxima leitura busca o documento novo. Os eventos continuam
+        # no journal até a compactação; os já incorporados são ignorados pelo journal_seq.
+        doc = copy.deepcopy(data)
+        applied = migrate(doc)
+        if self.journal_path: doc['journal_seq'] = journal_seq(data, events)
+        if self.migrate_in_memory: return doc, sha, events, jsha
+        try: sha = self.write(doc, sha, f"Migração do esquema: v{', v'.join(map(str, applied))}")
+        except Exception:
+            with self.cache.lock: self.cache.expire()
+        return doc, sha, events, jsha
+
+    def _load_current(self):
+        data, sha = self._fetch(self.cache, self.file_path, parse_doc, new_document)
+        if not self.journal_path: return data, sha, [], None
+        events, jsha = self._fetch(self.jcache, self.journal_path, parse_journal, list)
+        c = self.cache
+        with c.lock:
+            if c.merged_key != (sha, jsha):
+                merged = copy.deepcopy(data); index = DataIndex(merged, sha)
+                replay(merged, index, pending_events(merged, events))
+                c.merged, c.merged_key, c.index = merged, (sha, jsha), index
+            return c.merged, sha, events, jsha
+
+    def get_snapshot(self):
+        # Retorna (data, sha) compartilhados: NÃO modificar o dicionário retornado.
+        data, sha, _, _ = self._load()
+        return data, sha
+
+    def get_data(self):
+        data, sha = self.get_snapshot()
+        return copy.deepcopy(data), sha
+
+    def view(self, groups=None):
+        return self.get_index()
+
+    def caches(self):
+        return [self.cache] + ([self.jcache] if self.journal_path else [])
+
+    def invalidate(self):
+        for c in self.caches():
+            with c.lock: c.invalidate()
+
+    def poll(self):
+        # Revalida agora, fora das sessões (ChangePoller): pedido condicional e, se o arquivo
+        # mudou, o índice novo já fica montado. Devolve a versão publicada (DataIndex.ver), que
+        # também muda com as gravações deste processo.
+        for c in self.caches():
+            with c.lock: c.expire()
+        return self.get_index().ver
+
+    def export(self):
+        return self.get_data()[0]
+
+    def get_index(self):
+        # Índice da versão atual; idx.data é o snapshot compartilhado (somente leitura)
+        data, sha = self.get_snapshot()
+        c = self.cache
+        with c.lock:
+            if c.index is None or c.index.data is not data:
+                c.index = DataIndex(data, sha)
+            return c.index
+
+    def write(self, new_data, sha, msg, index=None):
+        # Escrita crua (levanta GithubException); `new_data` passa a ser o snapshot compartilhado
+        # e não deve mais ser alterado por quem chamou
+        content = json.dumps(new_data, indent=2, ensure_ascii=False)
+        contents = self._put(self.file_path, msg, content, sha)
+        new_sha = contents.sha
+        if index is not None: index.sha = new_sha
+        c = self.cache
+        with c.lock:
+            c.store(new_data, new_sha, contents)
+            c.merged, c.merged_key, c.index = new_data, (new_sha, self.jcache.sha if self.journal_path else None), index
+        return new_sha
+
+    def write_journal(self, events, jsha, msg, data, sha, index):
+        # Grava só o JSONL de eventos (desde a última compactação), não o documento inteiro
+        content = "".join(json.dumps(e, ensure_ascii=False) + "\n" for e in events)
+        contents = self._put(self.journal_path, msg, content, jsha)
+        new_jsha = contents.sha
+        with self.jcache.lock: self.jcache.store(events, new_jsha, contents)
+        c = self.cache
+        with c.lock: c.merged, c.merged_key, c.index = data, (sha, new_jsha), index
+        return new_jsha
+
+    def replace_document(self, doc, msg):
+        # Sobrescreve o data.json inteiro (backup/migração), marcando o journal como incorporado
+        data, sha, events, _ = self._load()
+        if self.journal_path: doc['journal_seq'] = journal_seq(data, events)
+        return self.write(doc, sha, msg)
+
+    def compact(self):
+        # Incorpora o journal ao data.json e o esvazia; eventos já incorporados são ignorados
+        # na leitura, então uma falha entre as duas gravações não duplica nada, e a próxima
+        # compactação só esvazia o journal
+        data, sha, events, jsha = self._load()
+        if not events: return 0
+        if pending_events(data, events):
+            data = copy.deepcopy(data)
+            data['journal_seq'] = journal_seq(data, events)
+            sha = self.write(data, sha, f"Compact journal ({len(events)} eventos)")
+        try: self.write_journal([], jsha, "Compact journal", data, sha, None)
+        except GithubException:
+            with self.jcache.lock: self.jcache.expire()
+        return len(events)
+
+    def commit_now(self, ops):
+        # Aplica as operações sobre o documento mais recente e grava com o SHA lido.
+        # Em 409 (SHA desatualizado, ou arquivo criado por outra instância) relê, revalida e
+        # tenta de novo com backoff limitado.
+        single = not isinstance(ops, list)
+        ops = [ops] if single else ops
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                time.sleep(min(2.0, 0.2 * 2 ** attempt) * random.uniform(0.5, 1.5))
+                for op in ops: op.retries += 1
+            base, sha, events, jsha = self._load()
+            data = copy.deepcopy(base)
+            index = DataIndex(data, sha)
+            pending = []
+            for op in ops:
+                try:
+                    op.result = op.apply(data, index); op.ok = True; op.error = None
+                    pending.append(op)
+                except OperationError as e:
+                    op.ok = False; op.error = str(e)
+            if not pending: break
+            msg = batch_message(pending)
+            journaled = self.journal_path and all(op.kind in JOURNALED for op in pending)
+            try:
+                if journaled:
+                    seq = journal_seq(data, events)
+                    now = datetime.now().isoformat(timespec="seconds")
+                    new_events = [dict(op.event(), seq=seq + i + 1, at=now) for i, op in enumerate(pending)]
+                    self.write_journal(events + new_events, jsha, msg, data, sha, index)
+                else:
+                    if self.journal_path: data['journal_seq'] = journal_seq(data, events)
+                    self.write(data, sha, msg, index)
+                break
+            except GithubException as e:
+                with self.cache.lock: self.cache.expire()
+                if self.journal_path:
+                    with self.jcache.lock: self.jcache.expire()
+                if e.status == 409 and attempt < self.max_retries: continue
+                err = "Muitas alterações simultâneas, tente novamente." if e.status == 409 else f"Erro GitHub: {e}"
+            except Exception as e:
+                with self.cache.lock: self.cache.invalidate()
+                err = f"Erro GitHub: {e}"
+            for op in pending: op.ok = False; op.error = err
+            break
+        for op in ops: self.stats.record(op)
+        if self.journal_path and len(self.jcache.data or []) >= self.compact_every:
+            try: self.compact()
+            except Exception: pass
+        return ops[0] if single else ops
+
+# --- LAYOUT FRAGMENTADO ---
+# Com `shards_dir`, os dados ficam em vários arquivos dentro dessa pasta:
+#   manifest.json           schema_version, admin_config e as turmas [{grade, class_name, path}]
+#   students.json           students_db
+#   <série>_<turma>.json    itens e reservas de uma série/turma
+# view(groups) e commit_now(ops) só baixam o manifest, os alunos e as turmas pedidas
+# (Operation.groups) e só gravam os arquivos que mudaram: uma reserva reescreve o arquivo da
+# própria turma, e gravações em turmas diferentes não disputam o mesmo SHA. Alterações em
+# vários arquivos vão num único commit (API Git Data), recusado se algum deles mudou desde a
+# leitura. Sem manifest, o data.json (`file_path`) é dividido na primeira leitura e fica como
+# estava. O journal não é usado nesse layout.
+MANIFEST = "manifest.json"
+STUDENTS = "students.json"
+
+def parse_manifest(raw):
+    # {} = pasta ainda sem manifest (dispara a divisão do data.json)
+    return json.loads(raw.decode("utf-8")) if raw else {}
+
+def parse_students(raw):
+    return json.loads(raw.decode("utf-8")) if raw else []
+
+def parse_shard(raw):
+    return json.loads(raw.decode("utf-8")) if raw else {"books": [], "reservations": []}
+
+def blob_sha(text):
+    # SHA do blob no git (o mesmo que a API devolve), sem reler o arquivo gravado; texto ou bytes
+    raw = text.encode("utf-8") if isinstance(text, str) else text
+    return hashlib.sha1(b"blob %d\0" % len(raw) + raw).hexdigest()
+
+def shard_name(grade, class_name, used):
+    base = unicodedata.normalize("NFKD", f"{grade}_{class_name}").encode("ascii", "ignore").decode().lower()
+    base = re.sub(r"[^a-z0-9_]+", "-", base).strip("-") or "turma"
+    name, n = f"{base}.json", 1
+    while name in used: n += 1; name = f"{base}-{n}.json"
+    return name
+
+class ShardedGitHubConnection(GitHubConnection):
+    def __init__(self, repo, file_path, branch, shards_dir, client=None, ttl=10, max_retries=5, metrics=None,
+                 migrate_in_memory=False):
+        super().__init__(repo, file_path, branch, client, ttl, max_retries, metrics, migrate_in_memory=migrate_in_memory)
+        self.dir = shards_dir.strip("/")
+        self.lock = threading.Lock()
+        self.files = {}   # caminho -> SnapshotCache
+        self.views = {}   # seleção de turmas -> (SHAs lidos, DataIndex)
+
+    def _path(self, name):
+        return f"{self.dir}/{name}"
+
+    def _cache(self, path):
+        with self.lock: return self.files.setdefault(path, SnapshotCache(self.cache.ttl))
+
+    def caches(self):
+        with self.lock: return [self.cache] + list(self.files.values())
+
+    def invalidate(self):
+        super().invalidate()
+        with self.lock: self.views.clear()
+
+    def poll(self):
+        # Só os arquivos e seleções já em uso: revalida e remonta as visões que mudaram.
+        # Versão por turma, {None: SHAs do manifest e dos alunos, (série, turma): SHA do arquivo
+        # dela}, para o vigia só recarregar as sessões da turma que mudou
+        for c in self.caches():
+            with c.lock: c.expire()
+        with self.lock: sels = sorted(self.views, key=lambda sel: sel is not None)
+        for sel in sels: self.view(sel)
+        mc, sc = self._cache(self._path(MANIFEST)), self._cache(self._path(STUDENTS))
+        versions = {None: (mc.sha, sc.sha)}
+        with self.lock:
+            for g in (mc.data or {}).get('groups', []):
+                c = self.files.get(self._path(g['path']))
+                if c is not None and c.data is not None: versions[(g['grade'], g['class_name'])] = c.sha
+        return versions
+
+    def _paths(self, m, groups):
+        return [self._path(g['path']) for g in m.get('groups', []) if groups is None or (g['grade'], g['class_name']) in groups]
+
+    def _read(self, paths, parse):
+        # Cada arquivo é revalidado uma vez só (com ttl=0 nenhum fica fresco entre duas consultas)
+        stale = [p for p in paths if not self._cache(p).fresh()]
+        fetch = lambda p: self._fetch(self._cache(p), p, parse, lambda: parse(b""))
+        got = {}
+        if len(stale) > 1:
+            # Revalidações condicionais em paralelo (o pool HTTP do cliente reaproveita as conexões)
+            with ThreadPoolExecutor(min(8, len(stale))) as ex: got = dict(zip(stale, ex.map(fetch, stale)))
+        return {p: got[p] if p in got else fetch(p) for p in paths}
+
+    def _load(self, groups=None):
+        # (manifest, {caminho: (conteúdo, sha)}) com o manifest, os alunos e as turmas da seleção
+        mpath = self._path(MANIFEST)
+        m, msha = self._fetch(self._cache(mpath), mpath, parse_manifest, lambda: None)
+        if m is None: return self._unsaved(new_document())
+        if not m: return self._split(groups)
+        files = {mpath: (m, msha), **self._read([self._path(STUDENTS)], parse_students), **self._read(self._paths(m, groups), parse_shard)}
+        if needs_migration(m): return self._upgrade(m, files, groups)
+        return m, files
+
+    def _unsaved(self, doc):
+        # Estado só em memória (sem SHAs), para quando não deu para ler ou gravar
+        m, changes = self._diff({"groups": []}, {}, [], doc)
+        return m, {p: (obj, None) for p, (obj, _) in changes.items()}
+
+    def _split(self, groups):
+        # Pasta sem manifest: divide o data.json (migrado para o esquema atual) num único commit.
+        # Se outra instância dividir antes, o commit é recusado e a próxima leitura usa o dela.
+        # Sem data.json não grava nada: o primeiro commit do app cria o layout.
+        try: raw = self._get(self.file_path).decoded_content
+        except Exception: return self._unsaved(new_document())
+        doc = parse_doc(raw); migrate(doc)
+        if self.migrate_in_memory: return self._unsaved(doc)
+        _, changes = self._diff({"groups": []}, {}, [], doc)
+        try: self._stored(changes, self._write(changes, f"Divisão do {self.file_path} por turma"))
+        except Exception:
+            self._expire(changes)
+            return self._unsaved(doc)
+        return self._load(groups)
+
+    def _upgrade(self, m, files, groups):
+        # Mesma regra do data.json: migra tudo uma vez e grava só os arquivos que mudaram
+        paths = self._paths(m, None)
+        files.update(self._read([p for p in paths if p not in files], parse_shard))
+        doc = copy.deepcopy(self._compose(m, files, paths))
+        applied = migrate(doc)
+        new_m, changes = self._diff(m, files, paths, doc)
+        # Em memória: os arquivos migrados mantêm o SHA lido, e o próximo commit grava os que mudar
+        if self.migrate_in_memory: return new_m, {**files, **changes}
+        try: self._stored(changes, self._write(changes, f"Migração do esquema: v{', v'.join(map(str, applied))}"))
+        except Exception:
+            self._expire(changes)
+            return new_m, {**files, **{p: (obj, None) for p, (obj, _) in changes.items()}}
+        return self._load(groups)
+
+    def _compose(self, m, files, paths):
+        # Documento no formato do data.json com as turmas de `paths` (listas novas, registros compartilhados)
+        doc = {"schema_version": m.get('schema_version'), "admin_config": m.get('admin_config', {}),
+               "students_db": files[self._path(STUDENTS)][0], "books": [], "reservations": []}
+        for p in paths:
+            shard = files[p][0]
+            doc['books'] += shard['books']; doc['reservations'] += shard['reservations']
+        return doc
+
+    def _diff(self, m, files, paths, data):
+        # (manifest novo, {caminho: (conteúdo novo, sha lido)}) só com os arquivos que mudam.
+        # (None, None) se `data` tem registros de uma turma existente que não foi lida.
+        paths = set(paths)
+        by_group = {}
+        for b in data['books']: by_group.setdefault((b.get('grade'), b.get('class_name')), ([], []))[0].append(b)
+        for r in data['reservations']: by_group.setdefault((r.get('grade'), r.get('class_name')), ([], []))[1].append(r)
+        entries = {(g['grade'], g['class_name']): self._path(g['path']) for g in m.get('groups', [])}
+        new_m = copy.deepcopy(m); changes = {}
+        for key in sorted(set(by_group) | {k for k, p in entries.items() if p in paths}, key=str):
+            path = entries.get(key)
+            if path is None:
+                name = shard_name(*key, {g['path'] for g in new_m['groups']} | {MANIFEST, STUDENTS})
+                new_m['groups'].append({"grade": key[0], "class_name": key[1], "path": name}); path = self._path(name)
+            elif path not in paths: return None, None
+            books, res = by_group.get(key, ([], []))
+            old, sha = files.get(path, (None, None))
+            if old is None or old['books'] != books or old['reservations'] != res:
+                changes[path] = ({"grade": key[0], "class_name": key[1], "books": books, "reservations": res}, sha)
+        spath = self._path(STUDENTS)
+        old, sha = files.get(spath, (None, None))
+        if old != data['students_db']: changes[spath] = (data['students_db'], sha)
+        new_m['schema_version'] = data.get('schema_version', SCHEMA_VERSION); new_m['admin_config'] = data['admin_config']
+        if new_m != m: changes[self._path(MANIFEST)] = (new_m, files.get(self._path(MANIFEST), (None, None))[1])
+        return new_m, changes
+
+    def _write(self, changes, msg):
+        # Um arquivo: contents API (SHA do próprio arquivo). Vários: um commit só.
+        # Devolve {caminho: (sha novo, ContentFile ou None)}
+        texts = {p: json.dumps(obj, indent=2, ensure_ascii=False) for p, (obj, _) in changes.items()}
+        if len(texts) == 1:
+            (path, text), = texts.items()
+            contents = self._put(path, msg, text, changes[path][1])
+            return {path: (contents.sha, contents)}
+        return self._commit_files(texts, {p: sha for p, (_, sha) in changes.items()}, msg)
+
+    def _commit_files(self, texts, shas, msg):
+        # O branch só avança se nenhum arquivo mudou desde a leitura e se nenhum outro commit
+        # entrou entre a conferência e a gravação (update_ref sem force); senão 409, como no contents
+        with self._api("get_git_ref", self.branch):
+            ref = self.repo.get_git_ref(f"heads/{self.branch}")
+        head = ref.object.sha
+        with self._api("get_contents (pasta)", self.dir):
+            try: listing = {f.path: f.sha for f in self.repo.get_contents(self.dir, ref=head)}
+            except UnknownObjectException: listing = {}
+        stale = [p for p, sha in shas.items() if listing.get(p) != sha]
+        if stale: raise GithubException(409, {"message": f"{stale[0]} mudou desde a leitura"}, None)
+        with self._api("get_git_commit", self.branch):
+            parent = self.repo.get_git_commit(head)
+        elements = [InputGitTreeElement(p, "100644", "blob", content=t) for p, t in texts.items()]
+        with self._api("create_git_tree", self.dir, sum(len(t.encode("utf-8")) for t in texts.values())):
+            tree = self.repo.create_git_tree(elements, parent.tree)
+        with self._api("create_git_commit", self.dir):
+            commit = self.repo.create_git_commit(msg, tree, [parent])
+        try:
+            with self._api("update_ref", self.branch): ref.edit(commit.sha)
+        except GithubException as e:
+            if e.status == 422: raise GithubException(409, e.data, e.headers)
+            raise
+        return {p: (blob_sha(t), None) for p, t in texts.items()}
+
+    def _stored(self, changes, shas):
+        # O conteúdo gravado passa a ser o snapshot compartilhado desses arquivos
+        for p, (obj, _) in changes.items():
+            c = self._cache(p)
+            with c.lock: c.store(obj, *shas[p])
+
+    def _expire(self, changes, hard=False):
+        for p in list(changes) + [self._path(MANIFEST)]:
+            c = self._cache(p)
+            with c.lock: c.invalidate() if hard else c.expire()
+
+    def view(self, groups=None):
+        groups = None if groups is None else {tuple(g) for g in groups}
+        m, files = self._load(groups)
+        paths = self._paths(m, groups)
+        key = tuple(files[p][1] for p in [self._path(MANIFEST), self._path(STUDENTS)] + paths)
+        sel = None if groups is None else frozenset(groups)
+        with self.lock:
+            hit = self.views.get(sel)
+            if hit is not None and hit[0] == key: return hit[1]
+        index = DataIndex(self._compose(m, files, paths))
+        if None not in key:
+            with self.lock: self.views[sel] = (key, index)
+        return index
+
+    def get_index(self):
+        return self.view()
+
+    def get_snapshot(self):
+        return self.view().data, None
+
+    def export(self):
+        return copy.deepcopy(self.view().data)
+
+    def replace_document(self, doc, msg):
+        # Backup/restauração: o documento inteiro, gravando só os arquivos que diferem
+        m, files = self._load(None)
+        _, changes = self._diff(m, files, self._paths(m, None), doc)
+        if changes: self._stored(changes, self._write(changes, msg))
+        return len(changes)
+
+    def compact(self):
+        return 0
+
+    def partition(self, ops):
+        # Um lote por conjunto de turmas: reservas de turmas diferentes gravam em paralelo
+        groups = [op.groups for op in ops]
+        return None if any(g is None for g in groups) else frozenset().union(*groups)
+
+    def _stage(self, ops, groups):
+        # Lê a seleção, aplica as operações numa cópia e calcula os arquivos a gravar
+        m, files = self._load(groups)
+        paths = self._paths(m, groups)
+        data = copy.deepcopy(self._compose(m, files, paths))
+        index = DataIndex(data)
+        pending = []
+        for op in ops:
+            try:
+                op.result = op.apply(data, index); op.ok = True; op.error = None
+                pending.append(op)
+            except OperationError as e:
+                op.ok = False; op.error = str(e)
+        return pending, (self._diff(m, files, paths, data)[1] if pending else {})
+
+    def commit_now(self, ops):
+        single = not isinstance(ops, list)
+        ops = [ops] if single else ops
+        groups = None if any(op.groups is None for op in ops) else set().union(*(op.groups for op in ops))
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                time.sleep(min(2.0, 0.2 * 2 ** attempt) * random.uniform(0.5, 1.5))
+                for op in ops: op.retries += 1
+            pending, changes = self._stage(ops, groups)
+            # A cópia de trabalho alcançou uma turma fora da seleção: refaz lendo todas
+            if changes is None: pending, changes = self._stage(ops, None)
+            if not changes: break
+            try:
+                self._stored(changes, self._write(changes, batch_message(pending)))
+                break
+            except GithubException as e:
+                self._expire(changes)
+                if e.status == 409 and attempt < self.max_retries: continue
+                err = "Muitas alterações simultâneas, tente novamente." if e.status == 409 else f"Erro GitHub: {e}"
+            except Exception as e:
+                self._expire(changes, hard=True)
+                err = f"Erro GitHub: {e}"
+            for op in pending: op.ok = False; op.error = err
+            break
+        for op in ops: self.stats.record(op)
+        return ops[0] if single else ops
@@ -0,0 +1,93 @@
+import io
+import csv
+import codecs
+import itertools
+import pandas as pd
+from domain import MAP_CURSO_CSV, MAP_TURNO_CSV, CATEGORIAS, SERIES_LISTA, TURMAS_LISTA, OperationError
+
+# --- IMPORTAÇÃO DE CSV ---
+# Exportação do sistema da secretaria: uma linha por aluno, cabeçalhos às vezes com '#'.
+# Lida em blocos de CHUNK_ROWS linhas com operações vetorizadas; de cada bloco só ficam as
+# seis colunas do aluno, então a memória cresce com o resultado e não com o arquivo.
+CSV_COLS = ['Email', 'NomeAluno', 'Curso', 'CodTurno', 'NomeResponsavel']
+CHUNK_ROWS = 20_000
+
+def detect_encoding(f, block=1 << 20):
+    # UTF-8 conferido no arquivo inteiro, em blocos (decodificador incremental, memória constante):
+    # uma exportação latin-1 cujo primeiro acento vem depois do início também cai no latin-1
+    head = f.read(3)
+    if isinstance(head, str): f.seek(0); return None
+    if head.startswith(b"\xef\xbb\xbf"): f.seek(0); return "utf-8-sig"
+    dec = codecs.getincrementaldecoder("utf-8")()
+    try:
+        chunk = head
+        while chunk: dec.decode(chunk); chunk = f.read(block)
+        dec.decode(b"", final=True); enc = "utf-8"
+    except UnicodeDecodeError: enc = "latin-1"
+    f.seek(0)
+    return enc
+
+def _clean(col):
+    return col.fillna("").astype(str).str.strip()
+
+def normalize_chunk(df):
+    df.columns = df.columns.str.replace('#', '').str.strip()
+    if not all(col in df.columns for col in CSV_COLS): raise OperationError("Colunas incorretas.")
+    email = _clean(df['Email'])
+    curso = _clean(df['Curso']); turno = _clean(df['CodTurno'])
+    return pd.DataFrame({
+        "email": email.mask(email.str.lower() == "nan", ""),
+        "email2": "", # Garante campo vazio para evitar KeyErrors
+        "name": _clean(df['NomeAluno']),
+        # Curso vem como número ("91" ou "91.0"); códigos desconhecidos ficam como texto
+        "grade": pd.to_numeric(curso, errors='coerce').map(MAP_CURSO_CSV).fillna(curso).astype(str),
+        "class_name": turno.map(MAP_TURNO_CSV).fillna(turno).astype(str),
+        "parent_csv": _clean(df['NomeResponsavel']),
+    }, index=df.index)
+
+def read_students_csv(f, chunksize=CHUNK_ROWS):
+    # `f`: arquivo enviado (ou qualquer objeto com read/seek).
+    # Retorna (alunos, ignorados): linhas sem nome e repetidas no arquivo (vale a última) são ignoradas.
+    parts, skipped = [], 0
+    try: chunks = pd.read_csv(f, sep=',', encoding=detect_encoding(f), dtype=str, chunksize=chunksize)
+    except pd.errors.EmptyDataError: raise OperationError("Arquivo vazio.")
+    for chunk in chunks:
+        part = normalize_chunk(chunk)
+        named = part['name'] != ""
+        skipped += int((~named).sum())
+        part = part[named]
+        # Mesma chave de domain.student_key, calculada na coluna inteira
+        key = (part['email'] + "|" + part['name']).str.lower()
+        dedup = part.assign(key=key).drop_duplicates("key", keep="last")
+        skipped += len(part) - len(dedup)
+        parts.append(dedup)
+    if not parts: return [], skipped
+    df = pd.concat(parts, ignore_index=True)
+    total = len(df)
+    df = df.drop_duplicates("key", keep="last")
+    return df.drop(columns="key").to_dict("records"), skipped + total - len(df)
+
+# --- ITENS EM LOTE ---
+# Mesmo formato da caixa "Lote": um título por linha, com categoria/série/turma fixas. Um CSV com
+# cabeçalho `title` (e, opcionalmente, category, grade, class_name) mistura turmas num arquivo só;
+# colunas ausentes ou vazias usam os valores fixos. As linhas são lidas uma a uma (gerador).
+ITEM_CSV_COLS = ['title', 'category', 'grade', 'class_name']
+
+def read_items(f, category="Livro", grade=None, class_name=None):
+    # `f`: arquivo binário (enviado/aberto com "rb") ou texto. Valores fora das listas do
+    # domínio interrompem a leitura com o número da linha.
+    enc = detect_encoding(f)
+    lines = f if enc is None else io.TextIOWrapper(f, encoding=enc, newline="")
+    first = next(lines, "")
+    header = [c.replace('#', '').strip().lower() for c in next(csv.reader([first]), [])]
+    if "title" in header: rows = enumerate(csv.DictReader(lines, fieldnames=header), 2)
+    else: rows = ((n, {"title": l}) for n, l in enumerate(itertools.chain([first], lines), 1))
+    fixed = {"category": category, "grade": grade, "class_name": class_name}
+    for n, row in rows:
+        title = (row.get("title") or "").strip()
+        if not title: continue
+        it = {"category": "", "title": title, "grade": "", "class_name": "", "available": True, "reserved_by": None}
+        for col, allowed in (("category", CATEGORIAS), ("grade", SERIES_LISTA), ("class_name", TURMAS_LISTA)):
+            it[col] = (row.get(col) or "").strip() or fixed[col]
+            if it[col] not in allowed: raise OperationError(f"Linha {n}: valor inválido em {col} ({it[col] or 'vazio'}).")
+        yield it
@@ -0,0 +1,164 @@
+import itertools
+from collections import defaultdict
+
+# --- ÍNDICES EM MEMÓRIA ---
+# Construídos uma vez por versão do documento (SHA). As páginas consultam só o índice,
+# então o custo de cada render é proporcional ao resultado, não ao tamanho da base.
+# As operações de escrita mantêm o índice da cópia de trabalho atualizado.
+# Contadores materializados (livres/reservados por série/turma/categoria e reservas por
+# aluno/categoria) são ajustados nas mesmas chamadas; verify() os confere com uma recontagem.
+
+_versions = itertools.count(1)
+
+def email_key(email):
+    return str(email or '').lower().strip()
+
+def _discard(lst, obj):
+    # Remoção por identidade: registros iguais podem coexistir (ids antigos repetidos)
+    for i, x in enumerate(lst):
+        if x is obj:
+            del lst[i]; return
+
+class DataIndex:
+    def __init__(self, data, sha=None):
+        self.data = data
+        self.sha = sha
+        # Identifica esta versão dos dados (caches derivados, ex.: relatórios)
+        self.ver = next(_versions)
+        self.students_by_email = defaultdict(list)
+        self.reservations_by_student = defaultdict(list)
+        self.reservations_by_book = defaultdict(list)
+        self.reservations_by_group = defaultdict(list)
+        self.reservation_by_id = {}
+        self.items_by_group = defaultdict(list)
+        self.books_by_id = defaultdict(list)
+        self.free_by_group = defaultdict(int)
+        self.reserved_by_group = defaultdict(int)
+        self.taken_by_student = defaultdict(int)
+        for s in data.get('students_db', []): self.add_student(s)
+        for b in data.get('books', []): self.add_book(b)
+        for r in data.get('reservations', []): self.add_reservation(r)
+
+    # --- manutenção ---
+    def add_student(self, s):
+        for key in {email_key(s.get('email')), email_key(s.get('email2'))}:
+            if key: self.students_by_email[key].append(s)
+
+    def remove_student(self, s):
+        for key in {email_key(s.get('email')), email_key(s.get('email2'))}:
+            if key: _discard(self.students_by_email[key], s)
+
+    def _count_book(self, b, n):
+        key = (b.get('grade'), b.get('class_name'), b.get('category', 'Livro'))
+        (self.free_by_group if b.get('available') else self.reserved_by_group)[key] += n
+
+    def add_book(self, b):
+        self.books_by_id[b['id']].append(b)
+        self.items_by_group[(b.get('grade'), b.get('class_name'), b.get('category', 'Livro'))].append(b)
+        self._count_book(b, 1)
+
+    def remove_book(self, b):
+        _discard(self.books_by_id[b['id']], b)
+        _discard(self.items_by_group[(b.get('grade'), b.get('class_name'), b.get('category', 'Livro'))], b)
+        self._count_book(b, -1)
+
+    def update_book(self, b, changes):
+        self.remove_book(b); b.update(changes); self.add_book(b)
+
+    def set_available(self, b, available, reserved_by=None, reserved_student=None):
+        # Reservar/liberar sem mexer nas listas do índice (o grupo não muda)
+        self._count_book(b, -1)
+        b['available'] = available; b['reserved_by'] = reserved_by; b['reserved_student'] = reserved_student
+        self._count_book(b, 1)
+
+    def add_reservation(self, r):
+        self.reservation_by_id[r.get('reservation_id')] = r
+        self.reservations_by_student[str(r.get('student_name'))].append(r)
+        self.reservations_by_book[r.get('book_id')].append(r)
+        self.reservations_by_group[(r.get('grade'), r.get('class_name'), r.get('category', 'Livro'))].append(r)
+        self.taken_by_student[(str(r.get('student_name')), r.get('category', 'Livro'))] += 1
+
+    def remove_reservation(self, r):
+        if self.reservation_by_id.get(r.get('reservation_id')) is r: del self.reservation_by_id[r.get('reservation_id')]
+        _discard(self.reservations_by_student[str(r.get('student_name'))], r)
+        _discard(self.reservations_by_book[r.get('book_id')], r)
+        _discard(self.reservations_by_group[(r.get('grade'), r.get('class_name'), r.get('category', 'Livro'))], r)
+        self.taken_by_student[(str(r.get('student_name')), r.get('category', 'Livro'))] -= 1
+
+    # --- consultas ---
+    def version(self):
+        return ("index", self.ver)
+
+    def students_for_email(self, email):
+        return list(self.students_by_email.get(email_key(email), []))
+
+    def reservations_for(self, student):
+        return list(self.reservations_by_student.get(str(student), []))
+
+    def students(self):
+        return self.data.get('students_db', [])
+
+    def admin_config(self):
+        return self.data.get('admin_config', {})
+
+    def reservation(self, res_id):
+        return self.reservation_by_id.get(res_id)
+
+    def book(self, item_id, title=None):
+        # Há ids repetidos em dados antigos (lotes no mesmo segundo): o título desempata
+        found = self.books_by_id.get(item_id, [])
+        if title is not None:
+            for b in found:
+                if b.get('title') == title: return b
+        return found[0] if found else None
+
+    def items_for(self, grade, class_name, categories):
+        out = []
+        for c in categories: out.extend(self.items_by_group.get((grade, class_name, c), []))
+        return out
+
+    def items_where(self, category=None, grade=None, class_name=None):
+        return self._where(self.items_by_group, 'books', category, grade, class_name)
+
+    def reservations_where(self, category=None, grade=None, class_name=None):
+        return self._where(self.reservations_by_group, 'reservations', category, grade, class_name)
+
+    def _where(self, groups, full, category, grade, class_name):
+        # None = qualquer valor; sem filtro devolve a lista completa na ordem original
+        if category is None and grade is None and class_name is None: return list(self.data.get(full, []))
+        out = []
+        for (g, c, cat), rows in groups.items():
+            if (grade is None or g == grade) and (class_name is None or c == class_name) and (category is None or cat == category):
+                out.extend(rows)
+        return out
+
+    # --- contadores ---
+    def free_count(self, grade, class_name, category):
+        return self.free_by_group.get((grade, class_name, category), 0)
+
+    def reserved_count(self, grade, class_name, category):
+        return self.reserved_by_group.get((grade, class_name, category), 0)
+
+    def student_count(self, student, category):
+        return self.taken_by_student.get((str(student), category), 0)
+
+    def availability(self, category=None, grade=None, class_name=None):
+        # Resumo livres/reservados por grupo, sem percorrer os itens
+        out = []
+        for key in sorted(self.free_by_group.keys() | self.reserved_by_group.keys(), key=lambda k: tuple(map(str, k))):
+            g, c, cat = key
+            if (grade is None or g == grade) and (class_name is None or c == class_name) and (category is None or cat == category):
+                free, reserved = self.free_by_group.get(key, 0), self.reserved_by_group.get(key, 0)
+                if free or reserved: out.append({"grade": g, "class_name": c, "category": cat, "free": free, "reserved": reserved})
+        return out
+
+    def verify(self):
+        # Recontagem completa; devolve {contador: {chave: (materializado, recontado)}} só com as diferenças
+        fresh = DataIndex(self.data)
+        diffs = {}
+        for name in ("free_by_group", "reserved_by_group", "taken_by_student"):
+            mine = {k: v for k, v in getattr(self, name).items() if v}
+            real = {k: v for k, v in getattr(fresh, name).items() if v}
+            bad = {k: (mine.get(k, 0), real.get(k, 0)) for k in mine.keys() | real.keys() if mine.get(k, 0) != real.get(k, 0)}
+            if bad: diffs[name] = bad
+        return diffs
@@ -0,0 +1,129 @@
+import os
+import threading
+from types import SimpleNamespace
+from github import GithubException, UnknownObjectException
+from github_storage import blob_sha
+
+# --- REPOSITÓRIO LOCAL ---
+# Uma pasta local com a parte da API do PyGithub que o GitHubConnection usa (get_contents,
+# ContentFile.update condicional, update_file, create_file, listagem de pasta e o commit com
+# vários arquivos da API Git Data): desenvolvimento, testes e lotes sem token.
+# O SHA é o do blob no git, igual ao do GitHub. A conferência de SHA nas gravações vale entre
+# threads do mesmo processo; cada arquivo é trocado de uma vez (temporário + rename).
+
+def _not_found(path):
+    return UnknownObjectException(404, {"message": f"{path}: Not Found"}, None)
+
+class LocalContentFile:
+    def __init__(self, repo, path, raw, stat):
+        self.repo = repo; self.path = path
+        self._set(raw, stat)
+
+    def _set(self, raw, stat):
+        self.decoded_content = raw; self.size = len(raw); self.sha = blob_sha(raw)
+        self.stamp = (stat.st_mtime_ns, stat.st_size)
+
+    def update(self):
+        # Equivalente ao If-None-Match: sem mudança de mtime/tamanho nem lê o arquivo
+        try: stat = os.stat(self.repo.full(self.path))
+        except FileNotFoundError: raise _not_found(self.path)
+        if (stat.st_mtime_ns, stat.st_size) == self.stamp: return False
+        old = self.sha
+        self._set(*self.repo.read(self.path))
+        return self.sha != old
+
+# --- API GIT DATA ---
+# O commit com vários arquivos, para qualquer repositório com `lock`, `head` (contador de commits),
+# `commits` e _store(caminho, texto): o ref só avança a partir do head atual (fast-forward), senão
+# 422. _call(bytes, write) é o custo de cada chamada e _count(tipo) a contagem (o FakeRepo do bench).
+class GitData:
+    def _call(self, size=0, write=False):
+        pass
+
+    def _count(self, kind):
+        pass
+
+    def get_git_ref(self, ref):
+        self._call()
+        with self.lock: return GitRef(self, f"c{self.head}")
+
+    def get_git_commit(self, sha):
+        self._call()
+        return SimpleNamespace(sha=sha, tree=sha)
+
+    def create_git_tree(self, elements, base_tree=None):
+        tree = [e._identity for e in elements]
+        self._call(sum(len(t["content"].encode("utf-8")) for t in tree), write=True)
+        return tree
+
+    def create_git_commit(self, message, tree, parents):
+        self._call(write=True)
+        with self.lock:
+            sha = f"n{len(self.commits)}"
+            self.commits[sha] = (parents[0].sha, tree)
+        return SimpleNamespace(sha=sha)
+
+class GitRef:
+    def __init__(self, repo, sha):
+        self.repo = repo; self.object = SimpleNamespace(sha=sha)
+
+    def edit(self, sha, force=False):
+        repo = self.repo
+        repo._call(write=True)
+        with repo.lock:
+            parent, tree = repo.commits.pop(sha)
+            repo._count("put")
+            if parent != f"c{repo.head}":
+                repo._count("conflicts")
+                raise GithubException(422, {"message": "Update is not a fast forward"}, None)
+            head = repo.head
+            for t in tree: repo._store(t["path"], t["content"])
+            repo.head = head + 1
+
+class LocalRepo(GitData):
+    def __init__(self, root):
+        self.root = root
+        self.lock = threading.Lock()
+        self.head = 0
+        self.commits = {}
+
+    def full(self, path):
+        return os.path.join(self.root, *path.split("/"))
+
+    def read(self, path):
+        try:
+            with open(self.full(path), "rb") as f: return f.read(), os.fstat(f.fileno())
+        except (FileNotFoundError, NotADirectoryError, IsADirectoryError): raise _not_found(path)
+
+    def get_contents(self, path, ref=None):
+        full = self.full(path)
+        if os.path.isdir(full):
+            return [SimpleNamespace(path=f"{path}/{n}", sha=blob_sha(self.read(f"{path}/{n}")[0]))
+                    for n in sorted(os.listdir(full)) if os.path.isfile(os.path.join(full, n))]
+        return LocalContentFile(self, path, *self.read(path))
+
+    def _sha(self, path):
+        try: return blob_sha(self.read(path)[0])
+        except UnknownObjectException: return None
+
+    def _write(self, path, content):
+        full = self.full(path)
+        os.makedirs(os.path.dirname(full) or ".", exist_ok=True)
+        with open(full + ".tmp", "wb") as f: f.write(content.encode("utf-8"))
+        os.replace(full + ".tmp", full)
+        self.head += 1
+        return LocalContentFile(self, path, *self.read(path))
+
+    def update_file(self, path, message, content, sha, branch=None):
+        with self.lock:
+            cur = self._sha(path)
+            if cur != sha: raise GithubException(409, {"message": f"{path} is at {cur} but expected {sha}"}, None)
+            return {"content": self._write(path, content)}
+
+    def create_file(self, path, message, content, branch=None):
+        with self.lock:
+            if os.path.exists(self.full(path)): raise GithubException(422, {"message": "sha wasn't supplied"}, None)
+            return {"content": self._write(path, content)}
+
+    def _store(self, path, content):
+        self._write(path, content)
@@ -0,0 +1,66 @@
+import json
+import threading
+import time
+from collections import deque
+
+# --- MÉTRICAS DA API ---
+# Buffer circular em memória com uma linha por chamada à API do GitHub:
+# {ts, call, path, ms, bytes, status, rate_remaining, rate_limit, rate_reset}
+# Com `path` definido, cada registro também é anexado a um arquivo JSONL.
+
+def percentile(values, p):
+    if not values: return None
+    values = sorted(values)
+    k = (len(values) - 1) * p / 100
+    lo = int(k); hi = min(lo + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (k - lo)
+
+class ApiMetrics:
+    def __init__(self, size=5000, path=None):
+        self.lock = threading.Lock()
+        self.records = deque(maxlen=size)
+        self.path = path
+        self.rate = (None, None)
+        self.rate_reset = None
+
+    def record(self, rec):
+        with self.lock:
+            self.records.append(rec)
+            if rec.get("rate_remaining") is not None: self.rate = (rec["rate_remaining"], rec.get("rate_limit"))
+            if rec.get("rate_reset"): self.rate_reset = rec["rate_reset"]
+            if self.path:
+                try:
+                    with open(self.path, "a", encoding="utf-8") as f: f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+                except OSError:
+                    pass
+
+    def snapshot(self):
+        with self.lock: return list(self.records)
+
+    def summary(self):
+        # Por tipo de chamada: contagem, percentis de latência, bytes médios, erros e conflitos (409)
+        out = {}
+        for r in self.snapshot():
+            s = out.setdefault(r["call"], {"ms": [], "bytes": 0, "errors": 0, "conflicts": 0})
+            s["ms"].append(r["ms"]); s["bytes"] += r.get("bytes") or 0
+            if r.get("status") == 409: s["conflicts"] += 1
+            elif not isinstance(r.get("status"), int) or r["status"] >= 400: s["errors"] += 1
+        return {
+            call: {"calls": len(s["ms"]), "p50_ms": percentile(s["ms"], 50), "p95_ms": percentile(s["ms"], 95),
+                   "p99_ms": percentile(s["ms"], 99), "avg_kb": s["bytes"] / len(s["ms"]) / 1024,
+                   "errors": s["errors"], "conflicts": s["conflicts"]}
+            for call, s in out.items()
+        }
+
+    def calls_per_minute(self, window=300):
+        since = time.time() - window
+        return sum(1 for r in self.snapshot() if r["ts"] >= since) * 60 / window
+
+    def headroom(self):
+        # Fração restante do rate limit segundo o último cabeçalho visto (None se desconhecido)
+        remaining, limit = self.rate
+        if remaining is None or not limit: return None
+        return remaining / limit
+
+    def to_jsonl(self):
+        return "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in self.snapshot())
@@ -0,0 +1,58 @@
+# --- MIGRAÇÕES DO DATA.JSON ---
+# O documento guarda `schema_version`. Na leitura só a versão é conferida; documentos antigos
+# passam uma única vez pelas migrações abaixo (em ordem) e são gravados de volta já migrados.
+# Cada migração recebe o documento da versão anterior e o altera no lugar; precisam ser
+# determinísticas, porque duas instâncias podem migrar a mesma versão ao mesmo tempo.
+SCHEMA_VERSION = 2
+
+def new_document():
+    return {"schema_version": SCHEMA_VERSION, "admin_config": {"password": "villa123"}, "books": [], "reservations": [], "students_db": []}
+
+def _v1_backfill(doc):
+    # Antigo normalize_data, agora persistido: chaves de topo, categoria, turma e ids de reserva
+    for k, v in (("books", []), ("reservations", []), ("students_db", []), ("admin_config", {"password": "villa123"})):
+        doc.setdefault(k, v)
+    for item in doc["books"]:
+        item.setdefault("category", "Livro"); item.setdefault("reserved_by", None); item.setdefault("reserved_student", None)
+    used = {str(r["reservation_id"]) for r in doc["reservations"] if "reservation_id" in r}
+    n = 0
+    for res in doc["reservations"]:
+        if "reservation_id" not in res:
+            while f"legacy_{n}" in used: n += 1
+            res["reservation_id"] = f"legacy_{n}"; used.add(res["reservation_id"])
+        res.setdefault("class_name", "Indefinida")
+        res.setdefault("category", "Livro")
+
+def _v2_unique_book_ids(doc):
+    # Lotes antigos geraram ids repetidos (mesmo segundo). Mantém o primeiro, renumera os demais
+    # e reaponta as reservas, que identificam o item por id + título (+ série/turma no empate).
+    # Entre gêmeos, cada item renumerado leva no máximo uma reserva: a do aluno que o reservou.
+    seen = set()
+    top = max([b["id"] for b in doc["books"] if isinstance(b.get("id"), int)] + [0])
+    twins, by_key = {}, {}
+    for b in doc["books"]: twins[(b["id"], b["title"])] = twins.get((b["id"], b["title"]), 0) + 1
+    for r in doc["reservations"]: by_key.setdefault((r.get("book_id"), r.get("book_title")), []).append(r)
+    for b in doc["books"]:
+        if b["id"] not in seen: seen.add(b["id"]); continue
+        old = (b["id"], b["title"])
+        top += 1; b["id"] = top; seen.add(top)
+        if twins[old] == 1: mine = list(by_key.get(old, []))
+        else:
+            # Gêmeos (mesmo id e título): só a reserva da mesma turma e do mesmo aluno, uma só
+            fit = [r for r in by_key.get(old, []) if (r.get("grade"), r.get("class_name")) == (b.get("grade"), b.get("class_name"))]
+            mine = [r for r in fit if r.get("student_name") == b.get("reserved_student")] or (fit if not b.get("available", True) else [])
+            mine = mine[:1]
+        for r in mine: r["book_id"] = top; by_key[old].remove(r)
+
+MIGRATIONS = [(1, _v1_backfill), (2, _v2_unique_book_ids)]
+
+def needs_migration(doc):
+    return doc.get("schema_version", 0) < SCHEMA_VERSION
+
+def migrate(doc):
+    # Aplica as migrações pendentes no lugar; devolve as versões aplicadas
+    applied = []
+    for version, step in MIGRATIONS:
+        if doc.get("schema_version", 0) < version:
+            step(doc); doc["schema_version"] = version; applied.append(version)
+    return applied
@@ -0,0 +1,75 @@
+import time
+import threading
+
+# --- VIGIA DE MUDANÇAS ---
+# Uma thread por processo revalida o armazenamento a cada `interval` segundos (store.poll():
+# pedido condicional/comparação de SHA, 304 sem corpo), deixando o snapshot e os índices novos
+# no cache compartilhado; quando a versão devolvida muda, sobe `version`. As sessões leem desse cache sem
+# buscar nada; a página da família compara version_of(turmas dela) com a que desenhou e se atualiza sozinha.
+# store.poll() pode devolver {chave: versão}: None vale para todos (manifest, alunos) e (série, turma)
+# só para quem mostra essa turma, de modo que a reserva de uma turma não recarrega as outras.
+class ChangePoller:
+    def __init__(self, store, interval=5):
+        self.store = store
+        self.interval = interval
+        self.cond = threading.Condition()
+        self.version = 0
+        self.versions = {}   # chave -> mudanças publicadas (None = todas as sessões)
+        self.token = None
+        self.checks = 0
+        self.changes = 0
+        self.errors = 0
+        self.last_error = None
+        self.last_check = None
+        self.thread = None
+        self.stopped = threading.Event()
+
+    def start(self):
+        # Idempotente: também reinicia a thread se ela morreu
+        with self.cond:
+            if self.thread is None or not self.thread.is_alive():
+                self.stopped.clear()
+                self.thread = threading.Thread(target=self._run, daemon=True, name="change-poller"); self.thread.start()
+        return self
+
+    def stop(self):
+        self.stopped.set()
+
+    def _run(self):
+        while not self.stopped.is_set():
+            self.check()
+            self.stopped.wait(self.interval)
+
+    def check(self):
+        try: token = self.store.poll()
+        except Exception as e:
+            with self.cond: self.errors += 1; self.last_error = f"{type(e).__name__}: {e}"
+            return False
+        with self.cond:
+            self.checks += 1; self.last_check = time.time()
+            keys = self._changed(self.token, token); self.token = token
+            changed = bool(keys)
+            if changed:
+                for k in keys: self.versions[k] = self.versions.get(k, 0) + 1
+                self.version += 1; self.changes += 1
+                self.cond.notify_all()
+        return changed
+
+    @staticmethod
+    def _changed(old, new):
+        # Chaves que mudaram; turmas que só agora entraram (primeira leitura) não contam
+        if old is None or old == new: return set()
+        if not (isinstance(old, dict) and isinstance(new, dict)): return {None}
+        return {k for k in new if k in old and new[k] != old[k]}
+
+    def version_of(self, groups=None):
+        # Versão vista por uma sessão: mudanças gerais + as das turmas `groups` (None = todas)
+        with self.cond:
+            if groups is None: return self.version
+            return tuple(self.versions.get(k, 0) for k in [None, *map(tuple, groups)])
+
+    def wait(self, version, timeout=None):
+        # Bloqueia até a versão publicada ser diferente de `version` (ou o timeout)
+        with self.cond:
+            self.cond.wait_for(lambda: self.version != version, timeout)
+            return self.version
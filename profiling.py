@@ -0,0 +1,32 @@
+import json
+import time
+
+# --- PERFIL DE RENDER ---
+# Marcações sequenciais: prof.mark("admin/estoque/filtro") registra o tempo desde a marcação
+# anterior com esse nome. Desligado, mark() não faz nada além de um if.
+class RenderProfiler:
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.start = self.last = time.perf_counter()
+        self.steps = []
+
+    def mark(self, name):
+        if not self.enabled: return
+        now = time.perf_counter()
+        self.steps.append((name, (now - self.last) * 1000))
+        self.last = now
+
+    def total_ms(self):
+        return (time.perf_counter() - self.start) * 1000
+
+    def rows(self):
+        return [{"etapa": n, "ms": round(ms, 2)} for n, ms in self.steps]
+
+    def write_trace(self, path, page, **extra):
+        # Uma linha JSON por rerun, para comparar execuções com dados reais
+        if not self.enabled or not path: return
+        rec = {"ts": time.time(), "page": page, "total_ms": round(self.total_ms(), 2), "steps": self.rows(), **extra}
+        try:
+            with open(path, "a", encoding="utf-8") as f: f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+        except OSError:
+            pass
@@ -0,0 +1,121 @@
+import io
+import threading
+from collections import OrderedDict
+import pandas as pd
+from domain import LIMITES_RESERVA, get_segmento
+from storage import BOOK_COLS, RES_COLS, STUDENT_COLS
+
+# --- RELATÓRIOS ---
+# DataFrames colunares montados uma vez por versão dos dados (view.version()) e
+# compartilhados entre sessões; filtros e agrupamentos são vetorizados.
+# None nos filtros = "Todas".
+LIST_COLS = ['category', 'student_name', 'parent_name', 'book_title', 'timestamp']
+GROUP = ["grade", "class_name"]
+
+def _mask(df, category=None, grade=None, class_name=None):
+    m = pd.Series(True, index=df.index)
+    for col, val in (("category", category), ("grade", grade), ("class_name", class_name)):
+        if val is not None and col in df: m &= df[col] == val
+    return m
+
+class ReportFrames:
+    def __init__(self, view):
+        self.books = pd.DataFrame(view.items_where(), columns=BOOK_COLS)
+        self.books["category"] = self.books["category"].fillna("Livro")
+        self.books["available"] = self.books["available"].astype(bool)
+        self.reservations = pd.DataFrame(view.reservations_where(), columns=RES_COLS)
+        self.reservations["category"] = self.reservations["category"].fillna("Livro")
+        self.students = pd.DataFrame(view.students(), columns=STUDENT_COLS)
+        self.lock = threading.RLock()
+        self.results = {}
+
+    def _cached(self, key, build):
+        # Resultados (e arquivos exportados) ficam guardados até a próxima versão dos dados
+        with self.lock:
+            if key not in self.results: self.results[key] = build()
+            return self.results[key]
+
+    def reservation_list(self, category=None, grade=None, class_name=None):
+        r = self.reservations
+        return self._cached(("list", category, grade, class_name), lambda: r.loc[_mask(r, category, grade, class_name), LIST_COLS].reset_index(drop=True))
+
+    def reservations_by_group(self, category=None, grade=None, class_name=None):
+        # Reservas por série/turma x categoria
+        def build():
+            r = self.reservations[_mask(self.reservations, category, grade, class_name)]
+            return pd.crosstab([r["grade"], r["class_name"]], r["category"], margins=True, margins_name="Total") if len(r) else pd.DataFrame()
+        return self._cached(("by_group", category, grade, class_name), build)
+
+    def unreserved_by_group(self, category=None, grade=None, class_name=None):
+        # Itens ainda livres por série/turma x categoria
+        def build():
+            b = self.books[_mask(self.books, category, grade, class_name) & self.books["available"]]
+            return pd.crosstab([b["grade"], b["class_name"]], b["category"], margins=True, margins_name="Total") if len(b) else pd.DataFrame()
+        return self._cached(("unreserved", category, grade, class_name), build)
+
+    def students_without_reservations(self, category=None, grade=None, class_name=None):
+        # Alunos sem nenhuma reserva (na categoria, se filtrada)
+        def build():
+            s = self.students[_mask(self.students, None, grade, class_name)]
+            r = self.reservations[_mask(self.reservations, category)]
+            return s.loc[~s["name"].astype(str).isin(r["student_name"].astype(str)), ["name", "grade", "class_name", "email", "parent_csv"]].reset_index(drop=True)
+        return self._cached(("no_res", category, grade, class_name), build)
+
+    def quota_fill(self, category=None, grade=None, class_name=None):
+        # Preenchimento das cotas: reservas / (alunos da turma x limite da categoria)
+        def build():
+            s = self.students[_mask(self.students, None, grade, class_name)]
+            students = s.groupby(GROUP).size().rename("alunos").reset_index()
+            if students.empty: return pd.DataFrame()
+            cats = pd.DataFrame({"category": [category] if category else list(LIMITES_RESERVA["Infantil"])})
+            q = students.merge(cats, how="cross")
+            q["limite"] = [LIMITES_RESERVA[get_segmento(g)][c] for g, c in zip(q["grade"], q["category"])]
+            q["capacidade"] = q["alunos"] * q["limite"]
+            r = self.reservations[_mask(self.reservations, category, grade, class_name)]
+            q = q.merge(r.groupby(GROUP + ["category"]).size().rename("reservas").reset_index(), on=GROUP + ["category"], how="left")
+            q["reservas"] = q["reservas"].fillna(0).astype(int)
+            q["preenchimento_%"] = (100 * q["reservas"] / q["capacidade"]).round(1)
+            return q.sort_values(GROUP + ["category"]).reset_index(drop=True)
+        return self._cached(("quota", category, grade, class_name), build)
+
+    def export(self, report, fmt, *filters):
+        # Bytes do CSV/XLSX de um relatório, gerados uma vez por versão e filtro
+        def build():
+            df = getattr(self, report)(*filters)
+            index = isinstance(df.index, pd.MultiIndex)
+            if fmt == "csv": return df.to_csv(index=index).encode("utf-8-sig")
+            buf = io.BytesIO()
+            with pd.ExcelWriter(buf) as w: df.to_excel(w, index=index, sheet_name=report[:31])
+            return buf.getvalue()
+        return self._cached(("export", report, fmt) + filters, build)
+
+# Rótulo na tela -> método do ReportFrames
+REPORTS = {
+    "Lista de reservas": "reservation_list", "Reservas por turma/categoria": "reservations_by_group",
+    "Itens livres por turma": "unreserved_by_group", "Alunos sem reserva": "students_without_reservations",
+    "Preenchimento das cotas": "quota_fill",
+}
+
+class ReportCache:
+    # Frames das últimas `keep` versões (sessões em versões diferentes durante uma gravação)
+    def __init__(self, keep=2):
+        self.lock = threading.Lock()
+        self.keep = keep
+        self.frames = OrderedDict()
+        self.builds = 0
+
+    def get(self, view):
+        key = view.version()
+        with self.lock:
+            f = self.frames.get(key)
+            if f is not None: self.frames.move_to_end(key); return f
+        f = ReportFrames(view)
+        with self.lock:
+            self.frames[key] = f; self.builds += 1
+            while len(self.frames) > self.keep: self.frames.popitem(last=False)
+        return f
+
+def xlsx_available():
+    try: import openpyxl  # noqa: F401
+    except ImportError: return False
+    return True
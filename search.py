@@ -0,0 +1,136 @@
+import re
+import bisect
+import threading
+import unicodedata
+from collections import Counter, OrderedDict
+
+# --- BUSCA ---
+# Índice sem acento e tolerante a erros de digitação para nomes/e-mails de alunos e títulos.
+# O texto é normalizado (minúsculas, sem diacríticos: "ÁTICA" = "atica") e quebrado em
+# palavras. Cada palavra da busca casa com palavras do vocabulário iguais (1.0), que começam
+# com ela (0.9, quem ainda está digitando) ou, com 3+ letras, parecidas por trigramas
+# (Dice >= MIN_SIM, pontuação até 0.8). O registro precisa casar com todas as palavras da busca;
+# o ranking é a soma das melhores pontuações, e o empate fica na ordem original. Uma busca sem
+# letras nem números ("@", "-") volta ao filtro antigo por trecho do texto.
+# Os índices dependem só dos textos: trocas de disponibilidade não os reconstroem.
+MIN_SIM = 0.5
+_FOLD = str.maketrans({chr(c): unicodedata.normalize("NFKD", chr(c)).encode("ascii", "ignore").decode()
+                       for c in range(0xAA, 0x250) if unicodedata.normalize("NFKD", chr(c)) != chr(c)})
+_WORD = re.compile(r"[a-z0-9]+")
+
+def normalize(text):
+    return str(text or "").lower().translate(_FOLD)
+
+def words(text):
+    return _WORD.findall(normalize(text))
+
+def _grams(word):
+    w = f" {word} "
+    return {w[i:i + 3] for i in range(len(w) - 2)}
+
+class SearchIndex:
+    def __init__(self, texts):
+        vocab, self.postings = {}, []
+        self.texts = [normalize(t) for t in texts]
+        for rid, text in enumerate(texts):
+            for w in set(words(text)):
+                v = vocab.get(w)
+                if v is None: v = vocab[w] = len(self.postings); self.postings.append([])
+                self.postings[v].append(rid)
+        self.vocab = vocab
+        self.sorted = sorted(vocab)
+        self.by_gram = {}
+        self.gram_count = [0] * len(vocab)
+        for w, v in vocab.items():
+            grams = _grams(w)
+            self.gram_count[v] = len(grams)
+            for g in grams: self.by_gram.setdefault(g, []).append(v)
+
+    def _match(self, term):
+        # {palavra do vocabulário: pontuação}
+        out = {}
+        i = bisect.bisect_left(self.sorted, term)
+        while i < len(self.sorted) and self.sorted[i].startswith(term):
+            w = self.sorted[i]; out[self.vocab[w]] = 1.0 if w == term else 0.9; i += 1
+        if len(term) >= 3:
+            grams = _grams(term)
+            shared = Counter()
+            for g in grams: shared.update(self.by_gram.get(g, ()))
+            for v, n in shared.items():
+                sim = 2 * n / (len(grams) + self.gram_count[v])
+                if sim >= MIN_SIM and out.get(v, 0) < 0.8 * sim: out[v] = 0.8 * sim
+        return out
+
+    def ids(self, query):
+        # Posições (na lista indexada) em ordem de relevância
+        terms = list(dict.fromkeys(words(query)))
+        if not terms:
+            q = normalize(query).strip()
+            return [rid for rid, t in enumerate(self.texts) if q in t] if q else []
+        scores = None
+        for term in terms:
+            best = {}
+            for v, sim in self._match(term).items():
+                for rid in self.postings[v]:
+                    if best.get(rid, 0) < sim: best[rid] = sim
+            scores = best if scores is None else {rid: s + best[rid] for rid, s in scores.items() if rid in best}
+            if not scores: return []
+        return sorted(scores, key=lambda rid: (-scores[rid], rid)) if scores else []
+
+# Registros e índice das últimas `keep` versões dos dados (view.version()), como no ReportCache.
+# Os índices ficam no cache pelos textos: uma versão nova com os mesmos textos (só mudou a
+# disponibilidade) reaproveita o índice da anterior
+def _texts(kind, records):
+    if kind == "students": return tuple(f"{s.get('name', '')} {s.get('email', '')} {s.get('email2', '')}" for s in records)
+    return tuple(b.get('title', '') for b in records)
+
+class SearchCache:
+    def __init__(self, keep=2, small=64):
+        self.lock = threading.Lock()
+        self.keep = keep; self.small = small
+        self.lists = OrderedDict()     # (view.version(), tipo) -> (registros, SearchIndex)
+        self.indexes = OrderedDict()   # (tipo, textos) -> SearchIndex
+        self.titles_idx = OrderedDict()  # textos -> SearchIndex (listas de uma turma)
+        self.builds = 0
+
+    def _lru(self, store, key, build, limit):
+        with self.lock:
+            hit = store.get(key)
+            if hit is not None: store.move_to_end(key); return hit
+        hit = build()
+        with self.lock:
+            store[key] = hit
+            while len(store) > limit: store.popitem(last=False)
+        return hit
+
+    def _build(self, texts):
+        with self.lock: self.builds += 1
+        return SearchIndex(texts)
+
+    def _records(self, view, kind):
+        def build():
+            records = view.students() if kind == "students" else view.items_where()
+            texts = _texts(kind, records)
+            return records, self._lru(self.indexes, (kind, texts), lambda: self._build(texts), 2 * self.keep)
+        return self._lru(self.lists, (view.version(), kind), build, 2 * self.keep)
+
+    def _search(self, view, kind, query, where, limit):
+        records, index = self._records(view, kind)
+        out = []
+        for rid in index.ids(query):
+            if where is None or where(records[rid]):
+                out.append(records[rid])
+                if limit and len(out) >= limit: break
+        return out
+
+    def students(self, view, query, where=None, limit=None):
+        return self._search(view, "students", query, where, limit)
+
+    def books(self, view, query, where=None, limit=None):
+        return self._search(view, "books", query, where, limit)
+
+    def titles(self, records, query):
+        # Ranking de uma lista pequena já filtrada (os itens da turma na tela da família)
+        texts = tuple(r.get('title', '') for r in records)
+        index = self._lru(self.titles_idx, texts, lambda: self._build(texts), self.small)
+        return [records[rid] for rid in index.ids(query)]
@@ -0,0 +1,520 @@
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from domain import (LIMITES_RESERVA, IMPORT_UPDATABLE, GROUP_COLS, RESERVED_GROUP_MSG, get_segmento, next_id, student_key,
+                    OperationError, OperationStats)
+from indexes import email_key
+from migrations import SCHEMA_VERSION
+
+# --- INTERFACE DE ARMAZENAMENTO ---
+# As páginas só falam com um Storage:
+#   view(groups)  -> objeto de consulta com a API do DataIndex (students_for_email, reservations_for,
+#                    reservation, book, items_for, items_where, reservations_where, students, admin_config)
+#                    `groups`: séries/turmas que a página consulta (None = todas); só o layout
+#                    fragmentado do GitHub usa, os outros backends sempre respondem sobre tudo
+#   commit(ops)   -> aplica Operations (reservar, cancelar, cadastrar alunos, inserir itens em lote...)
+#                    e devolve as mesmas operações com ok/error/result/retries preenchidos
+#   export()      -> documento completo no formato do data.json (backup/migração)
+#   partition(ops)-> chave das operações que podem ir juntas num commit sem disputar arquivo
+#                    com outras chaves (fila de admissão); None = o backend inteiro
+# Os backends implementam commit_now(); com um WriteCoalescer ligado, commit() entra na fila.
+class Storage:
+    coalescer = None
+
+    def view(self, groups=None):
+        raise NotImplementedError
+
+    def commit(self, ops):
+        if self.coalescer is not None: return self.coalescer.submit(self, ops)
+        return self.commit_now(ops)
+
+    def commit_now(self, ops):
+        raise NotImplementedError
+
+    def export(self):
+        raise NotImplementedError
+
+    def partition(self, ops):
+        return None
+
+# --- FILA DE GRAVAÇÃO ---
+# Junta as operações enviadas durante `window` segundos e grava todas num único commit_now.
+# Cada sessão espera só pelo próprio ticket; o resultado (ok/error) continua sendo por operação.
+# Só recebe o que passa por Storage.commit(): a fila de admissão (admission.py) chama
+# commit_now direto, então no app a janela vale para o admin ou com ADMISSION = false.
+class WriteCoalescer:
+    def __init__(self, window, timeout=60):
+        self.window = window
+        self.timeout = timeout
+        self.cond = threading.Condition()
+        self.queue = []
+        self.thread = None
+        self.batches = 0
+        self.max_batch = 0
+
+    def submit(self, store, ops):
+        single = not isinstance(ops, list)
+        ops = [ops] if single else ops
+        ticket = {"store": store, "ops": ops, "done": threading.Event()}
+        with self.cond:
+            self.queue.append(ticket)
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self._run, daemon=True); self.thread.start()
+            self.cond.notify()
+        if not ticket["done"].wait(self.timeout):
+            for op in ops:
+                if not op.ok: op.error = "Sem confirmação da gravação, confira antes de repetir."
+        return ops[0] if single else ops
+
+    def _run(self):
+        while True:
+            with self.cond:
+                while not self.queue: self.cond.wait()
+            time.sleep(self.window)
+            with self.cond: batch, self.queue = self.queue, []
+            ops = [op for t in batch for op in t["ops"]]
+            self.batches += 1; self.max_batch = max(self.max_batch, len(ops))
+            try: batch[0]["store"].commit_now(ops)
+            except Exception as e:
+                for op in ops: op.ok = False; op.error = f"Erro na gravação: {e}"
+            for t in batch: t["done"].set()
+
+# --- SQLITE ---
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS books (
+    pk INTEGER PRIMARY KEY, id INTEGER NOT NULL, category TEXT, title TEXT, grade TEXT, class_name TEXT,
+    available INTEGER NOT NULL DEFAULT 1, reserved_by TEXT, reserved_student TEXT
+);
+CREATE INDEX IF NOT EXISTS ix_books_id ON books(id);
+CREATE INDEX IF NOT EXISTS ix_books_group ON books(grade, class_name, category);
+CREATE TABLE IF NOT EXISTS reservations (
+    reservation_id PRIMARY KEY, book_id INTEGER, category TEXT, parent_name TEXT, student_name TEXT,
+    grade TEXT, class_name TEXT, book_title TEXT, timestamp TEXT
+);
+CREATE INDEX IF NOT EXISTS ix_res_student ON reservations(student_name, category);
+CREATE INDEX IF NOT EXISTS ix_res_book ON reservations(book_id);
+CREATE INDEX IF NOT EXISTS ix_res_group ON reservations(grade, class_name, category);
+CREATE TABLE IF NOT EXISTS students (
+    pk INTEGER PRIMARY KEY, email TEXT, email2 TEXT, name TEXT, grade TEXT, class_name TEXT, parent_csv TEXT,
+    email_key TEXT, email2_key TEXT
+);
+CREATE INDEX IF NOT EXISTS ix_students_email ON students(email_key);
+CREATE INDEX IF NOT EXISTS ix_students_email2 ON students(email2_key);
+CREATE TABLE IF NOT EXISTS config (key TEXT PRIMARY KEY, value TEXT);
+"""
+
+# Contadores materializados, mantidos por triggers a cada INSERT/UPDATE/DELETE
+COUNTERS = """
+CREATE TABLE IF NOT EXISTS group_counts (
+    grade TEXT, class_name TEXT, category TEXT, free INTEGER NOT NULL DEFAULT 0, reserved INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (grade, class_name, category)
+);
+CREATE TABLE IF NOT EXISTS student_counts (
+    student_name TEXT, category TEXT, n INTEGER NOT NULL DEFAULT 0, PRIMARY KEY (student_name, category)
+);
+CREATE TRIGGER IF NOT EXISTS tg_books_ins AFTER INSERT ON books BEGIN
+    INSERT INTO group_counts VALUES (NEW.grade, NEW.class_name, COALESCE(NEW.category, 'Livro'), NEW.available != 0, NEW.available = 0)
+    ON CONFLICT (grade, class_name, category) DO UPDATE SET free = free + excluded.free, reserved = reserved + excluded.reserved;
+END;
+CREATE TRIGGER IF NOT EXISTS tg_books_del AFTER DELETE ON books BEGIN
+    UPDATE group_counts SET free = free - (OLD.available != 0), reserved = reserved - (OLD.available = 0)
+    WHERE grade IS OLD.grade AND class_name IS OLD.class_name AND category = COALESCE(OLD.category, 'Livro');
+END;
+CREATE TRIGGER IF NOT EXISTS tg_books_upd AFTER UPDATE OF available, grade, class_name, category ON books BEGIN
+    UPDATE group_counts SET free = free - (OLD.available != 0), reserved = reserved - (OLD.available = 0)
+    WHERE grade IS OLD.grade AND class_name IS OLD.class_name AND category = COALESCE(OLD.category, 'Livro');
+    INSERT INTO group_counts VALUES (NEW.grade, NEW.class_name, COALESCE(NEW.category, 'Livro'), NEW.available != 0, NEW.available = 0)
+    ON CONFLICT (grade, class_name, category) DO UPDATE SET free = free + excluded.free, reserved = reserved + excluded.reserved;
+END;
+CREATE TRIGGER IF NOT EXISTS tg_res_ins AFTER INSERT ON reservations BEGIN
+    INSERT INTO student_counts VALUES (NEW.student_name, COALESCE(NEW.category, 'Livro'), 1)
+    ON CONFLICT (student_name, category) DO UPDATE SET n = n + 1;
+END;
+CREATE TRIGGER IF NOT EXISTS tg_res_del AFTER DELETE ON reservations BEGIN
+    UPDATE student_counts SET n = n - 1 WHERE student_name IS OLD.student_name AND category = COALESCE(OLD.category, 'Livro');
+END;
+CREATE TRIGGER IF NOT EXISTS tg_res_upd AFTER UPDATE OF student_name, category ON reservations BEGIN
+    UPDATE student_counts SET n = n - 1 WHERE student_name IS OLD.student_name AND category = COALESCE(OLD.category, 'Livro');
+    INSERT INTO student_counts VALUES (NEW.student_name, COALESCE(NEW.category, 'Livro'), 1)
+    ON CONFLICT (student_name, category) DO UPDATE SET n = n + 1;
+END;
+"""
+# Recontagem completa (bases criadas antes dos contadores e verificação)
+RECOUNT_GROUPS = """SELECT grade, class_name, COALESCE(category, 'Livro'), SUM(available != 0), SUM(available = 0)
+                    FROM books GROUP BY 1, 2, 3"""
+RECOUNT_STUDENTS = "SELECT student_name, COALESCE(category, 'Livro'), COUNT(*) FROM reservations GROUP BY 1, 2"
+
+BOOK_COLS = ["id", "category", "title", "grade", "class_name", "available", "reserved_by", "reserved_student"]
+RES_COLS = ["reservation_id", "book_id", "category", "parent_name", "student_name", "grade", "class_name", "book_title", "timestamp"]
+STUDENT_COLS = ["email", "email2", "name", "grade", "class_name", "parent_csv"]
+
+def _book(row):
+    b = dict(zip(BOOK_COLS, row))
+    b['available'] = bool(b['available'])
+    return b
+
+def _res(row):
+    return dict(zip(RES_COLS, row))
+
+def _student(row):
+    return dict(zip(STUDENT_COLS, row))
+
+class _Exists:
+    # Permite usar next_id() contra uma coluna da base
+    def __init__(self, cur, table, col):
+        self.cur = cur; self.sql = f"SELECT 1 FROM {table} WHERE {col}=? LIMIT 1"
+
+    def __contains__(self, value):
+        return self.cur.execute(self.sql, (value,)).fetchone() is not None
+
+class _Rows(list):
+    def fetchone(self):
+        return self[0] if self else None
+
+class _SharedConn:
+    # Conexão de leitura compartilhada entre threads: uma consulta por vez, com as linhas já lidas
+    def __init__(self, conn):
+        self.conn = conn
+        self.lock = threading.Lock()
+
+    def execute(self, sql, args=()):
+        with self.lock: return _Rows(self.conn.execute(sql, args).fetchall())
+
+class SQLiteStorage(Storage):
+    # Duas conexões por processo, abertas (com os PRAGMAs) uma vez só: o Streamlit roda cada rerun
+    # numa thread nova, então conexões por thread seriam reabertas a cada clique.
+    #   writer: gravações, carga e exportação, uma transação por vez sob `lock`
+    #   reader: consultas das views, compartilhada; no WAL as leituras não esperam as gravações
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.stats = OperationStats()
+        self.writer = self._connect()
+        c = self.writer
+        c.executescript(SCHEMA)
+        fresh = c.execute("SELECT name FROM sqlite_master WHERE name='group_counts'").fetchone() is None
+        c.executescript(COUNTERS)
+        self.reader = _SharedConn(self._connect())
+        if fresh and not self.is_empty(): self.recount()
+
+    def _connect(self):
+        c = sqlite3.connect(self.path, isolation_level=None, timeout=10, check_same_thread=False)
+        c.execute("PRAGMA journal_mode=WAL"); c.execute("PRAGMA synchronous=NORMAL")
+        return c
+
+    def is_empty(self):
+        c = self.reader
+        return not any(c.execute(f"SELECT 1 FROM {t} LIMIT 1").fetchone() for t in ("books", "reservations", "students"))
+
+    def view(self, groups=None):
+        return SQLiteView(self.reader)
+
+    # --- carga/exportação ---
+    def load(self, doc):
+        # Substitui todo o conteúdo por um documento no formato do data.json
+        with self.lock:
+            c = self.writer
+            c.execute("BEGIN IMMEDIATE")
+            try:
+                for t in ("books", "reservations", "students", "config"): c.execute(f"DELETE FROM {t}")
+                c.executemany(f"INSERT INTO books ({','.join(BOOK_COLS)}) VALUES ({','.join('?' * len(BOOK_COLS))})",
+                              ([b.get(k) for k in BOOK_COLS] for b in doc.get('books', [])))
+                c.executemany(f"INSERT OR REPLACE INTO reservations ({','.join(RES_COLS)}) VALUES ({','.join('?' * len(RES_COLS))})",
+                              ([r.get(k) for k in RES_COLS] for r in doc.get('reservations', [])))
+                self._insert_students(c, doc.get('students_db', []))
+                c.execute("INSERT INTO config VALUES ('password', ?)", (doc.get('admin_config', {}).get('password', 'villa123'),))
+                self._bump(c)
+                c.execute("COMMIT")
+            except Exception:
+                c.execute("ROLLBACK"); raise
+
+    def export(self):
+        with self.lock:
+            c = self.writer
+            return {
+                "schema_version": SCHEMA_VERSION,
+                "admin_config": SQLiteView(c).admin_config(),
+                "books": [_book(r) for r in c.execute(f"SELECT {','.join(BOOK_COLS)} FROM books ORDER BY pk")],
+                "reservations": [_res(r) for r in c.execute(f"SELECT {','.join(RES_COLS)} FROM reservations ORDER BY rowid")],
+                "students_db": [_student(r) for r in c.execute(f"SELECT {','.join(STUDENT_COLS)} FROM students ORDER BY pk")],
+            }
+
+    def _insert_students(self, c, students):
+        c.executemany(f"INSERT INTO students ({','.join(STUDENT_COLS)}, email_key, email2_key) VALUES ({','.join('?' * (len(STUDENT_COLS) + 2))})",
+                      ([s.get(k) for k in STUDENT_COLS] + [email_key(s.get('email')), email_key(s.get('email2'))] for s in students))
+
+    def recount(self):
+        with self.lock:
+            c = self.writer
+            c.execute("BEGIN IMMEDIATE")
+            c.execute("DELETE FROM group_counts"); c.execute("DELETE FROM student_counts")
+            c.execute(f"INSERT INTO group_counts {RECOUNT_GROUPS}"); c.execute(f"INSERT INTO student_counts {RECOUNT_STUDENTS}")
+            c.execute("COMMIT")
+
+    # --- escrita ---
+    def _bump(self, c):
+        # Versão dos dados (config 'rev'), usada pelos caches derivados (relatórios)
+        c.execute("INSERT INTO config VALUES ('rev', 1) ON CONFLICT(key) DO UPDATE SET value = CAST(value AS INTEGER) + 1")
+
+    def commit_now(self, ops):
+        # Uma transação por chamada; cada operação num SAVEPOINT, para que a falha de uma
+        # não desfaça as outras. `lock` (e, entre processos, BEGIN IMMEDIATE) serializa escritores:
+        # não há conflito a repetir.
+        single = not isinstance(ops, list)
+        ops = [ops] if single else ops
+        with self.lock:
+            c = self.writer
+            c.execute("BEGIN IMMEDIATE")
+            try:
+                for op in ops:
+                    c.execute("SAVEPOINT op")
+                    try:
+                        op.result = getattr(self, f"_op_{op.kind}")(c, op); op.ok = True; op.error = None
+                        c.execute("RELEASE op")
+                    except OperationError as e:
+                        c.execute("ROLLBACK TO op"); c.execute("RELEASE op")
+                        op.ok = False; op.error = str(e)
+                if any(op.ok for op in ops): self._bump(c)
+                c.execute("COMMIT")
+            except Exception as e:
+                c.execute("ROLLBACK")
+                for op in ops: op.ok = False; op.error = f"Erro SQLite: {e}"
+        for op in ops: self.stats.record(op)
+        return ops[0] if single else ops
+
+    def _find_book(self, c, item_id, title):
+        # Ids antigos podem se repetir: o título desempata
+        return c.execute(f"SELECT pk, {','.join(BOOK_COLS)} FROM books WHERE id=? ORDER BY (title IS ?) DESC, pk LIMIT 1",
+                         (item_id, title)).fetchone()
+
+    def _op_reserve(self, c, op):
+        user = op.user
+        row = self._find_book(c, op.item_id, op.title)
+        if row is None: raise OperationError("Perdeu!")
+        pk, book = row[0], _book(row[1:])
+        if not book['available']: raise OperationError("Perdeu!")
+        cat = book.get('category') or 'Livro'
+        limit = LIMITES_RESERVA[get_segmento(user['grade'])][cat]
+        if SQLiteView(c).student_count(user['student'], cat) >= limit: raise OperationError("Limite atingido!")
+        # Reserva atômica: só uma transação consegue virar available de 1 para 0
+        if c.execute("UPDATE books SET available=0, reserved_by=?, reserved_student=? WHERE pk=? AND available=1",
+                     (user['parent'], user['student'], pk)).rowcount != 1:
+            raise OperationError("Perdeu!")
+        res = {
+            "reservation_id": next_id(_Exists(c, "reservations", "reservation_id")), "book_id": book['id'],
+            "category": cat, "parent_name": user['parent'],
+            "student_name": user['student'], "grade": user['grade'],
+            "class_name": user['class_name'], "book_title": book['title'],
+            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M")
+        }
+        c.execute(f"INSERT INTO reservations ({','.join(RES_COLS)}) VALUES ({','.join('?' * len(RES_COLS))})", [res[k] for k in RES_COLS])
+        return res
+
+    def _op_cancel(self, c, op):
+        row = self._find_book(c, op.item_id, op.title)
+        if row is None or not (_book(row[1:])['reserved_by'] == op.user_parent or op.user_parent == "ADMIN_OVERRIDE"):
+            raise OperationError("Reserva não encontrada.")
+        c.execute("UPDATE books SET available=1, reserved_by=NULL, reserved_student=NULL WHERE pk=?", (row[0],))
+        if op.res_id: c.execute("DELETE FROM reservations WHERE reservation_id=?", (op.res_id,))
+        else: c.execute("DELETE FROM reservations WHERE book_id=?", (op.item_id,))
+
+    def _op_cancel_many(self, c, op):
+        gone = 0
+        for rid in dict.fromkeys(op.res_ids):
+            row = c.execute("SELECT book_id, book_title FROM reservations WHERE reservation_id=?", (rid,)).fetchone()
+            if row is None: continue
+            book = self._find_book(c, *row)
+            if book is not None: c.execute("UPDATE books SET available=1, reserved_by=NULL, reserved_student=NULL WHERE pk=?", (book[0],))
+            gone += c.execute("DELETE FROM reservations WHERE reservation_id=?", (rid,)).rowcount
+        if not gone: raise OperationError("Nenhuma reserva encontrada.")
+        return gone
+
+    def _op_reassign(self, c, op):
+        s = op.student
+        if s is not None:
+            target = {"student_name": s['name'], "parent_name": s.get('parent_csv') or s['name'], "grade": s['grade'], "class_name": s['class_name']}
+            limits = LIMITES_RESERVA[get_segmento(s['grade'])]
+        else:
+            target = {k: v for k, v in (("grade", op.grade), ("class_name", op.class_name)) if v}
+            if not target: raise OperationError("Destino não informado.")
+        moved = kept = 0
+        for rid in dict.fromkeys(op.res_ids):
+            row = c.execute("SELECT book_id, book_title, category, student_name FROM reservations WHERE reservation_id=?", (rid,)).fetchone()
+            if row is None: continue
+            if s is not None:
+                if row[3] == s['name']: continue
+                cat = row[2] or 'Livro'
+                if SQLiteView(c).student_count(s['name'], cat) >= limits[cat]: kept += 1; continue
+            c.execute(f"UPDATE reservations SET {', '.join(f'{k}=?' for k in target)} WHERE reservation_id=?", list(target.values()) + [rid])
+            book = self._find_book(c, row[0], row[1])
+            if book is not None:
+                changes = {k: target[k] for k in ("grade", "class_name") if k in target}
+                if s is not None: changes.update(reserved_by=target['parent_name'], reserved_student=target['student_name'])
+                c.execute(f"UPDATE books SET {', '.join(f'{k}=?' for k in changes)} WHERE pk=?", list(changes.values()) + [book[0]])
+            moved += 1
+        if not moved: raise OperationError("Nenhuma reserva movida." + (" (limite do aluno atingido)" if kept else ""))
+        return moved, kept
+
+    def _student_pk(self, c, s):
+        where = " AND ".join(f"{k} IS ?" for k in STUDENT_COLS)
+        row = c.execute(f"SELECT pk FROM students WHERE {where} LIMIT 1", [s.get(k) for k in STUDENT_COLS]).fetchone()
+        return row[0] if row else None
+
+    def _op_add_student(self, c, op):
+        self._insert_students(c, [op.student])
+
+    def _op_update_student(self, c, op):
+        pk = self._student_pk(c, op.original)
+        if pk is None: raise OperationError("Aluno alterado ou removido por outra pessoa.")
+        s = op.new
+        c.execute(f"UPDATE students SET {', '.join(f'{k}=?' for k in STUDENT_COLS)}, email_key=?, email2_key=? WHERE pk=?",
+                  [s.get(k) for k in STUDENT_COLS] + [email_key(s.get('email')), email_key(s.get('email2')), pk])
+
+    def _op_delete_student(self, c, op):
+        pk = self._student_pk(c, op.original)
+        if pk is None: raise OperationError("Aluno já removido.")
+        c.execute("DELETE FROM students WHERE pk=?", (pk,))
+
+    def _op_import_students(self, c, op):
+        existing = {}
+        for row in c.execute(f"SELECT pk, {','.join(STUDENT_COLS)} FROM students ORDER BY pk"):
+            s = _student(row[1:]); existing.setdefault(student_key(s), (row[0], s))
+        counts = {"inserted": 0, "updated": 0, "skipped": op.skipped}
+        new, updates = [], []
+        for s in op.students:
+            key = student_key(s)
+            if key not in existing:
+                s = dict(s); new.append(s); existing[key] = (None, s); counts["inserted"] += 1; continue
+            pk, cur = existing[key]
+            changes = {k: s[k] for k in IMPORT_UPDATABLE if s.get(k) and cur.get(k) != s[k]}
+            if not changes: counts["skipped"] += 1; continue
+            cur.update(changes); counts["updated"] += 1
+            if pk is not None: updates.append([cur[k] for k in IMPORT_UPDATABLE] + [pk])
+        self._insert_students(c, new)
+        c.executemany(f"UPDATE students SET {', '.join(f'{k}=?' for k in IMPORT_UPDATABLE)} WHERE pk=?", updates)
+        return counts
+
+    def _op_add_items(self, c, op):
+        exists = _Exists(c, "books", "id")
+        rows = []
+        new = 0
+        for it in op.items:
+            new = next_id(exists, new + 1)
+            b = {"id": new, **it}
+            rows.append([b.get(k) for k in BOOK_COLS])
+        c.executemany(f"INSERT INTO books ({','.join(BOOK_COLS)}) VALUES ({','.join('?' * len(BOOK_COLS))})", rows)
+        return len(rows)
+
+    def _op_update_item(self, c, op):
+        row = self._find_book(c, op.item_id, op.title)
+        if row is None: raise OperationError("Item removido por outra pessoa.")
+        book = _book(row[1:])
+        changes = {k: v for k, v in op.changes.items() if k in BOOK_COLS and k not in ("id", "available")}
+        if not book['available']:
+            if any(k in changes and changes[k] != book.get(k) for k in GROUP_COLS): raise OperationError(RESERVED_GROUP_MSG)
+            if "title" in changes: c.execute("UPDATE reservations SET book_title=? WHERE book_id=? AND book_title IS ?", (changes['title'], book['id'], book['title']))
+        if changes: c.execute(f"UPDATE books SET {', '.join(f'{k}=?' for k in changes)} WHERE pk=?", list(changes.values()) + [row[0]])
+
+    def _op_delete_items(self, c, op):
+        c.execute("CREATE TEMP TABLE IF NOT EXISTS _ids (id INTEGER PRIMARY KEY)"); c.execute("DELETE FROM _ids")
+        c.executemany("INSERT OR IGNORE INTO _ids VALUES (?)", ((i,) for i in op.item_ids))
+        where, args = SQLiteView(c)._filters(*op.scope) if op.scope else ("1=1", [])
+        skipped = c.execute(f"SELECT COUNT(*) FROM books WHERE available=0 AND id IN (SELECT id FROM _ids) AND {where}", args).fetchone()[0]
+        deleted = c.execute(f"DELETE FROM books WHERE available=1 AND id IN (SELECT id FROM _ids) AND {where}", args).rowcount
+        if not deleted: raise OperationError("Nenhum item excluído (itens reservados são mantidos).")
+        return deleted, skipped
+
+    def _op_release_items(self, c, op):
+        where, args = SQLiteView(c)._filters(*op.scope)
+        n = 0
+        for row in c.execute(f"SELECT pk, id FROM books WHERE available=0 AND {where}", args).fetchall():
+            refs = c.execute("SELECT book_id, book_title FROM reservations WHERE book_id=?", (row[1],)).fetchall()
+            if any((self._find_book(c, *r) or (None,))[0] == row[0] for r in refs): continue
+            c.execute("UPDATE books SET available=1, reserved_by=NULL, reserved_student=NULL WHERE pk=?", (row[0],)); n += 1
+        return n
+
+    def _op_set_password(self, c, op):
+        c.execute("INSERT OR REPLACE INTO config VALUES ('password', ?)", (op.password,))
+
+class SQLiteView:
+    # Mesma API de consulta do DataIndex, respondida por SQL indexado
+    def __init__(self, conn):
+        self.c = conn
+
+    def _books(self, where, args):
+        return [_book(r) for r in self.c.execute(f"SELECT {','.join(BOOK_COLS)} FROM books WHERE {where} ORDER BY pk", args)]
+
+    def _reservations(self, where, args):
+        return [_res(r) for r in self.c.execute(f"SELECT {','.join(RES_COLS)} FROM reservations WHERE {where} ORDER BY rowid", args)]
+
+    def students_for_email(self, email):
+        key = email_key(email)
+        if not key: return []
+        return [_student(r) for r in self.c.execute(f"SELECT {','.join(STUDENT_COLS)} FROM students WHERE email_key=? OR email2_key=? ORDER BY pk", (key, key))]
+
+    def reservations_for(self, student):
+        return self._reservations("student_name=?", (str(student),))
+
+    def reservation(self, res_id):
+        found = self._reservations("reservation_id=?", (res_id,))
+        return found[0] if found else None
+
+    def book(self, item_id, title=None):
+        row = self.c.execute(f"SELECT {','.join(BOOK_COLS)} FROM books WHERE id=? ORDER BY (title IS ?) DESC, pk LIMIT 1", (item_id, title)).fetchone()
+        return _book(row) if row else None
+
+    def items_for(self, grade, class_name, categories):
+        categories = list(categories)
+        return self._books(f"grade=? AND class_name=? AND category IN ({','.join('?' * len(categories))})", [grade, class_name] + categories)
+
+    def items_where(self, category=None, grade=None, class_name=None):
+        return self._books(*self._filters(category, grade, class_name))
+
+    def reservations_where(self, category=None, grade=None, class_name=None):
+        return self._reservations(*self._filters(category, grade, class_name))
+
+    def _filters(self, category, grade, class_name):
+        conds, args = ["1=1"], []
+        for col, val in (("category", category), ("grade", grade), ("class_name", class_name)):
+            if val is not None: conds.append(f"{col}=?"); args.append(val)
+        return " AND ".join(conds), args
+
+    def students(self):
+        return [_student(r) for r in self.c.execute(f"SELECT {','.join(STUDENT_COLS)} FROM students ORDER BY pk")]
+
+    # --- contadores ---
+    def free_count(self, grade, class_name, category):
+        row = self.c.execute("SELECT free FROM group_counts WHERE grade=? AND class_name=? AND category=?", (grade, class_name, category)).fetchone()
+        return row[0] if row else 0
+
+    def reserved_count(self, grade, class_name, category):
+        row = self.c.execute("SELECT reserved FROM group_counts WHERE grade=? AND class_name=? AND category=?", (grade, class_name, category)).fetchone()
+        return row[0] if row else 0
+
+    def student_count(self, student, category):
+        row = self.c.execute("SELECT n FROM student_counts WHERE student_name=? AND category=?", (str(student), category)).fetchone()
+        return row[0] if row else 0
+
+    def availability(self, category=None, grade=None, class_name=None):
+        where, args = self._filters(category, grade, class_name)
+        return [{"grade": g, "class_name": c, "category": cat, "free": f, "reserved": r} for g, c, cat, f, r in self.c.execute(
+            f"SELECT grade, class_name, category, free, reserved FROM group_counts WHERE {where} AND (free OR reserved) ORDER BY 1, 2, 3", args)]
+
+    def verify(self):
+        diffs = {}
+        # Mesmo formato de DataIndex.verify(): {tabela: {chave: (materializado, recontado)}}
+        for table, sql, n_key in (("group_counts", RECOUNT_GROUPS, 3), ("student_counts", RECOUNT_STUDENTS, 2)):
+            mine = {tuple(r[:n_key]): tuple(r[n_key:]) for r in self.c.execute(f"SELECT * FROM {table}") if any(r[n_key:])}
+            real = {tuple(r[:n_key]): tuple(r[n_key:]) for r in self.c.execute(sql)}
+            bad = {k: (mine.get(k), real.get(k)) for k in mine.keys() | real.keys() if mine.get(k) != real.get(k)}
+            if bad: diffs[table] = bad
+        return diffs
+
+    def version(self):
+        row = self.c.execute("SELECT value FROM config WHERE key='rev'").fetchone()
+        return ("sqlite", int(row[0]) if row else 0)
+
+    def admin_config(self):
+        row = self.c.execute("SELECT value FROM config WHERE key='password'").fetchone()
+        return {"password": row[0] if row else "villa123"}
@@ -0,0 +1,62 @@
+import os
+import sys
+import json
+import shutil
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+@pytest.fixture
+def data_file(tmp_path):
+    # Cópia do data.json do repositório (formato real: esquema antigo, ids repetidos, itens
+    # reservados sem reserva) numa pasta própria, para o LocalRepo
+    path = tmp_path / "data.json"
+    shutil.copy(os.path.join(ROOT, "data.json"), path)
+    return path
+
+@pytest.fixture
+def doc():
+    with open(os.path.join(ROOT, "data.json"), encoding="utf-8") as f: return json.load(f)
+
+@pytest.fixture
+def fake_repo(doc):
+    # GitHub simulado sem latência, com o data.json do repositório
+    from bench.fake_github import FakeRepo
+    repo = FakeRepo(0, 0, 1e12)
+    repo.put("data.json", json.dumps(doc))
+    return repo
+
+@pytest.fixture
+def local(data_file):
+    # Nova instância do app sobre a pasta do data_file (cada chamada, um LocalRepo próprio);
+    # com `shards_dir`, o layout fragmentado
+    from local_repo import LocalRepo
+    from github_storage import GitHubConnection, ShardedGitHubConnection
+    def connect(shards_dir=None, **kw):
+        repo = LocalRepo(str(data_file.parent)); kw.setdefault("ttl", 0)
+        if shards_dir: return ShardedGitHubConnection(repo, "data.json", "main", shards_dir, **kw)
+        return GitHubConnection(repo, "data.json", "main", **kw)
+    return connect
+
+@pytest.fixture(params=["github", "sqlite"])
+def store(request, local, tmp_path):
+    # O mesmo teste nos dois backends: DataIndex (GitHub local) e SQLite com os mesmos dados
+    if request.param == "github": return local()
+    from storage import SQLiteStorage
+    s = SQLiteStorage(str(tmp_path / "x.db")); s.load(local().export())
+    return s
+
+# --- helpers sobre uma view (API do DataIndex) ---
+def user_of(s):
+    from domain import get_segmento
+    return {"parent": s["parent_csv"], "student": s["name"], "grade": s["grade"], "class_name": s["class_name"],
+            "email": s["email"], "segment": get_segmento(s["grade"])}
+
+def free_item(view, s):
+    return next(b for b in view.items_for(s["grade"], s["class_name"], ["Livro", "Jogo", "Brinquedo"]) if b["available"])
+
+def new_student(view):
+    # Aluno sem reservas, com item livre na turma
+    return next(s for s in view.students() if not view.reservations_for(s["name"]) and
+                any(b["available"] for b in view.items_for(s["grade"], s["class_name"], ["Livro"])))
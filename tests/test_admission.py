@@ -0,0 +1,56 @@
+import threading
+from types import SimpleNamespace
+from admission import AdmissionControl, FULL, TOO_FAST
+from storage import Storage
+
+class Recorder(Storage):
+    # Storage que só anota os lotes; o primeiro commit espera `gate` (fila acumulando)
+    def __init__(self):
+        self.batches = []
+        self.started = threading.Event(); self.gate = threading.Event()
+
+    def partition(self, ops):
+        return ops[0].group
+
+    def commit_now(self, ops):
+        self.started.set(); self.gate.wait(5)
+        self.batches.append([op.tag for op in ops])
+        for op in ops: op.ok = True
+        return ops
+
+def op(tag, group=None):
+    return SimpleNamespace(tag=tag, group=group, ok=False, error=None)
+
+def drain(tickets):
+    for t in tickets: assert t.done.wait(5)
+
+def test_sessions_are_served_round_robin():
+    store, adm = Recorder(), AdmissionControl(workers=1, max_batch=2, burst=3)
+    first = adm.submit(store, "a", [op("a1")])
+    assert store.started.wait(5)
+    tickets = [adm.submit(store, s, [op(tag)]) for s, tag in (("a", "a2"), ("a", "a3"), ("b", "b1"), ("c", "c1"))]
+    store.gate.set(); drain([first] + tickets)
+    # Quem clicou três vezes não passa na frente de quem clicou uma
+    assert store.batches == [["a1"], ["a2", "b1"], ["c1", "a3"]]
+
+def test_session_rate_and_queue_limit():
+    store, adm = Recorder(), AdmissionControl(workers=1, max_queue=4, rate=0.5, burst=3)
+    first = adm.submit(store, "a", [op(0)])
+    assert store.started.wait(5)
+    tickets = [adm.submit(store, "a", [op(i)]) for i in (1, 2)]
+    late = op(3)
+    assert adm.submit(store, "a", [late]) is None and late.error == TOO_FAST
+    tickets += [adm.submit(store, s, [op(s)]) for s in ("b", "c")]
+    full = op("d")
+    assert adm.submit(store, "d", [full]) is None and full.error == FULL
+    assert adm.stats["too_fast"] == 1 and adm.stats["full"] == 1
+    store.gate.set(); drain([first] + tickets)
+    assert all(o.ok for t in [first] + tickets for o in t.ops)
+
+def test_batches_never_mix_partitions():
+    store, adm = Recorder(), AdmissionControl(workers=1, max_batch=10)
+    first = adm.submit(store, "x", [op("x", "g1")])
+    assert store.started.wait(5)
+    tickets = [adm.submit(store, s, [op(s, g)]) for s, g in (("a", "g1"), ("b", "g2"), ("c", "g1"), ("d", "g2"))]
+    store.gate.set(); drain([first] + tickets)
+    assert store.batches == [["x"], ["a", "c"], ["b", "d"]]
@@ -0,0 +1,61 @@
+from domain import LIMITES_RESERVA, CancelReservations, ReassignReservations, get_segmento
+from conftest import new_student
+
+def reserved(view, n, category="Livro"):
+    # n reservas cujo item ainda existe, de alunos diferentes
+    out, seen = [], set()
+    for r in view.reservations_where(category):
+        if r["student_name"] in seen or view.book(r["book_id"], r["book_title"]) is None: continue
+        seen.add(r["student_name"]); out.append(dict(r))
+        if len(out) == n: break
+    return out
+
+def test_cancel_many_ignores_stale_ids(store):
+    a, b = reserved(store.view(), 2)
+    total = len(store.view().reservations_where())
+    op = store.commit_now(CancelReservations([a["reservation_id"], "sumiu", b["reservation_id"], a["reservation_id"]]))
+    assert op.ok and op.result == 2
+    view = store.view()
+    assert len(view.reservations_where()) == total - 2
+    for r in (a, b):
+        assert view.reservation(r["reservation_id"]) is None and view.book(r["book_id"], r["book_title"])["available"]
+
+def test_cancel_many_failure_leaves_the_rest_of_the_batch(store):
+    a, = reserved(store.view(), 1)
+    total = len(store.view().reservations_where())
+    ok, stale = store.commit_now([CancelReservations([a["reservation_id"]]), CancelReservations(["sumiu", "nunca"])])
+    assert ok.ok and ok.result == 1
+    assert not stale.ok and stale.error == "Nenhuma reserva encontrada."
+    assert len(store.view().reservations_where()) == total - 1
+
+def test_reassign_to_other_class_moves_item(store):
+    r, = reserved(store.view(), 1)
+    grade, class_name = next((s["grade"], s["class_name"]) for s in store.view().students()
+                             if (s["grade"], s["class_name"]) != (r["grade"], r["class_name"]))
+    op = store.commit_now(ReassignReservations([r["reservation_id"], "sumiu"], grade=grade, class_name=class_name))
+    assert op.ok and op.result == (1, 0)
+    view = store.view()
+    moved = view.reservation(r["reservation_id"])
+    assert (moved["grade"], moved["class_name"], moved["student_name"]) == (grade, class_name, r["student_name"])
+    b = view.book(r["book_id"], r["book_title"])
+    assert (b["grade"], b["class_name"], b["available"]) == (grade, class_name, False)
+    assert not store.commit_now(ReassignReservations(["sumiu"], grade=grade)).ok
+    assert not store.commit_now(ReassignReservations([r["reservation_id"]])).ok
+
+def test_reassign_to_student_keeps_what_passes_the_limit(store):
+    s = new_student(store.view())
+    limit = LIMITES_RESERVA[get_segmento(s["grade"])]["Livro"]
+    rs = reserved(store.view(), limit + 1)
+    assert len(rs) == limit + 1
+    op = store.commit_now(ReassignReservations([r["reservation_id"] for r in rs], student=s))
+    assert op.ok and op.result == (limit, 1)
+    view = store.view()
+    assert len(view.reservations_for(s["name"])) == limit
+    for r in rs[:limit]:
+        b = view.book(r["book_id"], r["book_title"])
+        assert (b["reserved_student"], b["grade"], b["class_name"]) == (s["name"], s["grade"], s["class_name"])
+    assert view.reservation(rs[-1]["reservation_id"])["student_name"] == rs[-1]["student_name"]
+    # Tudo acima do limite: a operação falha e nada muda
+    op = store.commit_now(ReassignReservations([rs[-1]["reservation_id"]], student=s))
+    assert not op.ok and "limite" in op.error
+    assert store.view().reservation(rs[-1]["reservation_id"])["student_name"] == rs[-1]["student_name"]
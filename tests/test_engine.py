@@ -0,0 +1,60 @@
+import copy
+import pytest
+import cli
+import engine
+from domain import OperationError
+from storage import SQLiteStorage
+
+def group_books(view, grade):
+    return [b for b in view.items_where() if b['grade'] == grade]
+
+def test_reset_frees_orphaned_reserved_items(data_file):
+    store = engine.open_storage(str(data_file))
+    before = store.view()
+    held = {(r['book_id'], r['book_title']) for r in before.reservations_where()}
+    orphans = [b for b in group_books(before, "Grupo 3") if not b['available'] and (b['id'], b['title']) not in held]
+    assert orphans
+    others = len(before.items_where()) - len(group_books(before, "Grupo 3"))
+
+    ops = engine.end_of_term(store, grade="Grupo 3")
+    assert all(op.ok for op in ops)
+    after = engine.open_storage(str(data_file)).view()
+    assert all(b['available'] for b in group_books(after, "Grupo 3"))
+    assert not after.reservations_where(None, "Grupo 3", None)
+    assert len(after.items_where()) - len(group_books(after, "Grupo 3")) == others
+
+def test_reset_with_delete_leaves_nothing_in_the_group(data_file):
+    store = engine.open_storage(str(data_file))
+    others = [b for b in store.view().items_where() if b['grade'] != "Grupo 3"]
+    ops = engine.end_of_term(store, grade="Grupo 3", delete_items=True)
+    assert all(op.ok for op in ops)
+    after = engine.open_storage(str(data_file)).view()
+    assert group_books(after, "Grupo 3") == []
+    assert len(after.items_where()) == len(others)
+
+def test_reset_sqlite(tmp_path, doc):
+    store = SQLiteStorage(str(tmp_path / "x.db")); store.load(copy.deepcopy(doc))
+    ops = engine.end_of_term(store, grade="Grupo 3")
+    assert all(op.ok for op in ops)
+    assert all(b['available'] for b in group_books(store.view(), "Grupo 3"))
+
+def test_reset_plan_empty_filter(data_file):
+    store = engine.open_storage(str(data_file))
+    engine.end_of_term(store, grade="Grupo 3", delete_items=True)
+    assert engine.reset_plan(store, grade="Grupo 3") == []
+    with pytest.raises(OperationError): engine.end_of_term(store, grade="Grupo 3")
+
+def test_read_only_commands_do_not_write(data_file, tmp_path):
+    raw = data_file.read_bytes()
+    assert cli.main(["--data", str(data_file), "report", "quota_fill", "-o", str(tmp_path / "q.csv")]) == 0
+    assert cli.main(["--data", str(data_file), "reset", "--grade", "Grupo 3"]) == 0
+    assert data_file.read_bytes() == raw
+
+def test_items_job_is_one_commit(data_file, tmp_path):
+    lista = tmp_path / "lista.txt"
+    lista.write_text("".join(f"LIVRO {i}\n" for i in range(500)), encoding="utf-8")
+    store = engine.open_storage(str(data_file), read_only=True)
+    head = store.repo.head
+    op = engine.load_items(store, open(lista, "rb"), "Livro", "1º Ano", "A")
+    assert op.ok and op.result == 500
+    assert store.repo.head == head + 1
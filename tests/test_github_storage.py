@@ -0,0 +1,37 @@
+import threading
+from domain import ReserveItem
+from github_storage import GitHubConnection
+from storage import WriteCoalescer
+from conftest import user_of, free_item, new_student
+
+def test_revalidation_after_write_is_conditional(fake_repo):
+    repo = fake_repo
+    store = GitHubConnection(repo, "data.json", "main", ttl=0)
+    s = new_student(store.view())
+    b = free_item(store.view(), s)
+    assert store.commit_now(ReserveItem(b["id"], user_of(s), b["title"])).ok
+    gets = repo.calls["get"]
+    store.view()
+    assert repo.calls["get"] == gets and repo.calls["get_304"] >= 1
+
+def test_write_coalescer_batches_concurrent_commits(fake_repo):
+    store = GitHubConnection(fake_repo, "data.json", "main", ttl=0)
+    store.coalescer = WriteCoalescer(0.3)
+    view = store.view()
+    picks = []
+    for s in view.students():
+        if len(picks) == 4: break
+        if view.reservations_for(s["name"]) or any(p[0]["name"] == s["name"] for p in picks): continue
+        b = next((b for b in view.items_for(s["grade"], s["class_name"], ["Livro"])
+                  if b["available"] and all(b is not p[1] for p in picks)), None)
+        if b: picks.append((s, b))
+    puts = fake_repo.calls["put"]
+    results = []
+    threads = [threading.Thread(target=lambda s=s, b=b: results.append(store.commit(ReserveItem(b["id"], user_of(s), b["title"]))))
+               for s, b in picks]
+    for t in threads: t.start()
+    for t in threads: t.join()
+    # Quatro cliques dentro da janela: um commit só, resultado por operação
+    assert len(results) == 4 and all(op.ok for op in results)
+    assert fake_repo.calls["put"] - puts == 1 and store.coalescer.batches == 1 and store.coalescer.max_batch == 4
+    assert all(store.view().reservations_for(s["name"]) for s, _ in picks)
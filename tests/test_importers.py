@@ -0,0 +1,42 @@
+import io
+from importers import detect_encoding, read_items, read_students_csv
+
+HEADER = "#Email,#NomeAluno,#Curso,#CodTurno,#NomeResponsavel\n"
+
+def students(rows, encoding="utf-8"):
+    return io.BytesIO((HEADER + "".join(f"{e},{n},{c},{t},{p}\n" for e, n, c, t, p in rows)).encode(encoding))
+
+def filler(n):
+    # Linhas só com ASCII até passar de `n` bytes
+    rows, size = [], 0
+    while size < n:
+        row = (f"a{len(rows)}@x.com", f"ALUNO {len(rows)}", "91", "M", "MAE"); rows.append(row); size += len(",".join(row)) + 1
+    return rows
+
+def test_utf8_file():
+    f = students([("joao@x.com", "JOÃO", "91", "M", "MÃE"), ("ana@x.com", "ANA", "3.0", "V", "PAI")])
+    assert detect_encoding(f) == "utf-8" and f.tell() == 0
+    got, skipped = read_students_csv(f)
+    assert skipped == 0
+    assert got[0] == {"email": "joao@x.com", "email2": "", "name": "JOÃO", "grade": "1º Ano", "class_name": "Matutino", "parent_csv": "MÃE"}
+    assert (got[1]["grade"], got[1]["class_name"]) == ("Grupo 3", "Vespertino")
+
+def test_latin1_file():
+    got, _ = read_students_csv(students([("joao@x.com", "JOÃO", "91", "M", "MÃE")], "latin-1"))
+    assert got[0]["name"] == "JOÃO" and got[0]["parent_csv"] == "MÃE"
+
+def test_latin1_accents_past_the_first_block():
+    f = students(filler(96 * 1024) + [("ze@x.com", "JOSÉ", "92", "V", "CONCEIÇÃO")], "latin-1")
+    assert len(f.getvalue()) > 96 * 1024 and detect_encoding(f, block=65536) == "latin-1"
+    got, _ = read_students_csv(f, chunksize=500)
+    assert got[-1]["name"] == "JOSÉ" and got[-1]["parent_csv"] == "CONCEIÇÃO"
+    titles = io.BytesIO(("LIVRO\n" * 20000 + "ÁRVORE\n").encode("latin-1"))
+    assert [it["title"] for it in read_items(titles, grade="1º Ano", class_name="Matutino")][-1] == "ÁRVORE"
+
+def test_duplicate_and_nameless_rows_are_skipped():
+    # Mesma chave (e-mail + nome, sem caixa) repetida: vale a última linha, mesmo entre blocos
+    f = students([("ana@x.com", "ANA", "1", "M", "MAE 1"), ("b@x.com", "", "1", "M", "X"),
+                  ("bia@x.com", "BIA", "2", "V", "PAI"), ("ANA@x.com", "ana", "1", "V", "MAE 2")])
+    got, skipped = read_students_csv(f, chunksize=2)
+    assert skipped == 2
+    assert [(s["name"], s["class_name"], s["parent_csv"]) for s in got] == [("BIA", "Vespertino", "PAI"), ("ana", "Vespertino", "MAE 2")]
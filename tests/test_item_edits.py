@@ -0,0 +1,44 @@
+from domain import RESERVED_GROUP_MSG, CancelReservation, UpdateItem, item_edits
+
+def held(view):
+    # Um item reservado com reserva e um livre da mesma turma
+    r = view.reservations_where("Livro")[0]
+    b = view.book(r["book_id"], r["book_title"])
+    free = next(x for x in view.items_for(b["grade"], b["class_name"], ["Livro"]) if x["available"])
+    return r, b, free
+
+def rows(b, free):
+    return [dict(b), dict(free)]
+
+def test_rows_match_by_id_not_position(store):
+    r, b, free = held(store.view())
+    edited = rows(b, free)[::-1]
+    edited[0]["title"] = free["title"] + " (2ª ed.)"
+    ops = item_edits(rows(b, free), edited)
+    assert [(type(op), op.item_id) for op in ops] == [(UpdateItem, free["id"])]
+
+def test_unticking_a_free_item_does_nothing(store):
+    r, b, free = held(store.view())
+    edited = rows(b, free); edited[1]["available"] = False
+    assert item_edits(rows(b, free), edited) == []
+
+def test_ticking_a_reserved_item_cancels_its_reservation(store):
+    r, b, free = held(store.view())
+    edited = rows(b, free); edited[0]["available"] = True
+    ops = item_edits(rows(b, free), edited)
+    assert [type(op) for op in ops] == [CancelReservation]
+    assert all(op.ok for op in store.commit_now(ops))
+    view = store.view()
+    assert view.book(b["id"], b["title"])["available"] and view.reservation(r["reservation_id"]) is None
+
+def test_reserved_item_keeps_its_class_and_title_follows(store):
+    r, b, free = held(store.view())
+    other = "Vespertino" if b["class_name"] != "Vespertino" else "Matutino"
+    edited = rows(b, free); edited[0]["class_name"] = other
+    op, = item_edits(rows(b, free), edited)
+    assert not store.commit_now(op).ok and op.error == RESERVED_GROUP_MSG
+    edited = rows(b, free); edited[0]["title"] = "Título corrigido"
+    assert all(op.ok for op in store.commit_now(item_edits(rows(b, free), edited)))
+    view = store.view()
+    assert view.reservation(r["reservation_id"])["book_title"] == "Título corrigido"
+    assert not view.book(b["id"], "Título corrigido")["available"]
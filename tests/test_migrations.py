@@ -0,0 +1,59 @@
+import copy
+import json
+from local_repo import LocalRepo
+from github_storage import GitHubConnection
+from migrations import SCHEMA_VERSION, migrate, needs_migration
+
+def book(id, title, grade="Grupo 3", class_name="Matutino", available=True):
+    return {"id": id, "title": title, "category": "Livro", "grade": grade, "class_name": class_name,
+            "available": available, "reserved_by": None, "reserved_student": None}
+
+def res(rid, id, title, grade="Grupo 3", class_name="Matutino"):
+    return {"reservation_id": rid, "book_id": id, "book_title": title, "grade": grade, "class_name": class_name}
+
+def test_v2_renumbers_repeated_ids_and_keeps_reservations():
+    doc = {"schema_version": 1, "books": [book(7, "A"), book(7, "B", available=False), book(9, "C")],
+           "reservations": [res("r1", 7, "B")], "students_db": [], "admin_config": {}}
+    assert migrate(doc) == [2]
+    assert [b["id"] for b in doc["books"]] == [7, 10, 9]
+    assert doc["reservations"][0]["book_id"] == 10
+
+def test_v2_twins_follow_their_class():
+    # Mesmo id e título em duas turmas: cada reserva fica com o item da própria turma
+    doc = {"schema_version": 1, "books": [book(5, "A", "Grupo 3", "Matutino"), book(5, "A", "Grupo 3", "Vespertino")],
+           "reservations": [res("r1", 5, "A", "Grupo 3", "Vespertino"), res("r2", 5, "A", "Grupo 3", "Matutino")],
+           "students_db": [], "admin_config": {}}
+    migrate(doc)
+    assert [b["id"] for b in doc["books"]] == [5, 6]
+    assert {r["reservation_id"]: r["book_id"] for r in doc["reservations"]} == {"r1": 6, "r2": 5}
+
+def test_real_data_ids_unique_and_reservations_resolve(doc):
+    before = {(r["reservation_id"]): (r["book_id"], r["book_title"]) for r in doc["reservations"]}
+    held = {(b["id"], b["title"]) for b in doc["books"]}
+    migrated = copy.deepcopy(doc); migrate(migrated)
+    ids = [b["id"] for b in migrated["books"]]
+    assert len(ids) == len(set(ids)) and not needs_migration(migrated)
+    titles = {b["id"]: b["title"] for b in migrated["books"]}
+    for r in migrated["reservations"]:
+        if before.get(r["reservation_id"]) in held: assert titles[r["book_id"]] == r["book_title"]
+    # Determinística: duas instâncias migrando a mesma versão chegam ao mesmo documento
+    again = copy.deepcopy(doc); migrate(again)
+    assert again == migrated
+
+def test_migration_is_written_once(data_file):
+    repo = LocalRepo(str(data_file.parent))
+    GitHubConnection(repo, "data.json", "main", ttl=0).view()
+    assert json.loads(data_file.read_text(encoding="utf-8"))["schema_version"] == SCHEMA_VERSION
+    head = repo.head
+    GitHubConnection(repo, "data.json", "main", ttl=0).view()
+    assert repo.head == head
+
+def test_v2_twins_in_the_same_class_keep_their_reservers():
+    # Dois exemplares iguais (id, título, série e turma), ambos reservados
+    twins = [dict(book(5, "A", available=False), reserved_student=s, reserved_by=f"Pai {s}") for s in ("Ana", "Bia")]
+    doc = {"schema_version": 1, "books": twins,
+           "reservations": [dict(res("r1", 5, "A"), student_name="Ana"), dict(res("r2", 5, "A"), student_name="Bia")],
+           "students_db": [], "admin_config": {}}
+    migrate(doc)
+    assert [b["id"] for b in doc["books"]] == [5, 6]
+    assert {r["reservation_id"]: r["book_id"] for r in doc["reservations"]} == {"r1": 5, "r2": 6}
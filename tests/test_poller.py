@@ -0,0 +1,33 @@
+from domain import ReserveItem
+from poller import ChangePoller
+from conftest import user_of, new_student, free_item
+
+def two_groups(view):
+    s = new_student(view)
+    mine = (s["grade"], s["class_name"])
+    other = next((b["grade"], b["class_name"]) for b in view.data["books"] if (b["grade"], b["class_name"]) != mine)
+    return s, mine, other
+
+def test_sharded_poll_publishes_per_group(local):
+    store = local("dados")
+    s, mine, other = two_groups(store.view())
+    store.view([mine]); store.view([other])
+    poller = ChangePoller(store); poller.check()
+    seen_mine, seen_other = poller.version_of([mine]), poller.version_of([other])
+    # Outra instância reserva na turma do aluno
+    writer = local("dados")
+    b = free_item(writer.view([mine]), s)
+    assert writer.commit_now(ReserveItem(b["id"], user_of(s), b["title"])).ok
+    assert poller.check()
+    assert poller.version_of([mine]) != seen_mine and poller.version_of([other]) == seen_other
+    assert not store.view([mine]).book(b["id"], b["title"])["available"]
+
+def test_single_file_poll_reaches_every_group(local):
+    store = local()
+    s, mine, other = two_groups(store.view())
+    poller = ChangePoller(store); poller.check()
+    seen = poller.version_of([other])
+    b = free_item(store.view(), s)
+    assert local().commit_now(
+        ReserveItem(b["id"], user_of(s), b["title"])).ok
+    assert poller.check() and poller.version_of([other]) != seen
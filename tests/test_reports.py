@@ -0,0 +1,21 @@
+from domain import CancelReservation
+from reports import ReportCache
+
+def test_frames_rebuilt_only_after_version_bump(store):
+    cache = ReportCache()
+    old = store.view(); before = old.version()
+    frames = cache.get(old)
+    listed = frames.reservation_list()
+    # Mesma versão (outra view, outra sessão): mesmos frames e resultados já montados
+    assert cache.get(store.view()) is frames and cache.builds == 1
+    assert frames.reservation_list() is listed
+    r = old.reservations_where("Livro")[0]
+    assert store.commit_now(CancelReservation(r["book_id"], r["parent_name"], r["reservation_id"], r["book_title"])).ok
+    view = store.view()
+    assert view.version() != before
+    fresh = cache.get(view)
+    assert fresh is not frames and cache.builds == 2
+    assert len(fresh.reservation_list()) == len(listed) - 1
+    assert cache.get(store.view()) is fresh and cache.builds == 2
+    # A versão anterior continua guardada para quem ainda está nela
+    assert cache.frames[before] is frames
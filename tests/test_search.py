@@ -0,0 +1,38 @@
+from search import SearchCache, SearchIndex
+
+TITLES = ["O Pequeno Príncipe", "Ática: Matemática 3", "Aventuras de Pinóquio", "Dom Casmurro", "Pinocchio (ed. bilíngue)"]
+
+def titles(query):
+    return [TITLES[rid] for rid in SearchIndex(TITLES).ids(query)]
+
+def test_accents_are_folded_both_ways():
+    assert titles("ATICA") == ["Ática: Matemática 3"]
+    assert titles("príncipe") == titles("principe") == ["O Pequeno Príncipe"]
+    assert titles("matemática") == ["Ática: Matemática 3"]
+
+def test_prefix_matches_while_typing():
+    assert titles("peq") == ["O Pequeno Príncipe"]
+    assert titles("dom cas") == ["Dom Casmurro"]
+    # Todas as palavras precisam casar
+    assert titles("dom pinoquio") == []
+
+def test_typos_tolerated_from_three_letters():
+    assert titles("pinoqio")[0] == "Aventuras de Pinóquio"
+    assert titles("matematca") == ["Ática: Matemática 3"]
+    assert titles("casmuro") == ["Dom Casmurro"]
+    # Com menos de 3 letras, só prefixo exato
+    assert titles("pq") == []
+
+def test_students_found_by_email(store):
+    view = store.view()
+    s = next(s for s in view.students() if s.get("email"))
+    cache = SearchCache()
+    user = s["email"].split("@")[0]
+    assert s in cache.students(view, s["email"])
+    assert s in cache.students(view, user.upper())
+
+def test_query_without_words_falls_back_to_substring(store):
+    view = store.view()
+    with_at = [s for s in view.students() if "@" in f"{s.get('email', '')} {s.get('email2', '')}"]
+    assert with_at and SearchCache().students(view, "@") == with_at
+    assert SearchCache().students(view, "   ") == []
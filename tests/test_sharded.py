@@ -0,0 +1,87 @@
+import os
+from local_repo import LocalRepo
+from domain import AddItems, ReserveItem
+from github_storage import ShardedGitHubConnection
+from conftest import user_of, new_student
+
+def sharded(repo, ttl=0):
+    return ShardedGitHubConnection(repo, "data.json", "main", "dados", ttl=ttl)
+
+def test_each_file_is_revalidated_once_per_read(fake_repo):
+    repo = fake_repo
+    store = sharded(repo)
+    store.view()
+    files = sum(1 for p in repo.files if p.startswith("dados/"))
+    gets, revalidated = repo.calls["get"], repo.calls["get_304"]
+    store.view()
+    # manifest, alunos e cada turma: uma revalidação condicional por arquivo
+    assert repo.calls["get"] == gets and repo.calls["get_304"] - revalidated == files
+
+def test_missing_data_file_is_not_split(tmp_path):
+    store = sharded(LocalRepo(str(tmp_path)))
+    assert store.view().data["books"] == [] and os.listdir(tmp_path) == []
+    item = {"title": "Livro novo", "category": "Livro", "grade": "Grupo 3", "class_name": "Matutino"}
+    assert store.commit_now(AddItems([item], "Lote: 1 itens")).ok
+    assert sorted(os.listdir(tmp_path / "dados"))[:2] == ["grupo-3_matutino.json", "manifest.json"]
+    assert [b["title"] for b in sharded(LocalRepo(str(tmp_path))).view().data["books"]] == ["Livro novo"]
+
+def two_stores(repo):
+    # Duas instâncias do app sobre o mesmo repositório; a primeira com o cache vencido só na hora de gravar
+    a, b = sharded(repo, ttl=1e9), sharded(repo)
+    a.view()
+    return repo, a, b
+
+def free_pair(view):
+    s = new_student(view)
+    free = [x for x in view.items_for(s["grade"], s["class_name"], ["Livro", "Jogo", "Brinquedo"]) if x["available"]]
+    other = next(t for t in view.students() if (t["grade"], t["class_name"]) == (s["grade"], s["class_name"])
+                 and t["name"] != s["name"] and not view.reservations_for(t["name"]))
+    return s, other, free
+
+def test_conflicting_shard_write_is_retried(fake_repo):
+    repo, a, b = two_stores(fake_repo)
+    s, other, free = free_pair(b.view())
+    assert b.commit_now(ReserveItem(free[0]["id"], user_of(other), free[0]["title"])).ok
+    op = a.commit_now(ReserveItem(free[1]["id"], user_of(s), free[1]["title"]))
+    assert op.ok and op.retries == 1 and repo.calls["conflicts"] == 1
+    view = sharded(repo).view([(s["grade"], s["class_name"])])
+    assert {r["student_name"] for r in view.reservations_where()} >= {s["name"], other["name"]}
+
+def test_retry_sees_the_winner(fake_repo):
+    repo, a, b = two_stores(fake_repo)
+    s, other, free = free_pair(b.view())
+    assert b.commit_now(ReserveItem(free[0]["id"], user_of(other), free[0]["title"])).ok
+    op = a.commit_now(ReserveItem(free[0]["id"], user_of(s), free[0]["title"]))
+    assert not op.ok and op.error == "Perdeu!" and op.retries == 1
+
+def items_in(groups):
+    return [{"title": f"Novo {g}", "category": "Livro", "grade": g[0], "class_name": g[1]} for g in groups]
+
+def test_stale_file_in_multi_file_commit_is_retried(fake_repo, doc):
+    repo, a, b = two_stores(fake_repo)
+    s, other, free = free_pair(b.view())
+    groups = [(s["grade"], s["class_name"]), next((x["grade"], x["class_name"]) for x in doc["books"] if x["grade"] != s["grade"])]
+    assert b.commit_now(ReserveItem(free[0]["id"], user_of(other), free[0]["title"])).ok
+    op = a.commit_now(AddItems(items_in(groups), "Lote: 2 itens"))
+    assert op.ok and op.retries == 1
+    view = sharded(repo).view()
+    assert {x["title"] for x in view.items_where()} >= {f"Novo {g}" for g in groups}
+    assert view.reservations_for(other["name"])
+
+def test_commit_racing_the_ref_update_is_retried(fake_repo, doc, monkeypatch):
+    # Outro commit entra entre a conferência dos SHAs e o update_ref: 422 vira 409 e repete
+    repo, a, b = two_stores(fake_repo)
+    s, other, free = free_pair(b.view())
+    groups = [(s["grade"], s["class_name"]), next((x["grade"], x["class_name"]) for x in doc["books"] if x["grade"] != s["grade"])]
+    create = repo.create_git_commit
+    def racing(*args):
+        commit = create(*args)
+        if not repo.calls["conflicts"]:
+            assert b.commit_now(ReserveItem(free[0]["id"], user_of(other), free[0]["title"])).ok
+        return commit
+    monkeypatch.setattr(repo, "create_git_commit", racing)
+    op = a.commit_now(AddItems(items_in(groups), "Lote: 2 itens"))
+    assert op.ok and op.retries == 1 and repo.calls["conflicts"] == 1
+    view = sharded(repo).view()
+    assert {x["title"] for x in view.items_where()} >= {f"Novo {g}" for g in groups}
+    assert view.reservations_for(other["name"])
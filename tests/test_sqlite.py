@@ -0,0 +1,23 @@
+import copy
+import threading
+from domain import ReserveItem
+from storage import SQLiteStorage
+from conftest import user_of, free_item
+
+def test_threads_share_the_connections_and_keep_counters(tmp_path, doc):
+    store = SQLiteStorage(str(tmp_path / "x.db")); store.load(copy.deepcopy(doc))
+    view = store.view()
+    students = [s for s in view.students() if not view.reservations_for(s["name"])][:16]
+    conns, results = set(), []
+    def session(s):
+        # Cada rerun do Streamlit numa thread nova: lê, reserva e relê
+        v = store.view(); conns.add(id(v.c))
+        b = free_item(v, s)
+        results.append(store.commit_now(ReserveItem(b["id"], user_of(s), b["title"])))
+        store.view().reservations_for(s["name"])
+    threads = [threading.Thread(target=session, args=(s,)) for s in students]
+    for t in threads: t.start()
+    for t in threads: t.join()
+    assert conns == {id(store.reader)}
+    assert len(results) == len(students) and all(op.ok or op.error == "Perdeu!" for op in results)
+    assert store.view().verify() == {}